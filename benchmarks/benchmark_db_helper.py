@@ -0,0 +1,239 @@
+# Benchmarks do DbHelper: montagem do sql (compilação das declarações e chamadas completas com o cache de
+# declarações), validação de colunas contra esquemas sinteticos largos e vazão ponta a ponta de inserts e selects
+# com varias threads, contra um servidor MariaDB / MySQL local ou contra uma conexão falsa em memoria.
+# O resultado é um j-son que pode ser guardado e comparado com o de outra execução.
+#
+# Uso (a partir da raiz do repositorio):
+#   python -m benchmarks.benchmark_db_helper --saida antes.json
+#   python -m benchmarks.benchmark_db_helper --saida depois.json --compara antes.json
+#   python -m benchmarks.benchmark_db_helper --host localhost --usuario bench --senha bench --esquema bench
+#
+#
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+
+from db_helper.db_helper import VERSAO
+from db_helper.validacoes_tabelas import valida_e_escapa_coluna, lista_colunas_validas
+from db_helper.montagem_sql import compila_query_col, compila_query_col_like, compila_update
+from tests.conexao_falsa import ConexaoFalsa, esquema_sintetico, fecha_helper, novo_helper
+
+# tabela criada (e removida no final) no servidor real para o teste de vazão
+TABELA_VAZAO = "bench_db_helper"
+
+
+# retorna True se o retorno (res, msg, qtd) de um comando do helper indica erro.
+def falhou(retorno):
+    return isinstance(retorno[0], int) and retorno[0] == -1
+
+
+# executa funcao repeticoes vezes e retorna o menor tempo, cada execução faz operacoes operações. funcao retorna
+# a quantidade de operações que falharam (ou None), a soma de todas as repetições fica em erros.
+def mede(nome, parametros, operacoes, funcao, repeticoes):
+    tempos = []
+    erros = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        erros += funcao() or 0
+        tempos.append(time.perf_counter() - inicio)
+    melhor = min(tempos)
+    resultado = {'nome': nome, 'parametros': parametros, 'operacoes': operacoes, 'segundos': melhor,
+                 'ops_por_segundo': operacoes / melhor if melhor else None,
+                 'us_por_op': melhor / operacoes * 1e6, 'tempos': tempos, 'erros': erros}
+    print("%-32s %-40s %12.1f ops/s %10.2f us/op" % (nome, json.dumps(parametros), resultado['ops_por_segundo'] or 0,
+                                                      resultado['us_por_op']) +
+          (" %d ERROS" % erros if erros else ""), file=sys.stderr)
+    return resultado
+
+
+# compilação das declarações (validação + montagem do texto, sem cache) e chamadas completas com o cache de
+# declarações contra a conexão falsa.
+def benchmark_montagem(args):
+    resultados = []
+    esquema = esquema_sintetico(4, 20)
+    helper = novo_helper(lambda self: ConexaoFalsa(esquema), hostname='bench', username='bench', password='bench',
+                         schema='bench')
+    helper.indice_esquema()
+    n = args.iteracoes
+    colunas = ["c%d" % c for c in range(1, 11)]
+    casos = {
+        'compila_query_col': lambda: compila_query_col(helper, ["t0", "t1"], ["t0.id"] + colunas, ["c1", "c2"],
+                                                       "c3", True, None, None),
+        'compila_query_col_like': lambda: compila_query_col_like(helper, "t0", colunas, ["c1", "c2"], "c3", True),
+        'compila_update': lambda: compila_update(helper, "t0", colunas, ["v"] * len(colunas), "id"),
+    }
+    for nome, caso in casos.items():
+        def executa(caso=caso):
+            for _ in range(n):
+                caso()
+        resultados.append(mede(nome, {'colunas': len(colunas)}, n, executa, args.repeticoes))
+    chamadas = {
+        'db_query_col': lambda: helper.db_query_col(["t0"], colunas, ["c1"], ["x"], "c3"),
+        'db_query_col_like': lambda: helper.db_query_col_like("t0", colunas, ["c1", "c2"], ["x", "y"], "c3"),
+        'db_update': lambda: helper.db_update("t0", colunas, ["v"] * len(colunas), "id", 1),
+    }
+    for nome, chamada in chamadas.items():
+        def executa(chamada=chamada):
+            return sum(falhou(chamada()) for _ in range(n))
+        resultados.append(mede(nome, {'colunas': len(colunas), 'conexao': 'falsa'}, n, executa, args.repeticoes))
+    fecha_helper(helper)
+    return resultados
+
+
+# validação de colunas contra esquemas com muitas colunas por tabela.
+def benchmark_validacao(args):
+    resultados = []
+    for colunas_por_tabela in (10, 100, 1000):
+        esquema = esquema_sintetico(8, colunas_por_tabela)
+        helper = novo_helper(lambda self: ConexaoFalsa(esquema), hostname='bench', username='bench',
+                             password='bench', schema='bench')
+        helper.indice_esquema()
+        tabelas = ("t0", "t1")
+        itens = (["c%d" % c for c in range(1, colunas_por_tabela, max(1, colunas_por_tabela // 10))] +
+                 ["t1.c1", ("t0.c1", "apelido"), "inexistente"])
+        n = args.iteracoes
+
+        def executa_valida():
+            for _ in range(n):
+                for item in itens:
+                    valida_e_escapa_coluna(helper, item, tabelas)
+
+        def executa_lista():
+            for _ in range(n):
+                lista_colunas_validas(helper, tabelas)
+        parametros = {'tabelas': len(esquema), 'colunas_por_tabela': colunas_por_tabela}
+        resultados.append(mede('valida_e_escapa_coluna', parametros, n * len(itens), executa_valida,
+                               args.repeticoes))
+        resultados.append(mede('lista_colunas_validas', parametros, n, executa_lista, args.repeticoes))
+        fecha_helper(helper)
+    return resultados
+
+
+# vazão de inserts e selects com varias threads usando o pool de conexões do helper.
+def benchmark_vazao(args):
+    resultados = []
+    real = args.host is not None
+    if real:
+        conexao = pymysql.connect(host=args.host, user=args.usuario, password=args.senha, db=args.esquema)
+        with conexao.cursor() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS %s (id INT AUTO_INCREMENT PRIMARY KEY, nome VARCHAR(64), "
+                           "valor INT) ENGINE=InnoDB;" % TABELA_VAZAO)
+        conexao.commit()
+        fabrica = None
+        parametros_conexao = {'hostname': args.host, 'username': args.usuario, 'password': args.senha,
+                              'schema': args.esquema}
+    else:
+        esquema = {TABELA_VAZAO: ["id", "nome", "valor"]}
+        linhas = [{'id': 1, 'nome': 'nome', 'valor': 1}]
+
+        def fabrica(self):
+            return ConexaoFalsa(esquema, args.latencia, linhas)
+        parametros_conexao = {'hostname': 'bench', 'username': 'bench', 'password': 'bench', 'schema': 'bench'}
+    try:
+        for threads in args.concorrencia:
+            helper = novo_helper(fabrica, pool_max=threads, **parametros_conexao)
+            helper.indice_esquema()
+            n = args.iteracoes_vazao
+
+            def insere(i):
+                return falhou(helper.db_insert(TABELA_VAZAO, ["nome", "valor"], ["nome %d" % i, i]))
+
+            def seleciona(i):
+                return falhou(helper.db_query_col(TABELA_VAZAO, ["id", "nome", "valor"], ["id"], [i]))
+
+            for nome, operacao in (('vazao_insert', insere), ('vazao_select', seleciona)):
+                def executa(operacao=operacao):
+                    with ThreadPoolExecutor(max_workers=threads) as executor:
+                        return sum(executor.map(operacao, range(n)))
+                parametros = {'threads': threads, 'conexao': 'real' if real else 'falsa'}
+                if not real:
+                    parametros['latencia'] = args.latencia
+                resultados.append(mede(nome, parametros, n, executa, args.repeticoes))
+            fecha_helper(helper)
+    finally:
+        if real:
+            with conexao.cursor() as cursor:
+                cursor.execute("DROP TABLE IF EXISTS %s;" % TABELA_VAZAO)
+            conexao.commit()
+            conexao.close()
+    return resultados
+
+
+# informações do ambiente para identificar a execução.
+def metadados(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'db_helper': VERSAO, 'commit': commit, 'python': platform.python_version(),
+            'implementacao': platform.python_implementation(), 'plataforma': platform.platform(),
+            'pymysql': pymysql.__version__, 'quando': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'argumentos': {chave: valor for chave, valor in vars(args).items() if chave != 'senha'}}
+
+
+# compara os resultados com os de uma execução anterior, razão > 1 indica que a execução atual é mais rapida.
+def compara(resultados, arquivo_base):
+    with open(arquivo_base) as arquivo:
+        base = {(r['nome'], json.dumps(r['parametros'], sort_keys=True)): r for r in json.load(arquivo)['resultados']}
+    comparacao = []
+    for resultado in resultados:
+        anterior = base.get((resultado['nome'], json.dumps(resultado['parametros'], sort_keys=True)))
+        if anterior is None:
+            continue
+        razao = anterior['segundos'] / resultado['segundos'] if resultado['segundos'] else None
+        comparacao.append({'nome': resultado['nome'], 'parametros': resultado['parametros'],
+                           'us_por_op_base': anterior['us_por_op'], 'us_por_op': resultado['us_por_op'],
+                           'razao': razao})
+        print("%-32s %-40s %8.2fx" % (resultado['nome'], json.dumps(resultado['parametros']), razao or 0),
+              file=sys.stderr)
+    return comparacao
+
+
+BENCHMARKS = {'montagem': benchmark_montagem, 'validacao': benchmark_validacao, 'vazao': benchmark_vazao}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do db_helper.")
+    parser.add_argument("--apenas", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS),
+                        help="grupos de benchmarks executados")
+    parser.add_argument("--iteracoes", type=int, default=2000, help="chamadas por medição de montagem/validação")
+    parser.add_argument("--iteracoes-vazao", type=int, default=500, help="operações por medição de vazão")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições de cada medição, vale a menor")
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[1, 4, 16], help="threads na vazão")
+    parser.add_argument("--latencia", type=float, default=0.0005,
+                        help="ida e volta simulada da conexão falsa, em segundos")
+    parser.add_argument("--host", help="servidor MariaDB / MySQL para a vazão, sem ele usa a conexão falsa")
+    parser.add_argument("--usuario", default="")
+    parser.add_argument("--senha", default="")
+    parser.add_argument("--esquema", default="")
+    parser.add_argument("--saida", help="arquivo j-son com os resultados, sem ele o j-son vai para a saida padrão")
+    parser.add_argument("--compara", help="j-son de uma execução anterior para comparação")
+    args = parser.parse_args(argv)
+    if args.host is not None and not (args.usuario and args.esquema):
+        parser.error("--usuario e --esquema são obrigatorios com --host")
+
+    resultados = []
+    for nome in args.apenas:
+        resultados.extend(BENCHMARKS[nome](args))
+    relatorio = {'metadados': metadados(args), 'resultados': resultados}
+    if args.compara:
+        relatorio['comparacao'] = compara(resultados, args.compara)
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            json.dump(relatorio, arquivo, indent=2)
+    else:
+        json.dump(relatorio, sys.stdout, indent=2)
+    return relatorio
+
+
+if __name__ == "__main__":
+    # resultados com operações que falharam não medem o helper, a execução termina com erro
+    sys.exit(1 if any(resultado['erros'] for resultado in main()['resultados']) else 0)
@@ -0,0 +1,121 @@
+# Cache LRU, com validade (ttl), dos resultados de querys do DbHelper indexado pelo texto do sql mais os parametros.
+# Cada resultado guarda as tabelas que a query leu, e escritas em uma tabela invalidam todos os resultados que a
+# referenciam.
+#
+#
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+# contadores de uso do cache por tabela
+class _EstatisticasTabela:
+    __slots__ = ('acertos', 'falhas', 'descartes', 'invalidacoes')
+
+    def __init__(self):
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self.invalidacoes = 0
+
+
+class CacheResultados:
+    # tamanho_max - quantidade maxima de resultados guardados, 0 desativa o cache.
+    # ttl - segundos de validade de cada resultado, None não expira (apenas escritas invalidam).
+    def __init__(self, tamanho_max=1024, ttl=60.0):
+        self.tamanho_max = tamanho_max
+        self.ttl = ttl
+        self._lock = Lock()
+        # chave -> (resultado, expira_em, tabelas)
+        self._resultados = OrderedDict()
+        # tabela -> conjunto de chaves de resultados que leram a tabela
+        self._chaves_por_tabela = dict()
+        # tabela -> contador incrementado a cada escrita, impede guardar resultados lidos antes de uma escrita
+        self._geracoes = dict()
+        self._estatisticas = dict()
+
+    def _estatisticas_tabela(self, tabela):
+        estatisticas = self._estatisticas.get(tabela)
+        if estatisticas is None:
+            estatisticas = self._estatisticas[tabela] = _EstatisticasTabela()
+        return estatisticas
+
+    # remove a chave do cache e dos indices por tabela, deve ser chamado com o lock adquirido.
+    def _remove(self, chave):
+        resultado, expira_em, tabelas = self._resultados.pop(chave)
+        for tabela in tabelas:
+            chaves = self._chaves_por_tabela.get(tabela)
+            if chaves is not None:
+                chaves.discard(chave)
+        return tabelas
+
+    # retorna o resultado guardado para a chave ou None se não existir ou tiver expirado.
+    def obtem(self, chave, tabelas):
+        with self._lock:
+            item = self._resultados.get(chave)
+            if item is not None and item[1] is not None and item[1] < time.monotonic():
+                self._remove(chave)
+                for tabela in tabelas:
+                    self._estatisticas_tabela(tabela).descartes += 1
+                item = None
+            for tabela in tabelas:
+                estatisticas = self._estatisticas_tabela(tabela)
+                if item is None:
+                    estatisticas.falhas += 1
+                else:
+                    estatisticas.acertos += 1
+            if item is None:
+                return None
+            self._resultados.move_to_end(chave)
+            return item[0]
+
+    # retorna a geração atual das tabelas, deve ser obtida antes de executar a query e repassada a guarda().
+    def geracoes(self, tabelas):
+        with self._lock:
+            return tuple(self._geracoes.get(tabela, 0) for tabela in tabelas)
+
+    # guarda o resultado, exceto se alguma das tabelas tiver sido escrita desde que geracoes foi obtida.
+    def guarda(self, chave, resultado, tabelas, geracoes):
+        if self.tamanho_max <= 0:
+            return
+        with self._lock:
+            if tuple(self._geracoes.get(tabela, 0) for tabela in tabelas) != geracoes:
+                return
+            if chave in self._resultados:
+                self._remove(chave)
+            expira_em = None if self.ttl is None else time.monotonic() + self.ttl
+            self._resultados[chave] = (resultado, expira_em, tuple(tabelas))
+            for tabela in tabelas:
+                self._chaves_por_tabela.setdefault(tabela, set()).add(chave)
+            while len(self._resultados) > self.tamanho_max:
+                for tabela in self._remove(next(iter(self._resultados))):
+                    self._estatisticas_tabela(tabela).descartes += 1
+
+    # remove todos os resultados que leram alguma das tabelas.
+    def invalida_tabelas(self, tabelas):
+        with self._lock:
+            for tabela in tabelas:
+                self._geracoes[tabela] = self._geracoes.get(tabela, 0) + 1
+                chaves = self._chaves_por_tabela.pop(tabela, set())
+                for chave in chaves:
+                    if chave in self._resultados:
+                        self._remove(chave)
+                self._estatisticas_tabela(tabela).invalidacoes += len(chaves)
+
+    def limpa(self):
+        with self._lock:
+            self._resultados.clear()
+            self._chaves_por_tabela.clear()
+            for tabela in self._geracoes:
+                self._geracoes[tabela] += 1
+
+    # retorna o tamanho atual do cache e os contadores de acertos, falhas, descartes e invalidações por tabela.
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'tamanho': len(self._resultados),
+                'tamanho_max': self.tamanho_max,
+                'tabelas': {tabela: {'acertos': e.acertos, 'falhas': e.falhas, 'descartes': e.descartes,
+                                     'invalidacoes': e.invalidacoes} for tabela, e in self._estatisticas.items()}
+            }
@@ -0,0 +1,69 @@
+# Cache LRU das declarações sql compiladas pelo DbHelper, indexado pela forma da chamada. O cache é esvaziado
+# automaticamente quando o indice do esquema é recarregado, pois as validações de tabelas e colunas podem mudar.
+#
+#
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class CacheSql:
+    # tamanho_max - quantidade maxima de declarações guardadas, 0 desativa o cache.
+    def __init__(self, tamanho_max=256):
+        self.tamanho_max = tamanho_max
+        self._lock = Lock()
+        self._declaracoes = OrderedDict()
+        # versao do indice do esquema com a qual as declarações guardadas foram compiladas
+        self._versao = None
+        self._acertos = 0
+        self._falhas = 0
+        self._descartes = 0
+        self._invalidacoes = 0
+
+    # retorna a declaração compilada para a chave ou None. versao é a versao atual do indice do esquema, se for
+    # diferente da versao das declarações guardadas o cache inteiro é invalidado.
+    def obtem(self, chave, versao):
+        with self._lock:
+            if versao != self._versao:
+                self._limpa(versao)
+            declaracao = self._declaracoes.get(chave)
+            if declaracao is None:
+                self._falhas += 1
+            else:
+                self._acertos += 1
+                self._declaracoes.move_to_end(chave)
+            return declaracao
+
+    def guarda(self, chave, declaracao, versao):
+        if self.tamanho_max <= 0:
+            return
+        with self._lock:
+            if versao != self._versao:
+                self._limpa(versao)
+            self._declaracoes[chave] = declaracao
+            self._declaracoes.move_to_end(chave)
+            while len(self._declaracoes) > self.tamanho_max:
+                self._declaracoes.popitem(last=False)
+                self._descartes += 1
+
+    # esvazia o cache, deve ser chamado com o lock adquirido.
+    def _limpa(self, versao):
+        if self._declaracoes:
+            self._invalidacoes += 1
+        self._declaracoes.clear()
+        self._versao = versao
+
+    def limpa(self):
+        with self._lock:
+            self._limpa(self._versao)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'tamanho': len(self._declaracoes),
+                'tamanho_max': self.tamanho_max,
+                'acertos': self._acertos,
+                'falhas': self._falhas,
+                'descartes': self._descartes,
+                'invalidacoes': self._invalidacoes
+            }
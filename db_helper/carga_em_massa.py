@@ -0,0 +1,73 @@
+# Arquivos de dados para o LOAD DATA LOCAL INFILE de DbHelper.db_carga_em_massa. As linhas vêm de qualquer
+# iteravel e são gravadas em arquivos temporarios de ate linhas_por_arquivo linhas, no formato padrão do LOAD DATA
+# (campos separados por tab, linhas por \n, caracteres especiais escapados com \ e NULL como \N) codificado em
+# utf8mb4, cada arquivo é carregado e apagado antes do proximo ser gravado. Assim o disco usado é limitado ao de um
+# arquivo, independente do tamanho total da carga.
+#
+#
+
+import datetime
+import os
+import tempfile
+
+# caracteres que precisam de escape dentro de um campo do LOAD DATA com ESCAPED BY '\\'
+_ESCAPES_CARGA = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+_ESCAPES_CARGA_BYTES = ((b'\\', b'\\\\'), (b'\t', b'\\t'), (b'\n', b'\\n'), (b'\r', b'\\r'), (b'\0', b'\\0'))
+
+
+# converte um valor python no texto de um campo do LOAD DATA.
+# Ex: Entrada: None  Saida: b'\\N'   Entrada: 'a\tb'  Saida: b'a\\tb'   Entrada: True  Saida: b'1'
+def codifica_valor_carga(valor):
+    match valor:
+        case None:
+            return b'\\N'
+        case bool():
+            return b'1' if valor else b'0'
+        case bytes() | bytearray():
+            valor = bytes(valor)
+            for caractere, escape in _ESCAPES_CARGA_BYTES:
+                valor = valor.replace(caractere, escape)
+            return valor
+        case datetime.timedelta():
+            segundos = int(valor.total_seconds())
+            sinal = "-" if segundos < 0 else ""
+            segundos = abs(segundos)
+            return ("%s%02d:%02d:%02d" % (sinal, segundos // 3600, segundos // 60 % 60, segundos % 60)).encode()
+        case str():
+            return valor.translate(_ESCAPES_CARGA).encode('utf-8')
+        case _:
+            # numeros, Decimal, date e datetime ja tem a representação aceita pelo mysql em str()
+            return str(valor).translate(_ESCAPES_CARGA).encode('utf-8')
+
+
+# converte uma linha (lista ou tupla com um valor por coluna, ou um valor simples para uma coluna) em uma linha do
+# arquivo de carga.
+def codifica_linha_carga(linha, quantidade_colunas):
+    linha = tuple(linha) if isinstance(linha, (list, tuple)) else (linha,)
+    if len(linha) != quantidade_colunas:
+        raise Exception("erro! linha com %d valores para %d colunas: %s" % (len(linha), quantidade_colunas,
+                                                                             str(linha)))
+    return b'\t'.join(map(codifica_valor_carga, linha)) + b'\n'
+
+
+# percorre linhas sem materializa-las e gera tuplas (caminho do arquivo temporario, quantidade de linhas) com ate
+# linhas_por_arquivo linhas cada. O arquivo é apagado quando o consumidor pede o proximo ou fecha o gerador.
+def arquivos_carga(linhas, quantidade_colunas, linhas_por_arquivo):
+    iterador = iter(linhas)
+    while True:
+        quantidade = 0
+        arquivo = tempfile.NamedTemporaryFile('wb', prefix='db_helper_carga_', suffix='.tsv', delete=False)
+        try:
+            with arquivo:
+                for linha in iterador:
+                    arquivo.write(codifica_linha_carga(linha, quantidade_colunas))
+                    quantidade += 1
+                    if quantidade >= linhas_por_arquivo:
+                        break
+            if quantidade == 0:
+                return
+            yield arquivo.name, quantidade
+        finally:
+            os.remove(arquivo.name)
+        if quantidade < linhas_por_arquivo:
+            return
@@ -0,0 +1,195 @@
+# Consultor de indices para os comandos gerados pelo DbHelper: executa EXPLAIN nas querys montadas por db_query_col e
+# db_query_col_like (sob demanda ou em uma amostra das chamadas), compara as colunas filtradas e ordenadas com os
+# indices do INFORMATION_SCHEMA.STATISTICS (ver IndiceEsquema.indices) e monta um relatorio por forma de declaração
+# (texto do sql) com as varreduras completas, as ordenações em arquivo (filesort) e sugestões de indices. Usa o
+# EXPLAIN tabular, que tem as mesmas colunas no MySQL e no MariaDB.
+#
+#
+
+import random
+import re
+import time
+from threading import Lock
+
+# coluna (qualificada ou não) seguida de um operador de comparação. Ex: `pedido`.`valor` >= %s
+_COMPARACAO = re.compile(r"(?:`([^`]+)`\.)?`([^`]+)`\s*(=|<=|>=|<>|<|>|LIKE|BETWEEN|IN)\s")
+# coluna (qualificada ou não) em uma lista de ordenação. Ex: `pedido`.`data` DESC
+_ORDENACAO = re.compile(r"(?:`([^`]+)`\.)?`([^`]+)`")
+# busca FULLTEXT, a lista de colunas segue o formato de _ORDENACAO. Ex: MATCH (`nome`, `login`) AGAINST (%s ...)
+_MATCH = re.compile(r"MATCH \(([^)]*)\) AGAINST")
+
+
+# retorna True se o padrão do LIKE no parametro da posição não começa com curinga, uma busca por prefixo que usa o
+# indice B-tree da coluna como uma faixa. Sem o valor do parametro o LIKE é tratado como '%...%'.
+def _busca_prefixo(argumentos, posicao):
+    if argumentos is None or posicao >= len(argumentos) or not isinstance(argumentos[posicao], str):
+        return False
+    return not argumentos[posicao].startswith(('%', '_'))
+
+
+# retorna as colunas filtradas e ordenadas do sql gerado pelo helper, as filtradas como tuplas (tabela ou None,
+# coluna, operador) e as ordenadas como tuplas (tabela ou None, coluna). argumentos - parametros do sql, usados
+# para distinguir o LIKE por prefixo (operador 'LIKE prefixo') do LIKE com curinga no inicio ('LIKE'). As colunas
+# de MATCH ... AGAINST têm o operador 'MATCH'.
+# Ex: Entrada: 'SELECT * FROM `pedido` WHERE `usuario_id` = %s ORDER BY `pedido`.`data` ASC;'
+#     Saida: ([(None, 'usuario_id', '=')], [('pedido', 'data')])
+def colunas_do_sql(sql, argumentos=None):
+    sql = sql.rstrip(";")
+    sql, _, ordem = sql.partition(" ORDER BY ")
+    inicio, _, condicoes = sql.partition(" WHERE ")
+    ordem = ordem.partition(" LIMIT ")[0]
+    # posição nos argumentos do primeiro parametro das condições
+    parametro = inicio.count("%s")
+    filtradas = []
+    for comparacao in _COMPARACAO.finditer(condicoes):
+        tabela, coluna, operador = comparacao.groups()
+        if operador == 'LIKE' and _busca_prefixo(argumentos, parametro + condicoes.count("%s", 0, comparacao.start())):
+            operador = 'LIKE prefixo'
+        filtradas.append((tabela or None, coluna, operador))
+    for colunas in _MATCH.findall(condicoes):
+        filtradas += [(tabela or None, coluna, 'MATCH') for tabela, coluna in _ORDENACAO.findall(colunas)]
+    ordenadas = [(tabela or None, coluna) for tabela, coluna in _ORDENACAO.findall(ordem)]
+    return filtradas, ordenadas
+
+
+# retorna a tabela da coluna, a informada ou a primeira das tabelas que tem a coluna.
+def _tabela_da_coluna(colunas_por_tabela, tabelas, tabela, coluna):
+    if tabela is not None:
+        return tabela
+    for candidata in tabelas:
+        if coluna in colunas_por_tabela.get(candidata, ()):
+            return candidata
+    return tabelas[0] if tabelas else None
+
+
+# retorna o CREATE INDEX sugerido para as colunas da tabela.
+def _ddl_indice(tabela, colunas, tipo=""):
+    nome = "ix_" + tabela + "_" + "_".join(colunas)
+    return "CREATE %sINDEX `%s` ON `%s` (%s);" % (tipo, nome[:64], tabela, ", ".join("`%s`" % c for c in colunas))
+
+
+# retorna True se algum dos indices começa pelas colunas de igualdade (em qualquer ordem) seguidas de seguinte.
+def _coberto(indices, iguais, seguinte=None):
+    for colunas in indices:
+        if len(colunas) < len(iguais) + (seguinte is not None):
+            continue
+        if set(colunas[:len(iguais)]) == set(iguais) and (seguinte is None or colunas[len(iguais)] == seguinte):
+            return True
+    return False
+
+
+# monta as sugestões de indices a partir das colunas filtradas e ordenadas e do plano do EXPLAIN.
+# indices - tabela -> {nome do indice: (tipo, [colunas na ordem do indice])}, ver IndiceEsquema.indices.
+def sugestoes_indices(colunas_por_tabela, indices, tabelas, filtradas, ordenadas, plano):
+    sugestoes = []
+    filesort = any("filesort" in (linha.get('Extra') or "") for linha in plano)
+    for tabela in tabelas:
+        # no InnoDB os indices secundarios terminam implicitamente com as colunas da chave primaria
+        primaria = indices.get(tabela, {}).get('PRIMARY', (None, []))[1]
+        indices_tabela = [cols + [col for col in primaria if col not in cols]
+                          for tipo, cols in indices.get(tabela, {}).values() if tipo != 'FULLTEXT']
+        fulltext = [cols for tipo, cols in indices.get(tabela, {}).values() if tipo == 'FULLTEXT']
+        iguais, faixas, buscas, textuais = [], [], [], []
+        for tab, coluna, operador in filtradas:
+            if _tabela_da_coluna(colunas_por_tabela, tabelas, tab, coluna) != tabela:
+                continue
+            match operador:
+                case '=' | 'IN':
+                    destino = iguais
+                case 'LIKE':
+                    destino = buscas
+                case 'MATCH':
+                    destino = textuais
+                case _:
+                    destino = faixas
+            if coluna not in destino:
+                destino.append(coluna)
+        ordem = [coluna for tab, coluna in ordenadas
+                 if _tabela_da_coluna(colunas_por_tabela, tabelas, tab, coluna) == tabela]
+        # nenhum indice começa por uma das colunas filtradas, o servidor não tem como evitar ler a tabela inteira
+        chave = iguais + faixas[:1]
+        if chave and not any(cols[0] in chave for cols in indices_tabela):
+            sugestoes.append({'tabela': tabela, 'motivo': "colunas filtradas sem indice: %s" % ", ".join(chave),
+                              'ddl': _ddl_indice(tabela, chave)})
+        if ordem and filesort and not faixas and not _coberto(indices_tabela, iguais, ordem[0]):
+            colunas = iguais + [col for col in ordem if col not in iguais]
+            sugestoes.append({'tabela': tabela, 'motivo': "ordenação por %s feita em arquivo (filesort)" %
+                              ", ".join(ordem), 'ddl': _ddl_indice(tabela, colunas)})
+        if buscas and not any(set(buscas) <= set(cols) for cols in fulltext):
+            sugestoes.append({'tabela': tabela, 'motivo': "LIKE '%%...%%' em %s não usa indice B-tree, considere a "
+                              "busca FULLTEXT" % ", ".join(buscas), 'ddl': _ddl_indice(tabela, buscas, "FULLTEXT ")})
+        # MATCH so usa um indice FULLTEXT com exatamente as mesmas colunas, sem ele o servidor retorna erro
+        if textuais and not any(set(textuais) == set(cols) for cols in fulltext):
+            sugestoes.append({'tabela': tabela, 'motivo': "MATCH em %s sem indice FULLTEXT com as mesmas colunas" %
+                              ", ".join(textuais), 'ddl': _ddl_indice(tabela, textuais, "FULLTEXT ")})
+    return sugestoes
+
+
+class ConsultorIndices:
+    # taxa_amostragem - fração (0 a 1) das chamadas de db_query_col e db_query_col_like cuja forma é analisada,
+    #                   0 desativa a amostragem. Cada forma é analisada uma unica vez por versão do esquema, as
+    #                   demais amostras apenas são contadas.
+    def __init__(self, taxa_amostragem=0.0, debug=False):
+        self.taxa_amostragem = taxa_amostragem
+        self.debug = debug
+        self._lock = Lock()
+        # sql -> relatorio da forma
+        self._relatorios = dict()
+
+    # retorna True se a chamada atual deve ser amostrada.
+    def sorteia(self):
+        return self.taxa_amostragem > 0 and random.random() < self.taxa_amostragem
+
+    # executa o EXPLAIN do sql e retorna o relatorio da forma, que também fica guardado para relatorio().
+    def analisa(self, objeto, sql, argumentos, tabelas, contador):
+        plano, msg, qtd = objeto._db_fetch_all("EXPLAIN " + sql.rstrip(";"), argumentos, contador, tabelas=tabelas)
+        if plano == -1:
+            raise Exception(msg)
+        filtradas, ordenadas = colunas_do_sql(sql, argumentos)
+        esquema = objeto.indice_esquema()
+        relatorio = {
+            'sql': sql,
+            'tabelas': list(tabelas),
+            'plano': plano,
+            'varreduras_completas': [linha.get('table') for linha in plano if linha.get('type') == 'ALL'],
+            'varreduras_indice': [linha.get('table') for linha in plano if linha.get('type') == 'index'],
+            'filesort': any("filesort" in (linha.get('Extra') or "") for linha in plano),
+            'temporaria': any("temporary" in (linha.get('Extra') or "") for linha in plano),
+            'sugestoes': sugestoes_indices(esquema.colunas, esquema.indices(objeto), tabelas, filtradas, ordenadas,
+                                           plano),
+            'versao_esquema': esquema.versao,
+            'analisado_em': time.time()
+        }
+        with self._lock:
+            relatorio['amostras'] = self._relatorios.get(sql, {}).get('amostras', 0)
+            self._relatorios[sql] = relatorio
+        if self.debug and (relatorio['varreduras_completas'] or relatorio['filesort']):
+            print("c = %d - consultor -" % contador, sql, relatorio['sugestoes'])
+        return relatorio
+
+    # conta a amostra da forma e a analisa se ainda não tiver sido analisada nesta versão do esquema. Erros são
+    # ignorados, a amostragem não pode interromper a query do usuario.
+    def amostra(self, objeto, sql, argumentos, tabelas, contador):
+        with self._lock:
+            relatorio = self._relatorios.get(sql)
+            if relatorio is not None:
+                relatorio['amostras'] += 1
+                if relatorio['versao_esquema'] == objeto.indice_esquema().versao:
+                    return
+        try:
+            self.analisa(objeto, sql, argumentos, tabelas, contador)
+            with self._lock:
+                self._relatorios[sql]['amostras'] += relatorio is None
+        except Exception as e:
+            if self.debug:
+                print("c = %d - consultor - erro ignorado:" % contador, str(e))
+
+    # retorna os relatorios de todas as formas analisadas, as formas com varreduras completas ou filesort primeiro.
+    def relatorio(self):
+        with self._lock:
+            relatorios = [dict(relatorio) for relatorio in self._relatorios.values()]
+        return sorted(relatorios, key=lambda r: (not (r['varreduras_completas'] or r['filesort']), -r['amostras']))
+
+    def limpa(self):
+        with self._lock:
+            self._relatorios.clear()
@@ -11,7 +11,7 @@ def concatena_colunas_separados_por_virgula_str(objeto, colunas, tabelas=(), par
     # tabelas é utilizado apenas para testar as colunas
     # colunas ja foram convertidas em listas
     # aplica filtro checa_coluna ja adicionando aspas
-    colunas = list(map(lambda col: objeto.checa_coluna(col, tabelas, objeto.get_db_col_esc()), colunas))
+    colunas = list(map(lambda col: objeto.valida_e_escapa_coluna(col, tabelas), colunas))
     # composição condicional de string
     return_val = ((parentesis * "(") + ", ".join(colunas) * (len(colunas) > 0) +
                   "*" * (len(colunas) == 0) + (")" * parentesis))
@@ -20,8 +20,11 @@ def concatena_colunas_separados_por_virgula_str(objeto, colunas, tabelas=(), par
     return return_val
 
 
-# cria uma string que consiste de igualdades com os valores delimitados por aspas apropriadas e separados por
-# vírgula.
+# cria uma string de igualdades separadas por join_str, onde cada valor é uma coluna escapada (comparação
+# entre colunas) ou o parametro %s. Retorna uma tupla com a string e os indices, na lista de valores, dos valores
+# que viraram parametros e devem ser passados ao cursor.execute na mesma ordem.
+# ex: Entrada: ['login', 'nome'], ['x', 'usuario.login'], ['usuario']
+#     Saida: ('`login` = %s, `nome` = `usuario`.`login`', [0])
 def concatena_listas_em_pares_chave_valor_str(objeto, colunas, valores, tabelas, join_str=", "):
     if objeto.debug:
         print('concatena_listas_em_pares_chave_valor - iniciado com:', tabelas, colunas, valores, join_str)
@@ -30,35 +33,36 @@ def concatena_listas_em_pares_chave_valor_str(objeto, colunas, valores, tabelas,
     # aplica filtro checa_coluna ja adicionando aspas
     colunas = converte_em_lista(colunas, lambda col: objeto.valida_e_escapa_coluna(col, tabelas))
     # aplica filtro converte_item_em_str
-    valores = converte_em_lista(valores, lambda item: objeto.converte_atributo_str(item, tabelas))
+    valores = converte_em_lista(valores, lambda item: converte_atributo_str(objeto, item, tabelas))
+    indices_valores = [indice for indice, valor in enumerate(valores) if valor == "%s"]
     return_val = (join_str.join(list(map(lambda par: "%s = %s" % (par[0], par[1]), zip(colunas, valores)))))
     if objeto.debug:
-        print('concatena_listas_em_pares_chave_valor - retornando:', return_val)
-    return return_val
+        print('concatena_listas_em_pares_chave_valor - retornando:', return_val, indices_valores)
+    return return_val, indices_valores
 
 
-# converte a entrada em item em uma string que será escapada (contida) em aspas apropriadas de acordo com o fato de
-# ser uma coluna válida uma string de atributo.
+# converte a entrada em item na coluna escapada, se item for uma coluna válida, ou no parametro %s para todos os
+# outros valores, que serão enviados separadamente ao cursor.execute e escapados pelo pymysql.
 # Para isso este codigo re-utiliza as checagens em checa_coluna.
 # Ex: Entrada: "login", "usuario"  Saida: '`login`'
-# Ex: Entrada: "atributo", 'usuario'  Saida: "'atributo'"
+# Ex: Entrada: "atributo", 'usuario'  Saida: "%s"
+# Ex: Entrada: 10, 'usuario'  Saida: "%s"
 def converte_atributo_str(objeto, item, tabelas):
     match item:
-        case int() | float():
-            return str(item)
         case str():
             col = objeto.valida_e_escapa_coluna(item, tabelas)
             match col:
                 case "`COLUNA INVALIDA`":
                     # eh um atributo normal
-                    # escapa item com aspas de atributo
-                    return objeto.get_db_attr_esc() + item + objeto.get_db_attr_esc()
+                    # vai como parametro
+                    return "%s"
                 case _:
                     # eh uma coluna
                     # retorna coluna ja escapada
                     return col
         case _:
-            raise Exception("erro! objeto fora do especificado: %s tipo: %s" % (str(item), type(item)))
+            # numeros, None, datas... sao sempre parametros
+            return "%s"
 
 
 # Converte diversos tipos em uma lista, ou encapsulando o item em uma lista ou no caso de tupla duplicando
@@ -4,14 +4,44 @@
 #
 
 import pymysql.cursors
-from threading import Lock
-from db_helper.conversoes import (converte_em_lista, concatena_colunas_separados_por_virgula_str,
-                                  concatena_listas_em_pares_chave_valor_str)
+from pymysql.constants import CLIENT, CR
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from threading import Lock, Thread, local
+from db_helper.conversoes import converte_em_lista
 from db_helper.validacoes_tabelas import escapa_coluna, valida_tabela, valida_e_escapa_coluna
-from criador_json import criador_json as cj
+from db_helper.pool import PoolConexoes
+from db_helper.replicas import RoteadorReplicas, normaliza_replica
+from db_helper.indice_esquema import IndiceEsquema
+from db_helper.cache_sql import CacheSql
+from db_helper.cache_resultados import CacheResultados
+from db_helper.transacao import Transacao
+from db_helper.lote import LoteComandos
+from db_helper.instrumentacao import Instrumentacao
+from db_helper.consultor import ConsultorIndices
+from db_helper.formatos import (valida_formato, cabecalho_do_cursor, converte_resultado, copia_resultado,
+                                quantidade_linhas)
+from db_helper.montagem_sql import (chave_forma, chave_valores, seleciona_parametros, compila_insert, compila_delete,
+                                    compila_update, compila_query_col, compila_query_col_like, compila_insert_lote,
+                                    compila_upsert_lote, contagens_upsert, monta_lotes_insert,
+                                    compila_query_col_paginado, argumentos_keyset, codifica_cursor_pagina,
+                                    decodifica_cursor_pagina, divide_em_blocos, compila_delete_em_lote,
+                                    compila_update_em_lote, compila_cria_tabela_chaves, DeclaracaoCompilada,
+                                    SQL_REMOVE_TABELA_CHAVES, PREFIXO_INSERT_CHAVES, SUFIXO_INSERT_CHAVES,
+                                    compila_carga_em_massa, resolve_modo_busca, termos_busca,
+                                    compila_limites_particao, compila_query_col_particao, divide_faixa)
+from db_helper.carga_em_massa import arquivos_carga
+from db_helper.varredura_paralela import mescla_particoes
+from db_helper.exportacao import FORMATOS_EXPORTACAO, Progresso, abre_destino, escreve_blocos
 
 VERSAO = "0.1"
 
+# bytes reservados do max_allowed_packet para o cabecalho do pacote ao montar inserts em lote
+MARGEM_PACOTE = 1024
+
+# codigos de erro do cliente que indicam que a conexao com o servidor foi perdida
+ERROS_CONEXAO_PERDIDA = (CR.CR_SERVER_GONE_ERROR, CR.CR_SERVER_LOST, CR.CR_SERVER_LOST_EXTENDED)
+
 
 # Implementação de singleton usando metaclass, fonte:
 # https://stackoverflow.com/questions/51896862/how-to-create-singleton-class-with-arguments-in-python
@@ -55,40 +85,150 @@ class DbHelper(metaclass=Singleton):
     }
 
     # dados da conexao
-    _db_connection = None
+    _db_pool = None
     _db_host = ""
     _db_username = ""
     _db_password = ""
     _db_schema = ""
 
-    # inicializa cache
-    _colunas_validas_cache = dict()
-    _tabelas_validas_cache = None
+    # conexão adiada do modo preguicoso: o caminho do j-son, True para os dados passados na criação do objeto ou None
+    # se não houver conexão pendente (ver _conectado)
+    _conexao_pendente = None
+    _lock_conexao = Lock()
+
+    # parametros do pool de conexoes
+    _pool_min = 1
+    _pool_max = 10
+    _pool_timeout = 30.0
+    _pool_tempo_max_ocioso = 300.0
+    _pool_tempo_max_vida = 3600.0
+    _pool_tempo_ping = 30.0
+
+    # pool das conexões que aceitam varios comandos por requisição, usado pelos lotes (criado pelo db_connect)
+    _pool_lote = None
+
+    # replicas de leitura (configuração e roteador criado pelo db_connect)
+    _db_replicas = ()
+    _selecao_replica = 'round_robin'
+    _janela_leitura_propria = 0.0
+    _replicas = None
+
+    # indice dos metadados do esquema (vai ser inicializado pelo __init__)
+    _indice_esquema = None
+    _pre_carrega_esquema = False
+
+    # cache das declarações sql compiladas (vai ser inicializado pelo __init__)
+    _cache_sql = None
+
+    # cache dos resultados das querys (vai ser inicializado pelo __init__)
+    _cache_resultados = None
+
+    # instrumentação das querys (vai ser inicializado pelo __init__)
+    _instrumentacao = None
+
+    # consultor de indices das querys geradas (vai ser inicializado pelo __init__)
+    _consultor = None
+
+    # max_allowed_packet do servidor, lido no primeiro insert em lote
+    _max_allowed_packet = None
+
+    # transação ativa de cada thread (vai ser inicializado pelo __init__)
+    _transacao_local = None
 
     # contador de querys
     _db_contador = 0
+    _lock_contador = Lock()
 
     # sinaliza se mostra mensagens de debug (vai ser inicializado pelo __init__)
     debug = None
 
     # valida entrada, configura e inicia a conexão com banco de dados
+    # pool_min, pool_max, pool_timeout, pool_tempo_max_ocioso, pool_tempo_max_vida e pool_tempo_ping configuram o
+    # pool de conexões (ver PoolConexoes), quando a configuração vem do j-son os valores da chave "pool" tem
+    # precedência.
+    # esquema_ttl - segundos apos os quais o indice de tabelas e colunas é recarregado, None nunca recarrega
+    #               automaticamente (use atualiza_esquema()).
+    # pre_carrega_esquema - se True carrega o indice do esquema ja ao conectar em vez de no primeiro uso.
+    # cache_sql_tamanho - quantidade de declarações sql compiladas mantidas em cache, 0 desativa o cache.
+    # cache_resultados_tamanho e cache_resultados_ttl - limites do cache de resultados usado pelas querys chamadas
+    #                                                   com usa_cache=True (ver CacheResultados).
+    # instrumentacao - se True coleta tempos, histogramas e o log de querys lentas desde o inicio (ver
+    #                  ativa_instrumentacao).
+    # limiar_query_lenta - segundos a partir dos quais uma query vai para o log de querys lentas.
+    # replicas, selecao_replica e janela_leitura_propria - replicas de leitura, ver set_db_replicas. Quando a
+    #                  configuração vem do j-son os valores das chaves de mesmo nome tem precedência.
+    # preguicoso - se True a criação do objeto não le o j-son nem abre conexões, a conexão é aberta no primeiro
+    #              comando (ver _conectado). Nesse modo o pre carregamento do esquema é feito apenas por aquece.
+    # aquece - se True conecta e carrega o indice do esquema em uma thread de fundo logo apos a criação do objeto,
+    #          util com preguicoso para adiantar o trabalho sem atrasar o inicio do programa.
     def __init__(self, hostname='', username='', password='', schema='',
-                 config="db_config.json", debug=False):
+                 config="db_config.json", debug=False, pool_min=1, pool_max=10, pool_timeout=30.0,
+                 pool_tempo_max_ocioso=300.0, pool_tempo_max_vida=3600.0, pool_tempo_ping=30.0,
+                 esquema_ttl=None, pre_carrega_esquema=False, cache_sql_tamanho=256, cache_resultados_tamanho=1024,
+                 cache_resultados_ttl=60.0, instrumentacao=False, limiar_query_lenta=1.0, replicas=None,
+                 selecao_replica='round_robin', janela_leitura_propria=0.0, preguicoso=False, aquece=False):
         # atualiza valor de debug
         self.debug = debug
         if self.debug:
             print("Iniciando db_helper %s" % VERSAO)
+        self._indice_esquema = IndiceEsquema(esquema_ttl, debug)
+        # no modo preguicoso a conexão é aberta dentro de uma carga do esquema, que não pode iniciar outra
+        self._pre_carrega_esquema = pre_carrega_esquema and not preguicoso
+        self._cache_sql = CacheSql(cache_sql_tamanho)
+        self._cache_resultados = CacheResultados(cache_resultados_tamanho, cache_resultados_ttl)
+        self._instrumentacao = Instrumentacao(instrumentacao, limiar_query_lenta, debug=debug)
+        self._consultor = ConsultorIndices(debug=debug)
+        self._transacao_local = local()
+        self.set_db_pool(pool_min, pool_max, pool_timeout, pool_tempo_max_ocioso, pool_tempo_max_vida,
+                         pool_tempo_ping)
+        self.set_db_replicas(replicas, selecao_replica, janela_leitura_propria)
 
         if hostname == '' and username == '' and password == '' and schema == '':
             # configura e inicia conexao a partir do j-son
-            self.configura_conexao_json(config)
+            if preguicoso:
+                self._conexao_pendente = config
+            else:
+                self.configura_conexao_json(config)
         elif hostname != '' and username != '' and password != '' and schema != '':
             # configura e inicia conexao a partir dos dados passados na criação do objeto
             self.set_db_host(hostname)
             self.set_db_username(username)
             self.set_db_password(password)
             self.set_db_schema(schema)
-            self.db_connect()
+            if preguicoso:
+                self._conexao_pendente = True
+            else:
+                self.db_connect()
+        if aquece:
+            Thread(target=self._aquece, name="db_helper_aquece", daemon=True).start()
+
+    # abre a conexão adiada pelo modo preguicoso, se houver. Retorna True se estiver conectado. Apenas uma thread
+    # conecta, as demais aguardam. Se a conexão falhar ela continua pendente e é tentada novamente no proximo comando.
+    def _conectado(self):
+        if self._db_pool is None and self._conexao_pendente is not None:
+            with self._lock_conexao:
+                if self._db_pool is None and self._conexao_pendente is not None:
+                    if self.debug:
+                        print("Abrindo a conexão adiada...")
+                    if self._conexao_pendente is True:
+                        conectou = self.db_connect()
+                    else:
+                        conectou = self.configura_conexao_json(self._conexao_pendente)
+                    if conectou:
+                        self._conexao_pendente = None
+        return self._db_pool is not None
+
+    # executado na thread de fundo de aquece: abre as conexões do pool e carrega o indice do esquema. Erros são
+    # ignorados, o primeiro comando tenta de novo.
+    def _aquece(self):
+        try:
+            if self._conectado():
+                self.indice_esquema()
+                if self.debug:
+                    print("Conexões e indice do esquema aquecidos.")
+        except Exception as e:
+            if self.debug:
+                print("Erro aquecendo o db_helper, ignorado:", str(e))
 
     # getter para __db_col_esc
     def get_db_col_esc(self):
@@ -107,11 +247,110 @@ class DbHelper(metaclass=Singleton):
     def get_db_attr_esc(self):
         return self.__db_attr_esc
 
+    # atalhos para as funções de validacoes_tabelas utilizados pelas funções de conversoes
+    def escapa_coluna(self, coluna):
+        return escapa_coluna(self, coluna)
+
+    def valida_e_escapa_coluna(self, item, tabelas):
+        return valida_e_escapa_coluna(self, item, tabelas)
+
+    # retorna o indice de tabelas e colunas do esquema, carregando-o no primeiro uso ou quando esquema_ttl expirar.
+    def indice_esquema(self):
+        self._indice_esquema.garante_carregado(self)
+        return self._indice_esquema
+
+    # recarrega imediatamente o indice do esquema, util apos alterações de estrutura (CREATE / ALTER TABLE...).
+    # As declarações compiladas em cache são descartadas junto.
+    def atualiza_esquema(self):
+        self._indice_esquema.carrega(self)
+
+    # retorna os contadores do cache de declarações sql compiladas (acertos, falhas, descartes...).
+    def estatisticas_cache_sql(self):
+        return self._cache_sql.estatisticas()
+
+    # retorna o tamanho do cache de resultados e os acertos, falhas, descartes e invalidações por tabela.
+    def estatisticas_cache_resultados(self):
+        return self._cache_resultados.estatisticas()
+
+    # liga ou desliga a instrumentação das querys, desligada o custo por comando é praticamente zero.
+    # limiar_query_lenta - se informado substitui o limiar do log de querys lentas, em segundos.
+    def ativa_instrumentacao(self, ativo=True, limiar_query_lenta=None):
+        if limiar_query_lenta is not None:
+            self._instrumentacao.limiar_lento = limiar_query_lenta
+        self._instrumentacao.ativo = ativo
+
+    # registra funções chamadas com a Medicao de cada comando antes da execução e depois do seu termino, a
+    # Medicao tem o contador, a operação, o sql, as tabelas, os tempos por etapa, as linhas e o erro (ou None).
+    def adiciona_hook_instrumentacao(self, antes=None, depois=None):
+        self._instrumentacao.adiciona_hook(antes, depois)
+
+    def remove_hook_instrumentacao(self, hook):
+        self._instrumentacao.remove_hook(hook)
+
+    # retorna os histogramas de latencia e linhas por forma de declaração e por tabela e o log de querys lentas.
+    def estatisticas_instrumentacao(self):
+        return self._instrumentacao.estatisticas()
+
+    # liga a amostragem do consultor de indices: uma fração taxa_amostragem das chamadas de db_query_col e
+    # db_query_col_like tem a forma da query analisada com EXPLAIN (uma vez por forma), 0 desliga. Ver
+    # relatorio_consultor.
+    def ativa_consultor(self, taxa_amostragem=0.01):
+        self._consultor.taxa_amostragem = taxa_amostragem
+
+    # retorna os relatorios do consultor de indices, um por forma de query analisada (sql, plano do EXPLAIN,
+    # varreduras_completas, varreduras_indice, filesort, temporaria, sugestoes e amostras), as formas com varreduras
+    # completas ou filesort primeiro. Cada sugestão é um dicionario com tabela, motivo e o ddl do indice sugerido.
+    def relatorio_consultor(self):
+        return self._consultor.relatorio()
+
+    # invalida os resultados em cache que leram alguma das tabelas escritas. Dentro de uma transação as tabelas
+    # são invalidadas de novo apos o commit, pois outras threads podem ter lido os dados anteriores nesse meio tempo.
+    def _invalida_resultados(self, tabelas):
+        self._cache_resultados.invalida_tabelas(tabelas)
+        if self._replicas is not None:
+            self._replicas.registra_escrita(tabelas)
+        transacao = self._transacao_atual()
+        if transacao is not None:
+            transacao.tabelas_alteradas.update(tabelas)
+
+    # executa a query consultando antes o cache de resultados se usa_cache for True. Resultados lidos dentro de uma
+    # transação não são guardados nem lidos do cache. Os resultados retornados do cache são copias.
+    def _db_fetch_all_com_cache(self, declaracao, argumentos, contador, usa_cache, formato='dict', medicao=None):
+        if not usa_cache or self._transacao_atual() is not None:
+            return self._db_fetch_all(declaracao.sql, argumentos, contador, formato, medicao, declaracao.tabelas)
+        chave = (declaracao.sql, chave_forma(argumentos), formato)
+        resultado = self._cache_resultados.obtem(chave, declaracao.tabelas)
+        if resultado is not None:
+            if self.debug:
+                print("c = %d - resultado obtido do cache" % contador)
+            if medicao is not None:
+                medicao.do_cache = True
+            res, msg, qtd = resultado
+            return copia_resultado(res, formato), msg, qtd
+        geracoes = self._cache_resultados.geracoes(declaracao.tabelas)
+        res, msg, qtd = self._db_fetch_all(declaracao.sql, argumentos, contador, formato, medicao,
+                                           declaracao.tabelas)
+        if res != -1:
+            self._cache_resultados.guarda(chave, (copia_resultado(res, formato), msg, qtd), declaracao.tabelas,
+                                          geracoes)
+        return res, msg, qtd
+
+    # retorna a declaração compilada para a forma identificada por chave, compilando-a com compilador(self, *args)
+    # apenas se ela não estiver no cache.
+    def _compila(self, chave, compilador, *args):
+        versao = self.indice_esquema().versao
+        declaracao = self._cache_sql.obtem(chave, versao)
+        if declaracao is None:
+            declaracao = compilador(self, *args)
+            self._cache_sql.guarda(chave, declaracao, versao)
+            if self.debug:
+                print("_compila - declaracao compilada:", declaracao.sql)
+        return declaracao
+
     # getter para contador de querys, garante que o retorno sera um valor da contagem, sem repetições.
     def le_e_incrementa_contador(self):
-        # faz essa operaçao atomica
-        lock = Lock()
-        with lock:
+        # faz essa operaçao atomica, o lock é compartilhado por todas as threads
+        with self._lock_contador:
             if self.debug:
                 print("Entrando no setor critico do contador...")
             # setor critico
@@ -146,17 +385,198 @@ class DbHelper(metaclass=Singleton):
     def set_db_password(self, password):
         self._db_password = password
 
+    # setter para os parametros do pool de conexoes, so tem efeito na proxima chamada de db_connect.
+    def set_db_pool(self, tamanho_min=1, tamanho_max=10, timeout=30.0, tempo_max_ocioso=300.0,
+                    tempo_max_vida=3600.0, tempo_ping=30.0):
+        self._pool_min = tamanho_min
+        self._pool_max = tamanho_max
+        self._pool_timeout = timeout
+        self._pool_tempo_max_ocioso = tempo_max_ocioso
+        self._pool_tempo_max_vida = tempo_max_vida
+        self._pool_tempo_ping = tempo_ping
+
+    # configura as replicas de leitura, aplicado na proxima chamada a db_connect. As escritas e as leituras dentro de
+    # transações vão sempre para o primario, as demais leituras (db_query_col, db_query_col_like, paginadas e em
+    # streaming) vão para as replicas.
+    # replicas - lista de replicas, cada uma 'host', 'host:porta' ou um dicionario com hostname, porta, username,
+    #            password e schema (os campos ausentes são os do primario). None ou [] desativa.
+    # selecao - 'round_robin' ou 'menos_carregada' (menos conexões emprestadas).
+    # janela_leitura_propria - segundos apos uma escrita em que as leituras das tabelas escritas vão para o
+    #                          primario, para que o processo leia as proprias escritas. 0 desativa.
+    def set_db_replicas(self, replicas=None, selecao='round_robin', janela_leitura_propria=0.0):
+        self._db_replicas = tuple(replicas or ())
+        self._selecao_replica = selecao
+        self._janela_leitura_propria = janela_leitura_propria
+
+    # retorna as leituras servidas pelo primario e por cada replica, as falhas e o estado dos pools das replicas, ou
+    # None se não houver replicas.
+    def estatisticas_replicas(self):
+        if self._replicas is None:
+            return None
+        return self._replicas.estatisticas()
+
+    # retorna as estatisticas do pool de conexoes (em uso, ociosas, tempo de espera...) ou None se nao conectado.
+    def estatisticas_pool(self):
+        if self._db_pool is None:
+            return None
+        return self._db_pool.estatisticas()
+
+    # abre uma conexão com o servidor. Os dados da conexão são os do primario e podem ser substituidos (replicas),
+    # extras são repassados ao pymysql.connect (local_infile, client_flag, autocommit...).
+    def _conecta(self, hostname=None, porta=None, username=None, password=None, schema=None, **extras):
+        return pymysql.connect(host=hostname if hostname is not None else self._db_host,
+                               port=porta or 3306,
+                               user=username if username is not None else self._db_username,
+                               password=password if password is not None else self._db_password,
+                               db=schema if schema is not None else self._db_schema,
+                               charset='utf8mb4',
+                               cursorclass=pymysql.cursors.DictCursor,
+                               **extras)
+
+    # cria uma nova conexão com o banco de dados, utilizado pelo pool sempre que precisa de uma conexão nova.
+    def _cria_conexao(self):
+        return self._conecta()
+
+    # cria uma conexão com o primario que aceita LOAD DATA LOCAL INFILE, usada apenas por db_carga_em_massa. As
+    # conexões do pool não habilitam local_infile, que permite ao servidor pedir arquivos locais ao cliente.
+    def _cria_conexao_carga(self):
+        return self._conecta(local_infile=True)
+
+    # cria uma conexão com o primario que aceita varios comandos separados por ; em uma unica requisição, usada
+    # apenas pelos lotes (ver lote). As conexões do pool principal não aceitam, assim um valor mal escapado em um
+    # comando isolado nunca consegue acrescentar outros comandos. Com autocommit cada comando do lote é confirmado
+    # isoladamente, sem uma ida e volta a mais para o COMMIT.
+    def _cria_conexao_lote(self):
+        return self._conecta(client_flag=CLIENT.MULTI_STATEMENTS, autocommit=True)
+
+    # cria uma nova conexão com uma replica, replica é um dicionario retornado por normaliza_replica.
+    def _cria_conexao_replica(self, replica):
+        return self._conecta(replica['hostname'], replica['porta'], replica['username'], replica['password'],
+                             replica['schema'])
+
+    # empresta uma conexão para leitura das tabelas, de uma replica se houver replicas disponiveis e nenhuma das
+    # tabelas tiver sido escrita dentro da janela de leitura propria, ou do primario. Retorna (pool, conexão).
+    def _empresta_leitura(self, tabelas=None):
+        if self._replicas is None:
+            return self._db_pool, self._db_pool.empresta()
+        candidatas = self._replicas.candidatas(tabelas)
+        for nome, pool in candidatas:
+            try:
+                conexao = pool.empresta()
+            except Exception as e:
+                self._replicas.falhou(nome, pool, e)
+                continue
+            self._replicas.usou(nome)
+            return pool, conexao
+        if candidatas:
+            self._replicas.usou_primario()
+        return self._db_pool, self._db_pool.empresta()
+
+    # versão de _conexao para leituras, fora de transações a conexão pode vir de uma replica (ver
+    # _empresta_leitura).
+    @contextmanager
+    def _conexao_leitura(self, tabelas=None):
+        if self._replicas is None or self._transacao_atual() is not None:
+            with self._conexao() as conexao:
+                yield conexao
+            return
+        pool, conexao = self._empresta_leitura(tabelas)
+        try:
+            yield conexao
+        finally:
+            pool.devolve(conexao)
+
+    # empresta uma conexão do pool para uso exclusivo dentro de um bloco with. Dentro de uma transação retorna
+    # sempre a conexão da transação, depois de enviar os inserts adiados.
+    def _conexao(self):
+        transacao = self._transacao_atual()
+        if transacao is not None:
+            transacao.descarrega()
+            return nullcontext(transacao.conexao)
+        return self._db_pool.conexao()
+
+    # retorna a transação ativa na thread chamadora ou None.
+    def _transacao_atual(self):
+        return getattr(self._transacao_local, 'transacao', None)
+
+    # unidade de trabalho: todos os comandos db_* executados pela thread dentro do bloco with usam a mesma conexão
+    # do pool e as escritas são confirmadas por um unico COMMIT ao final do bloco. Se o bloco terminar com uma
+    # exceção é feito ROLLBACK e a exceção continua subindo. Erros dos metodos db_* continuam sendo retornados como
+    # (-1, msg, 0), levante uma exceção para desfazer a transação.
+    # Blocos transacao() aninhados viram savepoints, desfeitos isoladamente se terminarem com exceção.
+    # agrupa_inserts - se True os db_insert da transação são acumulados e enviados como inserts de varias linhas
+    #                  antes do proximo comando ou do commit, nesse caso db_insert retorna (None, "Ok!", 1). Se esse
+    #                  envio falhar os comandos seguintes não são executados e retornam o erro de transação abortada
+    #                  e o bloco with termina em ROLLBACK levantando a exceção, mesmo que ninguem verifique os
+    #                  retornos.
+    # Ex: with helper.transacao():
+    #         helper.db_update(...)
+    #         helper.db_insert(...)
+    @contextmanager
+    def transacao(self, agrupa_inserts=False):
+        atual = self._transacao_atual()
+        if atual is not None:
+            with atual.savepoint():
+                yield atual
+            return
+        if not self._conectado():
+            raise Exception(self._msg_nao_conectado(-1))
+        limite_bytes = self.le_max_allowed_packet() - MARGEM_PACOTE if agrupa_inserts else None
+        conexao = self._db_pool.empresta()
+        transacao = Transacao(self, conexao, agrupa_inserts, limite_bytes)
+        self._transacao_local.transacao = transacao
+        try:
+            conexao.begin()
+            yield transacao
+            transacao.descarrega()
+            conexao.commit()
+            if self.debug:
+                print("transacao - commit")
+            self._cache_resultados.invalida_tabelas(transacao.tabelas_alteradas)
+            if self._replicas is not None:
+                self._replicas.registra_escrita(transacao.tabelas_alteradas)
+        except BaseException:
+            try:
+                conexao.rollback()
+            except Exception as e:
+                if self.debug:
+                    print("transacao - erro ignorado no rollback:", str(e))
+            if self.debug:
+                print("transacao - rollback")
+            raise
+        finally:
+            self._transacao_local.transacao = None
+            self._db_pool.devolve(conexao)
+
     # conecta ao bando de dados. Retorna True se a conexão ocorrer sem erros ou False para todos os outros casos.
+    # As conexões são mantidas em um pool, db_connect cria o pool e abre as pool_min conexões iniciais.
     def db_connect(self):
         try:
-            self._db_connection = pymysql.connect(host=self._db_host,
-                                                  user=self._db_username,
-                                                  password=self._db_password,
-                                                  db=self._db_schema,
-                                                  charset='utf8mb4',
-                                                  cursorclass=pymysql.cursors.DictCursor)
+            pool = PoolConexoes(self._cria_conexao, self._pool_min, self._pool_max, self._pool_timeout,
+                                self._pool_tempo_max_ocioso, self._pool_tempo_max_vida, self._pool_tempo_ping,
+                                self.debug)
+            pool.preenche()
+            replicas = self._conecta_replicas()
+            # as conexões dos lotes são abertas apenas no primeiro lote
+            pool_lote = PoolConexoes(self._cria_conexao_lote, 0, self._pool_max, self._pool_timeout,
+                                     self._pool_tempo_max_ocioso, self._pool_tempo_max_vida, self._pool_tempo_ping,
+                                     self.debug)
+            if self._db_pool is not None:
+                self._db_pool.fecha()
+            if self._pool_lote is not None:
+                self._pool_lote.fecha()
+            if self._replicas is not None:
+                self._replicas.fecha()
+            self._db_pool = pool
+            self._pool_lote = pool_lote
+            self._replicas = replicas
+            self._max_allowed_packet = None
             if self.debug:
                 print("Conectado com sucesso!")
+            if self._pre_carrega_esquema:
+                if self.debug:
+                    print("Pre carregando o indice do esquema...")
+                self.atualiza_esquema()
             return True
         except Exception as e:
             # imprime o erro na tela
@@ -164,12 +584,33 @@ class DbHelper(metaclass=Singleton):
                 print("Erro conectando ao db!", str(e))
             return False
 
+    # cria um pool para cada replica configurada e o roteador das leituras, retorna None se não houver replicas.
+    # Uma replica fora do ar não impede a conexão, ela fica de quarentena e as leituras vão para as demais.
+    def _conecta_replicas(self):
+        if not self._db_replicas:
+            return None
+        padrao = {'username': self._db_username, 'password': self._db_password, 'schema': self._db_schema}
+        pools = []
+        for replica in self._db_replicas:
+            replica = normaliza_replica(replica, padrao)
+            nome = replica['hostname'] + (":%d" % replica['porta'] if replica['porta'] else "")
+            pools.append((nome, PoolConexoes(partial(self._cria_conexao_replica, replica), self._pool_min,
+                                             self._pool_max, self._pool_timeout, self._pool_tempo_max_ocioso,
+                                             self._pool_tempo_max_vida, self._pool_tempo_ping, self.debug)))
+        roteador = RoteadorReplicas(pools, self._selecao_replica, self._janela_leitura_propria, debug=self.debug)
+        for nome, pool in pools:
+            try:
+                pool.preenche()
+            except Exception as e:
+                roteador.falhou(nome, pool, e)
+        return roteador
+
     # configura parametros da conexão com base em um arquivo j-son e inicia a conexao com o banco de dados. Retorna
     # True se a conexão ocorrer sem problemas ou False em todos os outros casos.
     def configura_conexao_json(self, arq):
         if self.debug:
             print("Checando se já existe uma conexão...")
-        if self._db_connection is None:
+        if self._db_pool is None:
             if self.debug:
                 print("Abrindo configuracao do db..")
             dados_padrao = {
@@ -179,12 +620,25 @@ class DbHelper(metaclass=Singleton):
                 "schema": "deliveryadm",
                 "json_ver": 1
             }
+            # importado apenas aqui para que importar o db_helper não carregue o criador_json
+            from criador_json import criador_json as cj
             config = cj.carrega_ou_cria_config(arq, dados_padrao)
             try:
                 self.set_db_host(config["hostname"])
                 self.set_db_username(config["username"])
                 self.set_db_password(config["password"])
                 self.set_db_schema(config["schema"])
+                # a configuracao do pool é opcional no j-son
+                pool = config.get("pool", {})
+                self.set_db_pool(pool.get("min", self._pool_min), pool.get("max", self._pool_max),
+                                 pool.get("timeout", self._pool_timeout),
+                                 pool.get("tempo_max_ocioso", self._pool_tempo_max_ocioso),
+                                 pool.get("tempo_max_vida", self._pool_tempo_max_vida),
+                                 pool.get("tempo_ping", self._pool_tempo_ping))
+                # replicas de leitura também são opcionais
+                self.set_db_replicas(config.get("replicas", self._db_replicas),
+                                     config.get("selecao_replica", self._selecao_replica),
+                                     config.get("janela_leitura_propria", self._janela_leitura_propria))
             except KeyError:
                 print("Não foi possível configurar a conexão, abortando...")
                 return False
@@ -195,101 +649,567 @@ class DbHelper(metaclass=Singleton):
             print("Conexão já iniciada previamente, saindo...")
         return True
 
-    def _db_fetch_all(self, sql, argumentos=None, contador=0):
-        if self._db_connection is None:
-            return -1, \
-                "c = %d - Erro! Não é possível executar comandos antes de conectar... use dbConnect() apos configurar \
-                host, usuario e password." % contador, 0
+    @staticmethod
+    def _msg_nao_conectado(contador):
+        return "c = %d - Erro! Não é possível executar comandos antes de conectar... use dbConnect() apos configurar \
+                host, usuario e password." % contador
+
+    # retorna True se o erro indica que a conexão com o servidor foi perdida (servidor reiniciado, timeout de
+    # ociosidade do servidor, queda de rede...). Nesses casos o pymysql ja fechou a conexão e o pool a descarta.
+    @staticmethod
+    def _conexao_perdida(erro):
+        match erro:
+            case pymysql.err.OperationalError(args=(codigo, *_)) if codigo in ERROS_CONEXAO_PERDIDA:
+                return True
+            case pymysql.err.InterfaceError():
+                return True
+        return False
+
+    # formatos diferentes de 'dict' usam o cursor de tuplas do pymysql, sem criar um dicionario por linha.
+    # medicao - Medicao da instrumentação ou None, recebe os tempos de conexão, execução e leitura.
+    def _executa_leitura(self, sql, argumentos, contador, formato='dict', medicao=None, tabelas=None):
+        classe_cursor = None if formato == 'dict' else pymysql.cursors.Cursor
+        with self._conexao_leitura(tabelas) as conexao, conexao.cursor(classe_cursor) as cursor:
+            if self.debug:
+                print("c = %d - debug sql -" % contador, cursor.mogrify(sql, argumentos))
+            if medicao is not None:
+                medicao.marca('conexao')
+            quantidade_rows_afetadas = cursor.execute(sql, argumentos)
+            if medicao is not None:
+                medicao.marca('execucao')
+            if self.debug:
+                print('c = %d - _db_fetch_all - qtd rows: %s' % (contador, quantidade_rows_afetadas))
+            result = cursor.fetchall()
+            if formato != 'dict':
+                result = converte_resultado(cabecalho_do_cursor(cursor), result, formato)
+            if medicao is not None:
+                medicao.marca('leitura')
+        return result, "Ok!", quantidade_rows_afetadas
+
+    # executa uma leitura sem ping previo, o pool so verifica conexões que ficaram ociosas por mais de
+    # pool_tempo_ping segundos. Como leituras são idempotentes, se a conexão tiver sido perdida a leitura é
+    # repetida uma vez em uma conexão nova. formato - ver db_helper.formatos.
+    # tabelas - tabelas lidas, usadas para escolher entre o primario e as replicas (ver _empresta_leitura).
+    def _db_fetch_all(self, sql, argumentos=None, contador=0, formato='dict', medicao=None, tabelas=None):
+        if not self._conectado():
+            return -1, self._msg_nao_conectado(contador), 0
         else:
             try:
-                with self._db_connection.cursor() as cursor:
-                    if self.debug:
-                        print("c = %d - _db_fetch_all - ping connection..." % contador)
-                    self._db_connection.ping(reconnect=True)
-                    if self.debug:
-                        print("c = %d - debug sql -" % contador, cursor.mogrify(sql, argumentos))
-                    quantidade_rows_afetadas = cursor.execute(sql, argumentos)
-                    if self.debug:
-                        print('c = %d - _db_fetch_all - qtd rows: %s' % (contador, quantidade_rows_afetadas))
-                    result = cursor.fetchall()
-                    # self._db_connection.close()
-                return result, "Ok!", quantidade_rows_afetadas
+                return self._executa_leitura(sql, argumentos, contador, formato, medicao, tabelas)
+            except Exception as e:
+                # dentro de uma transação a leitura não é repetida, a transação inteira foi perdida junto
+                if not self._conexao_perdida(e) or self._transacao_atual() is not None:
+                    return -1, "c = %d - Erro! " % contador + str(e), 0
+                if self.debug:
+                    print("c = %d - _db_fetch_all - conexao perdida, repetindo a leitura..." % contador, str(e))
+            try:
+                return self._executa_leitura(sql, argumentos, contador, formato, medicao, tabelas)
             except Exception as e:
-                # exit(1)
                 return -1, "c = %d - Erro! " % contador + str(e), 0
 
-    def _db_commit(self, sql, argumentos=None, contador=0):
-        if self._db_connection is None:
-            return -1, \
-                "c = %d - Erro! Não é possível executar comandos antes de conectar... use dbConnect() apos configurar \
-                host, usuario e password." % contador, 0
+    # executa um comando de escrita e faz o commit. Escritas não são repetidas automaticamente pois não é possível
+    # saber se o servidor chegou a executa-las antes da conexão cair. Dentro de uma transação o commit fica para o
+    # final da transação. Resultados em cache que leram alguma das tabelas são invalidados.
+    def _db_commit(self, sql, argumentos=None, contador=0, tabelas=(), medicao=None):
+        if not self._conectado():
+            return -1, self._msg_nao_conectado(contador), 0
         else:
             try:
-                with self._db_connection.cursor() as cursor:
-                    if self.debug:
-                        print('c = %d - _db_commit - ping connection...' % contador)
-                    self._db_connection.ping(reconnect=True)
+                em_transacao = self._transacao_atual() is not None
+                with self._conexao() as conexao, conexao.cursor() as cursor:
                     if self.debug:
                         print("c = %d - debug sql -" % contador, cursor.mogrify(sql, argumentos))
+                    if medicao is not None:
+                        medicao.marca('conexao')
                     quantidade_rows_afetadas = cursor.execute(sql, argumentos)
+                    if medicao is not None:
+                        medicao.marca('execucao')
                     if self.debug:
                         print('c = %d - _db_commit - qtd rows: %s | row id: %s' % (
                             contador, quantidade_rows_afetadas, cursor.lastrowid))
-                    self._db_connection.commit()
-                    # self._db_connection.close()
+                    if not em_transacao:
+                        conexao.commit()
+                        if medicao is not None:
+                            medicao.marca('commit')
+                self._invalida_resultados(tabelas)
                 return cursor.lastrowid, "Ok!", quantidade_rows_afetadas
             except Exception as e:
                 return -1, "c = %d - Erro! " % contador + str(e), 0
 
+    # compila (ou obtem do cache) a declaração de db_insert, retorna a tupla (declaracao, argumentos).
+    def _prepara_insert(self, tabela, colunas, valores):
+        valores = converte_em_lista(valores)
+        # a tabela e as colunas são validadas apenas na primeira compilação desta forma de insert
+        declaracao = self._compila(('insert', chave_forma(tabela), chave_forma(colunas), len(valores)),
+                                   compila_insert, tabela, colunas, len(valores))
+        return declaracao, valores
+
     def db_insert(self, tabela, colunas, valores):
-        # garante que tabela eh valida
-        tabela = valida_tabela(self, tabela)
-        # garante que entradas sao listas
-        # se alguma lista for None converte em [] e se for lista mesmo permanece igual
-        colunas = converte_em_lista(colunas)
         # valores vai ser filtrado internamente pelo pymysql no commit
         valores = converte_em_lista(valores)
-        sql = (DbHelper.__db_verbs['insert'] % (
-            escapa_coluna(self, tabela), concatena_colunas_separados_por_virgula_str(colunas, [tabela], True))
-               + '(' + ', '.join(['%s'] * len(valores)) + ');')
+        transacao = self._transacao_atual()
+        if transacao is not None and transacao.agrupa_inserts:
+            if transacao.erro is not None:
+                return -1, "c = %d - Erro! " % self.le_e_incrementa_contador() + transacao.msg_abortada(), 0
+            # o insert vai junto com os demais inserts da mesma tabela antes do proximo comando da transação
+            declaracao = self._compila(('insert_lote', chave_forma(tabela), chave_forma(colunas)),
+                                       compila_insert_lote, tabela, colunas)
+            transacao.adia_insert(declaracao.sql, len(converte_em_lista(colunas)), valores)
+            self._invalida_resultados(declaracao.tabelas)
+            return None, "Ok!", 1
+        contador = self.le_e_incrementa_contador()
+        medicao = self._instrumentacao.inicia(contador, 'db_insert')
+        declaracao, valores = self._prepara_insert(tabela, colunas, valores)
         if self.debug:
-            print('insert debug -', sql)
+            print('insert debug -', declaracao.sql)
             print('insert debug valores:', valores)
-        contador = self.le_e_incrementa_contador()
-        return self._db_commit(
-            sql,
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, valores)
+        ret = self._db_commit(
+            declaracao.sql,
             valores,
-            contador
+            contador,
+            declaracao.tabelas,
+            medicao
         )
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        return ret
 
-    def db_delete(self, tabela, varteste, valor):
-        # garante que tabela eh valida
-        tabela = valida_tabela(self, tabela)
-        # varteste vai ser testado dentro de checa_coluna
+    # retorna o max_allowed_packet do servidor, lido uma unica vez por conexão do helper.
+    def le_max_allowed_packet(self):
+        if self._max_allowed_packet is None:
+            c = self.le_e_incrementa_contador()
+            res, msg, qtd = self._db_fetch_all("SELECT @@max_allowed_packet AS max_allowed_packet;", None, c)
+            if res == -1:
+                raise Exception(msg)
+            self._max_allowed_packet = int(res[0]['max_allowed_packet'])
+        return self._max_allowed_packet
+
+    # envia as linhas em inserts de varias linhas montados com o prefixo e o sufixo da declaração retornada por
+    # compila(), ver db_insert_many. Retorna (lastrowid, lotes confirmados, mensagem de erro ou None) onde cada lote
+    # confirmado é uma tupla (quantidade de linhas, linhas afetadas).
+    def _db_executa_lotes(self, contador, medicao, compila, quantidade_colunas, linhas, tamanho_lote, commit_por_lote):
+        confirmados = []
+        em_transacao = self._transacao_atual() is not None
+        try:
+            declaracao = compila()
+            limite_bytes = self.le_max_allowed_packet() - MARGEM_PACOTE
+            if medicao is not None:
+                self._instrumentacao.antes(medicao, declaracao.sql + declaracao.sufixo, declaracao.tabelas)
+            with self._conexao() as conexao, conexao.cursor() as cursor:
+                pendentes = []
+                try:
+                    for sql, quantidade in monta_lotes_insert(conexao, declaracao.sql, quantidade_colunas, linhas,
+                                                              tamanho_lote, limite_bytes, declaracao.sufixo):
+                        if self.debug:
+                            print("c = %d - enviando lote com %d linhas" % (contador, quantidade))
+                        if medicao is not None:
+                            medicao.marca('montagem')
+                        pendentes.append((quantidade, cursor.execute(sql)))
+                        if medicao is not None:
+                            medicao.marca('execucao')
+                        if commit_por_lote and not em_transacao:
+                            conexao.commit()
+                            confirmados += pendentes
+                            pendentes = []
+                            if medicao is not None:
+                                medicao.marca('commit')
+                    if pendentes and not em_transacao:
+                        conexao.commit()
+                    confirmados += pendentes
+                except BaseException:
+                    if not em_transacao:
+                        conexao.rollback()
+                    raise
+                finally:
+                    self._invalida_resultados(declaracao.tabelas)
+            return cursor.lastrowid, confirmados, None
+        except Exception as e:
+            return -1, confirmados, "c = %d - Erro! " % contador + str(e)
+
+    # insere varias linhas enviando inserts de varias linhas por vez em vez de um insert e um commit por linha.
+    # tabela - tabela onde as linhas serão inseridas, validada uma unica vez.
+    # colunas - lista de colunas, validadas uma unica vez.
+    # linhas - qualquer iteravel (lista, gerador...) de linhas, cada linha uma lista ou tupla com um valor por coluna.
+    #          O iteravel é consumido aos poucos, nunca é materializado por inteiro.
+    # tamanho_lote - quantidade maxima de linhas por insert, cada insert também é limitado pelo max_allowed_packet.
+    # commit_por_lote - se True faz commit apos cada lote, se False faz um unico commit no final e desfaz tudo em
+    #                   caso de erro. Dentro de uma transação o commit fica sempre para o final da transação.
+    # Retorna (id da primeira linha do ultimo lote, "Ok!", total de linhas inseridas) ou (-1, mensagem de erro,
+    # total de linhas ja confirmadas).
+    def db_insert_many(self, tabela, colunas, linhas, tamanho_lote=1000, commit_por_lote=True):
+        contador = self.le_e_incrementa_contador()
+        if not self._conectado():
+            return -1, self._msg_nao_conectado(contador), 0
+        medicao = self._instrumentacao.inicia(contador, 'db_insert_many')
+        ultimo_id, lotes, erro = self._db_executa_lotes(
+            contador, medicao, lambda: self._compila(('insert_lote', chave_forma(tabela), chave_forma(colunas)),
+                                                     compila_insert_lote, tabela, colunas),
+            len(converte_em_lista(colunas)), linhas, tamanho_lote, commit_por_lote)
+        confirmadas = sum(afetadas for quantidade, afetadas in lotes)
+        ret = (-1, erro, confirmadas) if erro is not None else (ultimo_id, "Ok!", confirmadas)
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        return ret
+
+    # insere ou atualiza varias linhas com inserts de varias linhas e ON DUPLICATE KEY UPDATE, uma ida ao servidor
+    # por lote em vez de uma consulta seguida de um update ou insert por linha.
+    # tabela, colunas, linhas, tamanho_lote e commit_por_lote - ver db_insert_many.
+    # chave - coluna ou lista de colunas de uma chave primaria ou unica da tabela, incluidas em colunas. Quando a
+    #         chave ja existe as demais colunas da linha são atualizadas.
+    # Retorna ({'inseridas': i, 'atualizadas': a, 'inalteradas': n}, "Ok!", total de linhas enviadas) ou
+    # (-1, mensagem de erro, total de linhas ja confirmadas). As contagens são estimadas pelas linhas afetadas de
+    # cada lote (ver contagens_upsert) e são exatas quando nenhum lote mistura linhas inalteradas com atualizadas.
+    def db_upsert_many(self, tabela, colunas, linhas, chave, tamanho_lote=1000, commit_por_lote=True):
+        contador = self.le_e_incrementa_contador()
+        if not self._conectado():
+            return -1, self._msg_nao_conectado(contador), 0
+        medicao = self._instrumentacao.inicia(contador, 'db_upsert_many')
+        ultimo_id, lotes, erro = self._db_executa_lotes(
+            contador, medicao, lambda: self._compila(('upsert_lote', chave_forma(tabela), chave_forma(colunas),
+                                                      chave_forma(chave)),
+                                                     compila_upsert_lote, tabela, colunas, chave),
+            len(converte_em_lista(colunas)), linhas, tamanho_lote, commit_por_lote)
+        enviadas = sum(quantidade for quantidade, afetadas in lotes)
+        ret = (-1, erro, enviadas) if erro is not None else (contagens_upsert(lotes), "Ok!", enviadas)
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        return ret
+
+    # carrega linhas com o LOAD DATA LOCAL INFILE do servidor, bem mais rapido que inserts para cargas muito grandes.
+    # tabela e colunas são validadas como em db_insert_many, colunas vazia carrega todas as colunas da tabela.
+    # origem - caminho de um arquivo csv, enviado como esta, ou qualquer iteravel de linhas (ver db_insert_many),
+    #          consumido aos poucos e gravado em arquivos temporarios de ate linhas_por_arquivo linhas que são
+    #          carregados e apagados um a um (ver carga_em_massa). Valores None viram NULL.
+    # separador, fim_linha e ignora_linhas - formato do arquivo csv: separador de campos, fim de linha e quantidade
+    #          de linhas ignoradas no inicio (cabeçalho). Campos podem estar entre aspas duplas (aspas internas
+    #          dobradas) e \ não é caractere de escape. Os padrões leem os arquivos de db_exporta_query_col.
+    # commit_por_arquivo - se True faz commit apos cada arquivo temporario, se False um unico commit no final.
+    # A carga usa uma conexão propria com local_infile habilitado (o servidor também precisa de local_infile=ON) e
+    # por isso não pode ser feita dentro de uma transação.
+    # Retorna (None, "Ok!", total de linhas carregadas) ou (-1, mensagem de erro, linhas ja confirmadas).
+    def db_carga_em_massa(self, tabela, colunas, origem, linhas_por_arquivo=100000, separador=',', fim_linha='\n',
+                          ignora_linhas=0, commit_por_arquivo=True):
+        contador = self.le_e_incrementa_contador()
+        if not self._conectado():
+            return -1, self._msg_nao_conectado(contador), 0
+        if self._transacao_atual() is not None:
+            return -1, "c = %d - Erro! db_carga_em_massa não pode ser usada dentro de uma transação." % contador, 0
+        medicao = self._instrumentacao.inicia(contador, 'db_carga_em_massa')
+        csv = isinstance(origem, str)
+        confirmadas = 0
+        try:
+            declaracao = self._compila(('carga_em_massa', chave_forma(tabela), chave_forma(colunas), csv),
+                                       compila_carga_em_massa, tabela, colunas, csv)
+            quantidade_colunas = (len(converte_em_lista(colunas)) or
+                                  len(self.indice_esquema().colunas.get(declaracao.tabelas[0], [])))
+            if medicao is not None:
+                self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas)
+            conexao = self._cria_conexao_carga()
+            try:
+                with conexao.cursor() as cursor:
+                    if self.debug:
+                        print("c = %d - db_carga_em_massa -" % contador, declaracao.sql)
+                    if csv:
+                        pendentes = cursor.execute(declaracao.sql, [origem, separador, fim_linha, ignora_linhas])
+                    else:
+                        pendentes = 0
+                        for caminho, quantidade in arquivos_carga(origem, quantidade_colunas, linhas_por_arquivo):
+                            if self.debug:
+                                print("c = %d - db_carga_em_massa - carregando %d linhas" % (contador, quantidade))
+                            if medicao is not None:
+                                medicao.marca('montagem')
+                            pendentes += cursor.execute(declaracao.sql, [caminho])
+                            if medicao is not None:
+                                medicao.marca('execucao')
+                            if commit_por_arquivo:
+                                conexao.commit()
+                                confirmadas += pendentes
+                                pendentes = 0
+                    conexao.commit()
+                    confirmadas += pendentes
+            except BaseException:
+                conexao.rollback()
+                raise
+            finally:
+                conexao.close()
+                self._invalida_resultados(declaracao.tabelas)
+            ret = None, "Ok!", confirmadas
+        except Exception as e:
+            ret = -1, "c = %d - Erro! " % contador + str(e), confirmadas
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        return ret
+
+    # compila (ou obtem do cache) a declaração de db_delete, retorna a tupla (declaracao, argumentos).
+    def _prepara_delete(self, tabela, varteste, valor):
         # valor vai ser filtrado internamente pelo mysql no commit
-        sql = (self.get_db_verbs('delete') % (
-            escapa_coluna(self, tabela), valida_e_escapa_coluna(self, varteste, [tabela]))
-               + self.get_db_verbs('=v;'))
+        declaracao = self._compila(('delete', chave_forma(tabela), chave_forma(varteste)),
+                                   compila_delete, tabela, varteste)
+        return declaracao, valor
+
+    def db_delete(self, tabela, varteste, valor):
         contador = self.le_e_incrementa_contador()
-        return self._db_commit(sql, valor, contador)
+        medicao = self._instrumentacao.inicia(contador, 'db_delete')
+        declaracao, valor = self._prepara_delete(tabela, varteste, valor)
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, valor)
+        ret = self._db_commit(declaracao.sql, valor, contador, declaracao.tabelas, medicao)
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        return ret
+
+    # compila (ou obtem do cache) a declaração de db_update, retorna a tupla (declaracao, argumentos).
+    def _prepara_update(self, tabela, colunas, valores, varteste, valor):
+        # valores que são colunas ficam no texto do sql, os demais vão como parametros junto com valor e são
+        # filtrados internamente pelo mysql no commit
+        declaracao = self._compila(('update', chave_forma(tabela), chave_forma(colunas),
+                                    chave_valores(self, valores), chave_forma(varteste)),
+                                   compila_update, tabela, colunas, valores, varteste)
+        return declaracao, seleciona_parametros(valores, declaracao.indices_valores) + [valor]
 
     def db_update(self, tabela, colunas, valores, varteste, valor):
-        # garante que tabela eh valida
-        tabela = valida_tabela(self, tabela)
-        # garante que entradas sao listas
-        # se alguma lista for None converte em [] e se for lista mesmo permanece igual
-        colunas = converte_em_lista(colunas)
-        valores = converte_em_lista(valores)
-        # varteste vai ser testado dentro de checa_coluna
-        # valor vai ser filtrado internamente pelo mysql no commit
-        sql = (self.get_db_verbs('update') % (
-            escapa_coluna(self, tabela), concatena_listas_em_pares_chave_valor_str(self, colunas, valores, [tabela]),
-            valida_e_escapa_coluna(self, varteste, [tabela])) + self.get_db_verbs('=v;'))
         contador = self.le_e_incrementa_contador()
-        return self._db_commit(sql, valor, contador)
+        medicao = self._instrumentacao.inicia(contador, 'db_update')
+        declaracao, argumentos = self._prepara_update(tabela, colunas, valores, varteste, valor)
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+        ret = self._db_commit(declaracao.sql, argumentos, contador, declaracao.tabelas, medicao)
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        return ret
+
+    # retorna um lote vazio. Os metodos db_query_col, db_query_col_like, db_insert, db_update e db_delete do lote
+    # recebem os mesmos parametros do helper e acumulam os comandos, executa() envia todos eles em uma unica
+    # requisição e retorna a lista das tuplas (res, msg, qtd) de cada comando, na ordem em que foram adicionados.
+    # Cada comando é confirmado isoladamente e o erro de um comando não impede os demais. Os lotes usam conexões
+    # proprias do primario (inclusive para as leituras) e não usam o cache de resultados. Dentro de uma transação
+    # os comandos são executados um a um na conexão da transação.
+    # Ex: lote = helper.lote()
+    #     lote.db_query_col('usuario', [], 'id', 1)
+    #     lote.db_update('pedido', 'valor', 10, 'id', 5)
+    #     (usuario, msg, qtd), (id_pedido, msg_update, alteradas) = lote.executa()
+    def lote(self):
+        return LoteComandos(self)
+
+    # executa os comandos (ComandoLote) de um lote, ver lote.
+    def _db_executa_lote(self, comandos):
+        contador = self.le_e_incrementa_contador()
+        if not comandos:
+            return []
+        if not self._conectado():
+            return [(-1, self._msg_nao_conectado(contador), 0)] * len(comandos)
+        medicao = self._instrumentacao.inicia(contador, 'lote')
+        if medicao is not None:
+            tabelas = list(dict.fromkeys(tabela for comando in comandos for tabela in comando.tabelas))
+            self._instrumentacao.antes(medicao, "\n".join(comando.sql for comando in comandos), tabelas,
+                                       [comando.argumentos for comando in comandos])
+        if self._transacao_atual() is not None:
+            # a conexão da transação não aceita varios comandos por requisição
+            resultados = [self._db_commit(comando.sql, comando.argumentos, contador, comando.tabelas, medicao)
+                          if comando.escrita else
+                          self._db_fetch_all(comando.sql, comando.argumentos, contador, comando.formato, medicao,
+                                             comando.tabelas)
+                          for comando in comandos]
+        else:
+            resultados = self._db_executa_multiplos(comandos, contador, medicao)
+        if medicao is not None:
+            erros = [msg for res, msg, qtd in resultados if isinstance(res, int) and res == -1]
+            self._instrumentacao.depois(medicao, (None, "Ok!", sum(qtd for res, msg, qtd in resultados))
+                                        if not erros else (-1, erros[0], 0))
+        if self.debug:
+            print("c = %d - lote ret -" % contador, resultados)
+        return resultados
+
+    # envia os comandos separados por ; em uma requisição e percorre os resultados com nextset(). O servidor para
+    # no primeiro comando com erro, esse comando recebe o erro e os seguintes são enviados de novo em uma nova
+    # requisição. Se a conexão cair os comandos ainda sem resultado recebem o erro, sem serem repetidos, pois não é
+    # possivel saber se o servidor chegou a executa-los. A exceção é um lote so de leituras que perde a conexão
+    # antes do primeiro resultado, repetido uma vez em uma conexão nova como em _db_fetch_all.
+    def _db_executa_multiplos(self, comandos, contador, medicao, repetir=True):
+        resultados = [None] * len(comandos)
+        escritas = set()
+        try:
+            conexao = self._pool_lote.empresta()
+            # uma conexão com resultados pendentes não pode voltar ao pool
+            descartar = True
+            try:
+                with conexao.cursor(pymysql.cursors.Cursor) as cursor:
+                    sqls = [cursor.mogrify(comando.sql, comando.argumentos) for comando in comandos]
+                    if medicao is not None:
+                        medicao.marca('conexao')
+                    indice = 0
+                    while indice < len(comandos):
+                        if self.debug:
+                            print("c = %d - lote - enviando %d comandos:" % (contador, len(comandos) - indice),
+                                  sqls[indice:])
+                        try:
+                            cursor.execute("\n".join(sqls[indice:]))
+                            while True:
+                                resultados[indice] = self._resultado_lote(cursor, comandos[indice])
+                                if comandos[indice].escrita:
+                                    escritas.update(comandos[indice].tabelas)
+                                indice += 1
+                                if indice == len(comandos) or not cursor.nextset():
+                                    break
+                        except pymysql.err.MySQLError as e:
+                            if self._conexao_perdida(e):
+                                raise
+                            resultados[indice] = (-1, "c = %d - Erro! " % contador + str(e), 0)
+                            indice += 1
+                    if medicao is not None:
+                        medicao.marca('execucao')
+                descartar = False
+            finally:
+                self._pool_lote.devolve(conexao, descartar)
+        except Exception as e:
+            if (repetir and self._conexao_perdida(e) and all(resultado is None for resultado in resultados) and
+                    not any(comando.escrita for comando in comandos)):
+                if self.debug:
+                    print("c = %d - lote - conexao perdida, repetindo as leituras..." % contador, str(e))
+                return self._db_executa_multiplos(comandos, contador, medicao, False)
+            msg = "c = %d - Erro! " % contador + str(e)
+            resultados = [(-1, msg, 0) if resultado is None else resultado for resultado in resultados]
+        self._invalida_resultados(escritas)
+        return resultados
+
+    # le o resultado do comando atual do cursor de um lote no formato do retorno do metodo equivalente do helper.
+    @staticmethod
+    def _resultado_lote(cursor, comando):
+        if comando.escrita:
+            return cursor.lastrowid, "Ok!", cursor.rowcount
+        linhas = cursor.fetchall()
+        return converte_resultado(cabecalho_do_cursor(cursor), linhas, comando.formato), "Ok!", len(linhas)
+
+    # executa compila(quantidade) para cada bloco de ate tamanho_bloco chaves, com os parametros seguidos das chaves
+    # do bloco. Levanta Exception no primeiro erro, retorna o total de linhas afetadas.
+    def _db_commit_em_blocos(self, contador, medicao, compila, parametros, chaves, tamanho_bloco):
+        total = 0
+        for bloco in divide_em_blocos(chaves, tamanho_bloco):
+            declaracao = compila(len(bloco))
+            if medicao is not None and medicao.sql is None:
+                self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas)
+            res, msg, qtd = self._db_commit(declaracao.sql, parametros(declaracao) + bloco, contador,
+                                            declaracao.tabelas, medicao)
+            if res == -1:
+                raise Exception(msg)
+            total += qtd
+        return total
+
+    # carrega as chaves em uma tabela temporaria do tipo da coluna varteste e executa a declaração de compila(None),
+    # que faz o JOIN com essa tabela, em um unico comando. Levanta Exception no primeiro erro, retorna o total de
+    # linhas afetadas.
+    def _db_commit_com_tabela_chaves(self, contador, medicao, tabela, varteste, compila, parametros, chaves,
+                                     tamanho_bloco):
+        criacao = self._compila(('cria_tabela_chaves', chave_forma(tabela), chave_forma(varteste)),
+                                compila_cria_tabela_chaves, tabela, varteste)
+        for sql in (SQL_REMOVE_TABELA_CHAVES, criacao.sql):
+            res, msg, qtd = self._db_commit(sql, None, contador)
+            if res == -1:
+                raise Exception(msg)
+        try:
+            # NULL não é igual a nenhuma chave, como no caminho com IN, e não cabe na chave primaria da tabela
+            ultimo_id, lotes, erro = self._db_executa_lotes(
+                contador, None, lambda: DeclaracaoCompilada(PREFIXO_INSERT_CHAVES, [], (), (), SUFIXO_INSERT_CHAVES),
+                1, (chave for chave in chaves if chave is not None), tamanho_bloco, False)
+            if erro is not None:
+                raise Exception(erro)
+            declaracao = compila(None)
+            if medicao is not None:
+                self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas)
+            res, msg, qtd = self._db_commit(declaracao.sql, parametros(declaracao) or None, contador,
+                                            declaracao.tabelas, medicao)
+            if res == -1:
+                raise Exception(msg)
+            return qtd
+        finally:
+            self._db_commit(SQL_REMOVE_TABELA_CHAVES, None, contador)
+
+    # executa o delete / update em lote dentro de uma transação (ou savepoint se ja houver uma), ver db_delete_many.
+    def _db_commit_many(self, operacao, tabela, varteste, chaves, tamanho_bloco, tabela_temporaria, compila,
+                        parametros):
+        contador = self.le_e_incrementa_contador()
+        if not self._conectado():
+            return -1, self._msg_nao_conectado(contador), 0
+        medicao = self._instrumentacao.inicia(contador, operacao)
+        try:
+            with self.transacao():
+                if tabela_temporaria:
+                    total = self._db_commit_com_tabela_chaves(contador, medicao, tabela, varteste, compila,
+                                                              parametros, chaves, tamanho_bloco)
+                else:
+                    total = self._db_commit_em_blocos(contador, medicao, compila, parametros, chaves, tamanho_bloco)
+            ret = None, "Ok!", total
+        except Exception as e:
+            ret = -1, "c = %d - Erro! " % contador + str(e), 0
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        return ret
+
+    # apaga as linhas cuja coluna varteste tem algum dos valores de chaves, com um delete por bloco de ate
+    # tamanho_bloco chaves (WHERE varteste IN (...)) em vez de um delete e um commit por chave. Todos os blocos são
+    # executados em uma unica transação, um erro desfaz todos.
+    # chaves - qualquer iteravel de valores, consumido aos poucos.
+    # tabela_temporaria - se True as chaves são inseridas em lotes em uma tabela temporaria e as linhas são apagadas
+    #                     por um unico delete com JOIN, indicado para conjuntos muito grandes de chaves. Chaves None
+    #                     são ignoradas e, com o sql_mode estrito (padrão), uma chave que não cabe no tipo da coluna
+    #                     (fora da faixa, texto longo demais) é um erro em vez de ser truncada para outra chave.
+    # Retorna (None, "Ok!", total de linhas apagadas) ou (-1, mensagem de erro, 0).
+    def db_delete_many(self, tabela, varteste, chaves, tamanho_bloco=1000, tabela_temporaria=False):
+        return self._db_commit_many(
+            'db_delete_many', tabela, varteste, chaves, tamanho_bloco, tabela_temporaria,
+            lambda quantidade: self._compila(('delete_lote', chave_forma(tabela), chave_forma(varteste),
+                                              quantidade),
+                                             compila_delete_em_lote, tabela, varteste, quantidade),
+            lambda declaracao: [])
+
+    # atualiza as colunas com os valores (ver db_update) nas linhas cuja coluna varteste tem algum dos valores de
+    # chaves, em blocos de ate tamanho_bloco chaves dentro de uma unica transação. Ver db_delete_many.
+    # Retorna (None, "Ok!", total de linhas alteradas) ou (-1, mensagem de erro, 0).
+    def db_update_many(self, tabela, colunas, valores, varteste, chaves, tamanho_bloco=1000,
+                       tabela_temporaria=False):
+        return self._db_commit_many(
+            'db_update_many', tabela, varteste, chaves, tamanho_bloco, tabela_temporaria,
+            lambda quantidade: self._compila(('update_lote', chave_forma(tabela), chave_forma(colunas),
+                                              chave_valores(self, valores), chave_forma(varteste), quantidade),
+                                             compila_update_em_lote, tabela, colunas, valores, varteste, quantidade),
+            lambda declaracao: seleciona_parametros(valores, declaracao.indices_valores))
+
+    # compila (ou obtem do cache) a declaração de db_query_col e monta a lista de argumentos, retorna a tupla
+    # (declaracao, argumentos) onde argumentos é None quando a query não tem parametros.
+    def _prepara_query_col(self, tabelas, colunas, var_teste_list, gui_valor_list, orderby, ascendent,
+                           colunas_test_list, valores_test_list):
+        # o sql depende apenas da forma da chamada e é compilado uma unica vez por forma
+        declaracao = self._compila(('query_col', chave_forma(tabelas), chave_forma(colunas),
+                                    chave_forma(var_teste_list), chave_forma(orderby), bool(ascendent),
+                                    chave_forma(colunas_test_list), chave_valores(self, valores_test_list)),
+                                   compila_query_col, tabelas, colunas, var_teste_list, orderby, ascendent,
+                                   colunas_test_list, valores_test_list)
+        # faz gui_valor_list uma lista, seu conteudo sera checado internamente pelo mysql commit
+        # os valores de valores_test_list que não são colunas são parametros depois de gui_valor_list
+        gui_valor_list = (converte_em_lista(gui_valor_list) +
+                          seleciona_parametros(valores_test_list, declaracao.indices_valores))
+        # gui_valor_list sera sanitizada pelo pymsql
+        return declaracao, gui_valor_list or None
+
+    # compila (ou obtem do cache) a declaração de db_query_col_like e monta a lista de termos procurados seguida do
+    # limite, retorna a tupla (declaracao, argumentos) onde argumentos é None quando não há termos.
+    def _prepara_query_col_like(self, tabela, colunas, lista_vartestes, lista_valores, orderby, ascendent,
+                                modo='contem', limite=None):
+        # 'auto' é resolvido a cada chamada, a declaração fica no cache pelo modo efetivo
+        modo = resolve_modo_busca(self, tabela, lista_vartestes, modo)
+        declaracao = self._compila(('query_col_like', chave_forma(tabela), chave_forma(colunas),
+                                    chave_forma(lista_vartestes), chave_forma(orderby), ascendent, modo,
+                                    limite is not None),
+                                   compila_query_col_like, tabela, colunas, lista_vartestes, orderby, ascendent, modo,
+                                   limite is not None)
+        # lista_valores é uma sub string ou lista de sub strings fornecidos pelo usuario para procura
+        termos_procura = termos_busca(lista_valores, modo) + [limite] * (limite is not None)
+        return declaracao, termos_procura or None
 
     def db_query_col(self, tabelas, colunas, var_teste_list=None, gui_valor_list=None, orderby=None, ascendent=True,
-                     colunas_test_list=None, valores_test_list=None):
+                     colunas_test_list=None, valores_test_list=None, usa_cache=False, formato='dict'):
         # tabelas - lista de tabelas que serao usadas na query se mais de uma for especificada usa JOIN para uni-las.
         # colunas - lista de colunas que serao retornadas na query se uma coluna for especificada em uma tupla junto
         #           com um alias sera usada a clausula AS para especificar o alias, se for especificado uma lista
@@ -303,47 +1223,31 @@ class DbHelper(metaclass=Singleton):
         #           com orderby.
         # colunas_test_list - lista de colunas a serem comparadas na clausula where
         # valores_test_list - lista de valores a serem comparadas ma clausula WHERE
-
-        # garante que todos os parametros que aceitam listas sao listas
-        # adicionalmente filtra com checa_tabela
-        tabelas = converte_em_lista(tabelas, valida_tabela)
-        # colunas sera filtrado por checa_colunas
-        colunas = converte_em_lista(colunas)
-        # var_teste_list sera filtrado por checa_coluna
-        var_teste_list = converte_em_lista(var_teste_list)
-        # faz gui_valor_list uma lista, seu conteudo sera checado internamente pelo mysql commit
-        gui_valor_list = converte_em_lista(gui_valor_list)
-        # colunas_test_list sera filtrado por checa_coluna
-        colunas_test_list = converte_em_lista(colunas_test_list)
-        # valores_test_list sera filtrado por converte_item_str
-        valores_test_list = converte_em_lista(valores_test_list)
-
-        # monta string sql sem uso de condicional (rende todas as substrings e descartas as nao aplicaveis)
-        sql = (self.get_db_verbs('select') % (
-            concatena_colunas_separados_por_virgula_str(colunas, tabelas, False),
-            self.get_db_verbs('join').join(list(map(lambda tab: escapa_coluna(self, tab), tabelas)))
-        ) + self.get_db_verbs('where') * (len(var_teste_list) > 0 or len(colunas_test_list) > 0) +
-               (self.get_db_verbs('and').join(converte_em_lista(var_teste_list, lambda col: valida_e_escapa_coluna(
-                   self, col, tabelas) + " = %s"))) * (len(var_teste_list) > 0) +
-               self.get_db_verbs('and') * (len(colunas_test_list) > 0 and len(var_teste_list) > 0) +
-               concatena_listas_em_pares_chave_valor_str(self, colunas_test_list, valores_test_list, tabelas,
-                                                         self.get_db_verbs('and')) + self.get_db_verbs('orderby')
-               % valida_e_escapa_coluna(self, orderby, tabelas) * (orderby is not None) +
-               self.get_db_verbs('asc') * (orderby is not None and ascendent) +
-               self.get_db_verbs('desc') * (orderby is not None and not ascendent) + ";")
-
-        # gui_valor_list sera sanitizada pelo pymsql
-        tupla = (sql, None) * (len(gui_valor_list) == 0) + (sql, gui_valor_list) * (len(gui_valor_list) > 0)
-
+        # usa_cache - se True o resultado é lido do / guardado no cache de resultados, invalidado automaticamente
+        #           por escritas feitas pelo helper nas tabelas da query.
+        # formato - formato do resultado: 'dict' (padrão) uma lista de dicionarios, 'tupla' (cabecalho, linhas) com
+        #           as linhas como tuplas, 'linha' uma lista de namedtuples, 'colunar' um dicionario coluna -> lista de
+        #           valores ou 'numpy' um dicionario coluna -> numpy.ndarray (requer numpy).
+        valida_formato(formato)
         contador = self.le_e_incrementa_contador()
-        # db_fetch_all(*tupla) - argument packing
-        ret = self._db_fetch_all(*tupla, contador)
+        medicao = self._instrumentacao.inicia(contador, 'db_query_col')
+        with self._instrumentacao.montagem(medicao):
+            declaracao, argumentos = self._prepara_query_col(tabelas, colunas, var_teste_list, gui_valor_list,
+                                                             orderby, ascendent, colunas_test_list, valores_test_list)
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+        ret = self._db_fetch_all_com_cache(declaracao, argumentos, contador, usa_cache, formato, medicao)
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        if self._consultor.sorteia():
+            self._consultor.amostra(self, declaracao.sql, argumentos, declaracao.tabelas, contador)
         if self.debug:
             print("c = %d - db_query_col ret -" % contador, ret)
         return ret
 
     def db_query_col_like(
-            self, tabela, colunas, lista_vartestes=None, lista_valores=None, orderby=None, ascendent=True):
+            self, tabela, colunas, lista_vartestes=None, lista_valores=None, orderby=None, ascendent=True,
+            usa_cache=False, formato='dict', modo='contem', limite=None):
         # tabela - tabela a ser usada na query
         # colunas - lista de colunas ou atributos que serao retornado na query
         # lista_varteste - lista de colunas a serem testadas com os parametros literals fornecidos pelo usuario
@@ -351,33 +1255,342 @@ class DbHelper(metaclass=Singleton):
         # valores - lista de valores fornecidos pelo usuario proveniente da gui
         # orderby - atributo opcional a ser utilizado para ordernar os resultados da query
         # ascendent - True ou False, parametro que define se a ordem da ordenação é ascendente ou decrescente
-
-        # filtra tabela com checa_tabela
-        tabela = valida_tabela(self, tabela)
-        # faz listas todas os parametros de entrada que aceitam listas
-        colunas = converte_em_lista(colunas)
-        lista_vartestes = converte_em_lista(lista_vartestes)
-        # lista_valores é uma sub string ou lista de sub strings fornecidos pelo usuario para procura
-        termos_procura = converte_em_lista(lista_valores, lambda valor: "%" + str(valor) + "%")
-
-        # composição condicional de string
-        sql = (self.get_db_verbs('select') % (
-            concatena_colunas_separados_por_virgula_str(
-                colunas, [tabela], False), escapa_coluna(self, tabela)
-        ) + self.get_db_verbs('where') + self.get_db_verbs('or').join(
-            list(map(lambda varteste: varteste + self.get_db_verbs('like'),
-                     converte_em_lista(lista_vartestes, lambda col: valida_e_escapa_coluna(self, col, [tabela]))))
-        ) + self.get_db_verbs('orderby') % valida_e_escapa_coluna(self, orderby, [tabela]) * (orderby is not None)
-               + self.get_db_verbs('asc') * (orderby is not None and ascendent is True) +
-               self.get_db_verbs('desc') * (orderby is not None and ascendent is False) + ";")
-
-        tupla = (sql, None) * (len(termos_procura) == 0) + (sql, termos_procura) * (len(termos_procura) > 0)
+        # usa_cache - se True utiliza o cache de resultados, ver db_query_col.
+        # formato - formato do resultado, ver db_query_col.
+        # modo - modo de busca: 'contem' (padrão) LIKE '%valor%' em cada coluna, não usa indices; 'prefixo' LIKE
+        #        'valor%', usa o indice que começa pela coluna; 'booleano' MATCH ... AGAINST em BOOLEAN MODE com cada
+        #        palavra obrigatoria e procurada como prefixo; 'natural' MATCH ... AGAINST em NATURAL LANGUAGE MODE,
+        #        linhas mais relevantes primeiro se não houver orderby; 'auto' usa 'booleano' se houver um indice
+        #        FULLTEXT com exatamente as colunas de lista_vartestes, senão 'prefixo' se todas as colunas tiverem um
+        #        indice, senão 'contem'. Os modos com MATCH usam todos os valores em um unico termo.
+        # limite - quantidade maxima de linhas retornadas (LIMIT), None sem limite.
+        valida_formato(formato)
         contador = self.le_e_incrementa_contador()
-        ret = self._db_fetch_all(*tupla, contador)
+        medicao = self._instrumentacao.inicia(contador, 'db_query_col_like')
+        with self._instrumentacao.montagem(medicao):
+            declaracao, argumentos = self._prepara_query_col_like(tabela, colunas, lista_vartestes, lista_valores,
+                                                                  orderby, ascendent, modo, limite)
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+        ret = self._db_fetch_all_com_cache(declaracao, argumentos, contador, usa_cache, formato, medicao)
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, ret)
+        if self._consultor.sorteia():
+            self._consultor.amostra(self, declaracao.sql, argumentos, declaracao.tabelas, contador)
         if self.debug:
             print("c = %d - db_query_col_like ret -" % contador, ret)
         return ret
 
+    # analisa sob demanda, com EXPLAIN, a query que db_query_col montaria para os mesmos parametros, sem executa-la.
+    # Retorna (relatorio, "Ok!", linhas do plano) ou (-1, mensagem de erro, 0), ver relatorio_consultor.
+    def db_explica_query_col(self, tabelas, colunas, var_teste_list=None, gui_valor_list=None, orderby=None,
+                             ascendent=True, colunas_test_list=None, valores_test_list=None):
+        contador = self.le_e_incrementa_contador()
+        try:
+            declaracao, argumentos = self._prepara_query_col(tabelas, colunas, var_teste_list, gui_valor_list,
+                                                             orderby, ascendent, colunas_test_list, valores_test_list)
+            relatorio = self._consultor.analisa(self, declaracao.sql, argumentos, declaracao.tabelas, contador)
+        except Exception as e:
+            return -1, "c = %d - Erro! " % contador + str(e), 0
+        return relatorio, "Ok!", len(relatorio['plano'])
+
+    # versão de db_explica_query_col para db_query_col_like, mesmos parametros de db_query_col_like.
+    def db_explica_query_col_like(self, tabela, colunas, lista_vartestes=None, lista_valores=None, orderby=None,
+                                  ascendent=True, modo='contem', limite=None):
+        contador = self.le_e_incrementa_contador()
+        try:
+            declaracao, argumentos = self._prepara_query_col_like(tabela, colunas, lista_vartestes, lista_valores,
+                                                                  orderby, ascendent, modo, limite)
+            relatorio = self._consultor.analisa(self, declaracao.sql, argumentos, declaracao.tabelas, contador)
+        except Exception as e:
+            return -1, "c = %d - Erro! " % contador + str(e), 0
+        return relatorio, "Ok!", len(relatorio['plano'])
+
+    # paginação por chave (keyset) sobre db_query_col, cada pagina é uma busca por faixa no indice de orderby em vez
+    # de um OFFSET que obriga o servidor a ler e descartar todas as linhas das paginas anteriores.
+    # Os primeiros parametros são os mesmos de db_query_col, a ordenação usa orderby (opcional) seguido da chave
+    # primaria da primeira tabela como desempate, todas na direção de ascendent. orderby não deve ter valores NULL.
+    # Em joins o desempate so é unico se cada linha da primeira tabela aparecer no maximo uma vez no resultado, isto
+    # é, se a primeira tabela for o lado "muitos" do join (ex: ['pedido', 'usuario'] e não ['usuario', 'pedido']),
+    # caso contrario linhas com a mesma chave podem ser puladas entre as paginas.
+    # tamanho_pagina - quantidade maxima de linhas por pagina.
+    # cursor_pagina - None para a primeira pagina ou o cursor retornado pela pagina anterior.
+    # Retorna (linhas, msg, qtd, proximo_cursor), proximo_cursor é None na ultima pagina.
+    def db_query_col_paginado(self, tabelas, colunas, var_teste_list=None, gui_valor_list=None, orderby=None,
+                              ascendent=True, colunas_test_list=None, valores_test_list=None, tamanho_pagina=100,
+                              cursor_pagina=None):
+        contador = self.le_e_incrementa_contador()
+        medicao = self._instrumentacao.inicia(contador, 'db_query_col_paginado')
+        com_cursor = cursor_pagina is not None
+        with self._instrumentacao.montagem(medicao):
+            declaracao = self._compila(('query_col_paginado', chave_forma(tabelas), chave_forma(colunas),
+                                        chave_forma(var_teste_list), chave_forma(orderby), bool(ascendent),
+                                        chave_forma(colunas_test_list), chave_valores(self, valores_test_list),
+                                        com_cursor),
+                                       compila_query_col_paginado, tabelas, colunas, var_teste_list, orderby,
+                                       bool(ascendent), colunas_test_list, valores_test_list, com_cursor)
+            valores_chave = decodifica_cursor_pagina(cursor_pagina, len(declaracao.colunas_chave))
+        # busca uma linha a mais para saber se existe proxima pagina
+        argumentos = (converte_em_lista(gui_valor_list) +
+                      seleciona_parametros(valores_test_list, declaracao.indices_valores) +
+                      argumentos_keyset(valores_chave or []) + [tamanho_pagina + 1])
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+        res, msg, qtd = self._db_fetch_all(declaracao.sql, argumentos, contador, medicao=medicao,
+                                           tabelas=declaracao.tabelas)
+        if res == -1:
+            if medicao is not None:
+                self._instrumentacao.depois(medicao, (res, msg, qtd))
+            return res, msg, qtd, None
+        proximo_cursor = None
+        if len(res) > tamanho_pagina:
+            res = res[:tamanho_pagina]
+            with self._instrumentacao.montagem(medicao):
+                proximo_cursor = codifica_cursor_pagina([res[-1][apelido] for apelido in declaracao.colunas_chave])
+        # remove das linhas os apelidos das colunas de ordenação
+        for linha in res:
+            for apelido in declaracao.colunas_chave:
+                del linha[apelido]
+        if medicao is not None:
+            self._instrumentacao.depois(medicao, (res, msg, len(res)))
+        if self.debug:
+            print("c = %d - db_query_col_paginado ret -" % contador, res, proximo_cursor)
+        return res, msg, len(res), proximo_cursor
+
+    # executa a query com um cursor sem buffer no servidor (SSDictCursor) e gera as linhas aos poucos, em blocos
+    # de tamanho_bloco lidos com fetchmany, mantendo a memoria limitada independente do tamanho do resultado.
+    # A conexão fica emprestada enquanto o gerador estiver ativo. Se o consumidor parar antes do fim, a conexão é
+    # descartada ao fechar o gerador em vez de ler o restante do resultado do servidor. Dentro de uma transação o
+    # gerador usa a conexão da transação e deve ser consumido (ou fechado) antes do fim do bloco with.
+    # Com formato diferente de 'dict' é usado o SSCursor (tuplas) e cada bloco é convertido para o formato, os
+    # formatos 'tupla' e 'linha' geram tuplas / namedtuples linha a linha, 'colunar' e 'numpy' exigem em_blocos.
+    # Erros são levantados como Exception. Na medição da instrumentação o tempo gasto pelo consumidor entre um
+    # bloco e outro não é contado.
+    # bloco_vazio - com em_blocos, se o resultado não tiver linhas gera um unico bloco vazio, que no formato 'tupla'
+    #               ainda leva o cabeçalho das colunas.
+    def _db_fetch_iter(self, sql, argumentos=None, contador=0, tamanho_bloco=1000, em_blocos=False, formato='dict',
+                       medicao=None, tabelas=None, bloco_vazio=False):
+        if not self._conectado():
+            raise Exception(self._msg_nao_conectado(contador))
+        transacao = self._transacao_atual()
+        if transacao is None:
+            pool, conexao = self._empresta_leitura(tabelas)
+        else:
+            transacao.descarrega()
+            conexao = transacao.conexao
+        concluido = False
+        cursor = None
+        classe_cursor = pymysql.cursors.SSDictCursor if formato == 'dict' else pymysql.cursors.SSCursor
+        try:
+            cursor = conexao.cursor(classe_cursor)
+            if self.debug:
+                print("c = %d - debug sql -" % contador, cursor.mogrify(sql, argumentos))
+            if medicao is not None:
+                medicao.marca('conexao')
+            try:
+                cursor.execute(sql, argumentos)
+                bloco = cursor.fetchmany(tamanho_bloco)
+            except Exception as e:
+                # nenhuma linha foi gerada ainda, então fora de uma transação a leitura é repetida uma vez em uma
+                # conexão nova como em _db_fetch_all (ex: conexão ociosa derrubada pelo servidor)
+                if transacao is not None or not self._conexao_perdida(e):
+                    raise
+                if self.debug:
+                    print("c = %d - _db_fetch_iter - conexao perdida, repetindo a leitura..." % contador, str(e))
+                pool.devolve(conexao, descartar=True)
+                conexao = None
+                pool, conexao = self._empresta_leitura(tabelas)
+                cursor = conexao.cursor(classe_cursor)
+                cursor.execute(sql, argumentos)
+                bloco = cursor.fetchmany(tamanho_bloco)
+            if medicao is not None:
+                medicao.marca('execucao')
+            cabecalho = cabecalho_do_cursor(cursor)
+            vazio = not bloco
+            while bloco:
+                if medicao is not None:
+                    medicao.linhas += len(bloco)
+                if formato == 'linha' or (em_blocos and formato != 'dict'):
+                    bloco = converte_resultado(cabecalho, bloco, formato)
+                if medicao is not None:
+                    medicao.marca('leitura')
+                if em_blocos:
+                    yield bloco
+                else:
+                    yield from bloco
+                if medicao is not None:
+                    medicao.ignora()
+                bloco = cursor.fetchmany(tamanho_bloco)
+            if vazio and bloco_vazio and em_blocos:
+                yield converte_resultado(cabecalho, [], formato)
+            cursor.close()
+            if medicao is not None:
+                medicao.marca('leitura')
+            concluido = True
+        except Exception as e:
+            if medicao is not None:
+                medicao.erro = str(e)
+            raise
+        finally:
+            if transacao is None:
+                # conexao é None se a conexão nova da repetição não pôde ser obtida
+                if conexao is not None:
+                    pool.devolve(conexao, descartar=not concluido)
+            elif not concluido and cursor is not None:
+                # a conexão da transação não pode ser descartada, o restante do resultado é lido e ignorado
+                cursor.close()
+            if medicao is not None:
+                self._instrumentacao.depois(medicao)
+
+    # valida o formato antes de criar o gerador, para que o erro apareça na chamada e não na primeira leitura.
+    @staticmethod
+    def _valida_formato_iter(formato, em_blocos):
+        valida_formato(formato)
+        if not em_blocos and formato in ('colunar', 'numpy'):
+            raise Exception("erro! o formato '%s' so pode ser usado com em_blocos=True." % formato)
+
+    # versão em streaming de db_query_col, mesmos parametros, retorna um gerador de linhas (dicionarios) ou de
+    # listas de ate tamanho_bloco linhas se em_blocos for True. formato - ver db_query_col e _db_fetch_iter.
+    def db_query_col_iter(self, tabelas, colunas, var_teste_list=None, gui_valor_list=None, orderby=None,
+                          ascendent=True, colunas_test_list=None, valores_test_list=None, tamanho_bloco=1000,
+                          em_blocos=False, formato='dict'):
+        self._valida_formato_iter(formato, em_blocos)
+        contador = self.le_e_incrementa_contador()
+        medicao = self._instrumentacao.inicia(contador, 'db_query_col_iter')
+        with self._instrumentacao.montagem(medicao):
+            declaracao, argumentos = self._prepara_query_col(tabelas, colunas, var_teste_list, gui_valor_list,
+                                                             orderby, ascendent, colunas_test_list, valores_test_list)
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+        return self._db_fetch_iter(declaracao.sql, argumentos, contador, tamanho_bloco, em_blocos, formato, medicao,
+                                   declaracao.tabelas)
+
+    # versão em streaming de db_query_col_like, mesmos parametros, ver db_query_col_iter.
+    def db_query_col_like_iter(self, tabela, colunas, lista_vartestes=None, lista_valores=None, orderby=None,
+                               ascendent=True, tamanho_bloco=1000, em_blocos=False, formato='dict', modo='contem',
+                               limite=None):
+        self._valida_formato_iter(formato, em_blocos)
+        contador = self.le_e_incrementa_contador()
+        medicao = self._instrumentacao.inicia(contador, 'db_query_col_like_iter')
+        with self._instrumentacao.montagem(medicao):
+            declaracao, argumentos = self._prepara_query_col_like(tabela, colunas, lista_vartestes, lista_valores,
+                                                                  orderby, ascendent, modo, limite)
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+        return self._db_fetch_iter(declaracao.sql, argumentos, contador, tamanho_bloco, em_blocos, formato, medicao,
+                                   declaracao.tabelas)
+
+    # varredura paralela de uma tabela: a faixa da chave primaria inteira (descoberta pelo indice do esquema) é
+    # dividida em particoes faixas de mesmo tamanho, lidas ao mesmo tempo por threads com conexões separadas do
+    # pool (ou das replicas) em cursores sem buffer no servidor, e os resultados são mesclados em um unico gerador.
+    # Os parametros colunas a valores_test_list são os mesmos de db_query_col, restritos a uma tabela.
+    # particoes - quantidade de partições, limitada ao tamanho maximo do pool de conexões.
+    # ordenado - se True as linhas vêm na ordem da chave primaria (as partições são geradas em sequencia e as
+    #            seguintes leem adiantado), se False na ordem em que os blocos das partições ficam prontos.
+    # tamanho_bloco, em_blocos e formato - ver db_query_col_iter.
+    # Não pode ser usada dentro de uma transação, as partições não enxergariam as escritas ainda não confirmadas.
+    # Erros de validação são levantados na chamada e os de leitura ao consumir o gerador, como Exception.
+    def db_query_col_paralelo(self, tabela, colunas, var_teste_list=None, gui_valor_list=None, colunas_test_list=None,
+                              valores_test_list=None, particoes=4, ordenado=False, tamanho_bloco=1000,
+                              em_blocos=False, formato='dict'):
+        self._valida_formato_iter(formato, em_blocos)
+        if self._transacao_atual() is not None:
+            raise Exception("erro! db_query_col_paralelo não pode ser usada dentro de uma transação.")
+        contador = self.le_e_incrementa_contador()
+        medicao = self._instrumentacao.inicia(contador, 'db_query_col_paralelo')
+        # a medição inclui a leitura de MIN / MAX, uma falha nela ou na montagem conclui a medição com o erro
+        with self._instrumentacao.montagem(medicao):
+            limites = self._compila(('limites_particao', chave_forma(tabela)), compila_limites_particao, tabela)
+            declaracao = self._compila(('query_col_particao', chave_forma(tabela), chave_forma(colunas),
+                                        chave_forma(var_teste_list), chave_forma(colunas_test_list),
+                                        chave_valores(self, valores_test_list), bool(ordenado)),
+                                       compila_query_col_particao, tabela, colunas, var_teste_list,
+                                       colunas_test_list, valores_test_list, bool(ordenado))
+            argumentos = (converte_em_lista(gui_valor_list) +
+                          seleciona_parametros(valores_test_list, declaracao.indices_valores))
+            res, msg, qtd = self._db_fetch_all(limites.sql, None, contador, tabelas=limites.tabelas)
+            if res == -1:
+                raise Exception(msg)
+            faixas = divide_faixa(res[0]['minimo'], res[0]['maximo'], min(particoes, self._pool_max))
+        if self.debug:
+            print("c = %d - db_query_col_paralelo - faixas:" % contador, faixas)
+        if medicao is not None:
+            self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+        # cada partição é um _db_fetch_iter em blocos executado na thread da partição
+        produtores = [partial(self._db_fetch_iter, declaracao.sql, argumentos + [inicio, fim], contador, tamanho_bloco,
+                              True, formato, None, declaracao.tabelas) for inicio, fim in faixas]
+        return self._db_fetch_paralelo(produtores, ordenado, em_blocos, formato, medicao)
+
+    # gera as linhas (ou os blocos, se em_blocos for True) das partições de db_query_col_paralelo.
+    def _db_fetch_paralelo(self, produtores, ordenado, em_blocos, formato, medicao):
+        try:
+            for bloco in mescla_particoes(produtores, ordenado):
+                if medicao is not None:
+                    medicao.linhas += quantidade_linhas(bloco, formato)
+                    medicao.marca('leitura')
+                if em_blocos:
+                    yield bloco
+                else:
+                    yield from bloco[1] if formato == 'tupla' else bloco
+                if medicao is not None:
+                    medicao.ignora()
+        except Exception as e:
+            if medicao is not None:
+                medicao.erro = str(e)
+            raise
+        finally:
+            if medicao is not None:
+                self._instrumentacao.depois(medicao)
+
+    # exporta o resultado de db_query_col para um arquivo CSV ou JSON Lines em memoria constante, as linhas são lidas
+    # em blocos de tamanho_bloco de um cursor sem buffer no servidor e escritas incrementalmente (ver exportacao).
+    # destino - caminho do arquivo ou um arquivo de texto ja aberto.
+    # Os parametros de tabelas a valores_test_list são os mesmos de db_query_col.
+    # formato_arquivo - 'csv' (cabeçalho na primeira linha, mesmo sem linhas, NULL como campo vazio) ou 'jsonl' (um
+    #                   objeto por linha).
+    # compacta - True grava com gzip, None (padrão) compacta se o caminho terminar com .gz.
+    # separador - separador de campos do csv.
+    # progresso - função chamada a cada intervalo_progresso segundos com {'linhas', 'segundos', 'linhas_por_segundo'}.
+    # Retorna ({'linhas', 'segundos', 'linhas_por_segundo'}, "Ok!", linhas) ou (-1, mensagem de erro, linhas ja
+    # escritas).
+    def db_exporta_query_col(self, destino, tabelas, colunas, var_teste_list=None, gui_valor_list=None, orderby=None,
+                             ascendent=True, colunas_test_list=None, valores_test_list=None, formato_arquivo='csv',
+                             compacta=None, separador=',', tamanho_bloco=1000, progresso=None,
+                             intervalo_progresso=5.0):
+        contador = self.le_e_incrementa_contador()
+        acompanhamento = Progresso(progresso, intervalo_progresso)
+        medicao = None
+        try:
+            if formato_arquivo not in FORMATOS_EXPORTACAO:
+                raise Exception("erro! formato de arquivo invalido: %s, use um de %s" % (formato_arquivo,
+                                                                                       str(FORMATOS_EXPORTACAO)))
+            medicao = self._instrumentacao.inicia(contador, 'db_exporta_query_col')
+            declaracao, argumentos = self._prepara_query_col(tabelas, colunas, var_teste_list, gui_valor_list,
+                                                             orderby, ascendent, colunas_test_list, valores_test_list)
+            if medicao is not None:
+                self._instrumentacao.antes(medicao, declaracao.sql, declaracao.tabelas, argumentos)
+            # um resultado vazio ainda gera o bloco com o cabeçalho, assim o csv sempre tem a linha de cabeçalho
+            blocos = self._db_fetch_iter(declaracao.sql, argumentos, contador, tamanho_bloco, True, 'tupla', medicao,
+                                         declaracao.tabelas, bloco_vazio=True)
+            with abre_destino(destino, compacta) as arquivo:
+                try:
+                    escreve_blocos(arquivo, formato_arquivo, blocos, acompanhamento, separador)
+                finally:
+                    blocos.close()
+        except Exception as e:
+            msg = "c = %d - Erro! " % contador + str(e)
+            # o gerador conclui a medição ao ser fechado, aqui ela so é concluída se a falha foi antes da leitura
+            if medicao is not None:
+                self._instrumentacao.depois(medicao, (-1, msg, acompanhamento.linhas))
+            return -1, msg, acompanhamento.linhas
+        resumo = acompanhamento.resumo()
+        if self.debug:
+            print("c = %d - db_exporta_query_col - %d linhas em %.2fs (%.0f linhas/s)" % (
+                contador, resumo['linhas'], resumo['segundos'], resumo['linhas_por_segundo']))
+        return resumo, "Ok!", resumo['linhas']
+
+    # retorna a lista de colunas da tabela seguida das mesmas colunas qualificadas (tabela.coluna), obtidas do
+    # indice do esquema sem nenhuma ida ao banco de dados depois da carga inicial.
     def db_le_titulo_colunas_da_tabela_com_cache(self, tabela):
         if self.debug:
             print("Iniciando db_get_cached_column_names_from_table...")
@@ -387,24 +1600,5 @@ class DbHelper(metaclass=Singleton):
             if self.debug:
                 print("Tabela invalida retornando lista vazia...")
             return list()
-        # guarda um cache das colunas validas pra as tabelas
-        if tabela not in self._colunas_validas_cache.keys():
-            if self.debug:
-                print("Tabela %s não foi encontrada no cache, obtendo do banco de dados..." % tabela)
-            c = self.le_e_incrementa_contador()
-            res, msg, qtd = self._db_fetch_all(
-                "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = %s;", tabela, c)
-            if res == -1:
-                if self.debug:
-                    print("Erro! Banco de dados retornou -1, não conectado?")
-                raise Exception(msg)
-            self._colunas_validas_cache[tabela] = (list(map(lambda d: d['COLUMN_NAME'], res)) +
-                                                   list(map(lambda d: tabela + "." + d['COLUMN_NAME'], res)))
-            if self.debug:
-                print("db_get_column_names_from_table - atualizando cache com: %s" % tabela,
-                      self._colunas_validas_cache[tabela])
-        else:
-            if self.debug:
-                print("db_get_column_names_from_table - retornando valor no cache: %s" % tabela,
-                      self._colunas_validas_cache[tabela])
-        return self._colunas_validas_cache[tabela]
+        colunas = self.indice_esquema().colunas.get(tabela, [])
+        return colunas + [tabela + "." + col for col in colunas]
@@ -0,0 +1,174 @@
+# Interface asyncio para o DbHelper. Os metodos têm os mesmos nomes e parametros dos metodos do DbHelper, mas são
+# awaitables: cada chamada é executada em um pool de threads dimensionado pelo pool de conexões, assim o event loop
+# não fica bloqueado durante a ida e volta ao servidor e varias querys podem estar em andamento ao mesmo tempo. A
+# montagem e validação do sql continuam sendo feitas pelo proprio DbHelper.
+#
+#
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from db_helper.db_helper import DbHelper
+from db_helper.formatos import valida_formato
+
+
+# lote de comandos do AsyncDbHelper, mesmos metodos de LoteComandos, mas aqui os comandos são apenas registrados
+# e cada metodo retorna a posição do comando no lote. A montagem (validação, indice do esquema e CacheSql) é feita
+# por executa_lote em uma thread do executor, por isso os erros de montagem são levantados por executa_lote.
+class LoteAssincrono:
+    def __init__(self):
+        self.comandos = []
+
+    def __len__(self):
+        return len(self.comandos)
+
+    def _adiciona(self, metodo, args, kwargs):
+        self.comandos.append((metodo, args, kwargs))
+        return len(self.comandos) - 1
+
+    def db_query_col(self, *args, formato='dict', **kwargs):
+        valida_formato(formato)
+        return self._adiciona('db_query_col', args, dict(kwargs, formato=formato))
+
+    def db_query_col_like(self, *args, formato='dict', **kwargs):
+        valida_formato(formato)
+        return self._adiciona('db_query_col_like', args, dict(kwargs, formato=formato))
+
+    def db_insert(self, *args, **kwargs):
+        return self._adiciona('db_insert', args, kwargs)
+
+    def db_update(self, *args, **kwargs):
+        return self._adiciona('db_update', args, kwargs)
+
+    def db_delete(self, *args, **kwargs):
+        return self._adiciona('db_delete', args, kwargs)
+
+    # monta os comandos registrados em um LoteComandos do helper, esvaziando este lote.
+    def monta(self, helper):
+        comandos, self.comandos = self.comandos, []
+        lote = helper.lote()
+        for metodo, args, kwargs in comandos:
+            getattr(lote, metodo)(*args, **kwargs)
+        return lote
+
+
+class AsyncDbHelper:
+    # helper - DbHelper ja configurado, se None obtem a instancia singleton criando-a com os demais parametros
+    #          nomeados (hostname, username, password, schema, config, pool_max...).
+    # max_concorrencia - quantidade maxima de chamadas executando ao mesmo tempo, por padrão o tamanho maximo do
+    #                    pool de conexões do helper.
+    def __init__(self, helper=None, max_concorrencia=None, **kwargs):
+        self.helper = helper if helper is not None else DbHelper(**kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_concorrencia or self.helper._pool_max,
+                                            thread_name_prefix="db_helper_async")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.fecha()
+
+    # executa funcao(*args, **kwargs) em uma das threads do executor e aguarda o resultado.
+    async def _executa(self, funcao, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(funcao, *args, **kwargs))
+
+    # aguarda as chamadas em andamento e libera as threads do executor.
+    async def fecha(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def db_query_col(self, *args, **kwargs):
+        return await self._executa(self.helper.db_query_col, *args, **kwargs)
+
+    async def db_query_col_like(self, *args, **kwargs):
+        return await self._executa(self.helper.db_query_col_like, *args, **kwargs)
+
+    async def db_query_col_paginado(self, *args, **kwargs):
+        return await self._executa(self.helper.db_query_col_paginado, *args, **kwargs)
+
+    async def db_insert(self, *args, **kwargs):
+        return await self._executa(self.helper.db_insert, *args, **kwargs)
+
+    async def db_insert_many(self, *args, **kwargs):
+        return await self._executa(self.helper.db_insert_many, *args, **kwargs)
+
+    async def db_upsert_many(self, *args, **kwargs):
+        return await self._executa(self.helper.db_upsert_many, *args, **kwargs)
+
+    async def db_carga_em_massa(self, *args, **kwargs):
+        return await self._executa(self.helper.db_carga_em_massa, *args, **kwargs)
+
+    async def db_update(self, *args, **kwargs):
+        return await self._executa(self.helper.db_update, *args, **kwargs)
+
+    async def db_delete(self, *args, **kwargs):
+        return await self._executa(self.helper.db_delete, *args, **kwargs)
+
+    async def db_update_many(self, *args, **kwargs):
+        return await self._executa(self.helper.db_update_many, *args, **kwargs)
+
+    async def db_delete_many(self, *args, **kwargs):
+        return await self._executa(self.helper.db_delete_many, *args, **kwargs)
+
+    async def db_exporta_query_col(self, *args, **kwargs):
+        return await self._executa(self.helper.db_exporta_query_col, *args, **kwargs)
+
+    # retorna um lote vazio (LoteAssincrono), ver DbHelper.lote. Os comandos são montados e o lote é enviado em
+    # uma thread do executor por executa_lote, que também aceita um LoteComandos do DbHelper.
+    # Ex: lote = async_helper.lote()
+    #     lote.db_query_col(...)
+    #     resultados = await async_helper.executa_lote(lote)
+    def lote(self):
+        return LoteAssincrono()
+
+    async def executa_lote(self, lote):
+        if isinstance(lote, LoteAssincrono):
+            return await self._executa(lambda: lote.monta(self.helper).executa())
+        return await self._executa(lote.executa)
+
+    # transações do DbHelper ficam presas a uma thread, por isso a unidade de trabalho inteira é uma função
+    # sincrona que recebe o DbHelper e é executada dentro de helper.transacao() em uma unica thread do executor.
+    # Ex: await async_helper.executa_transacao(lambda helper: (helper.db_update(...), helper.db_insert(...)))
+    async def executa_transacao(self, funcao, *args, agrupa_inserts=False, **kwargs):
+        def unidade_de_trabalho():
+            with self.helper.transacao(agrupa_inserts):
+                return funcao(self.helper, *args, **kwargs)
+        return await self._executa(unidade_de_trabalho)
+
+    # percorre um gerador sincrono do DbHelper em blocos. O gerador é criado por cria_gerador() em uma thread do
+    # executor, pois a criação ja monta o sql, pode carregar o esquema e ir ao banco (ex: MIN / MAX de
+    # db_query_col_paralelo), e cada bloco é lido em uma thread do executor. Sem em_blocos gera as linhas de cada
+    # bloco, no formato 'tupla' os blocos são (cabecalho, linhas).
+    async def _itera(self, cria_gerador, em_blocos, formato='dict'):
+        gerador = await self._executa(cria_gerador)
+        try:
+            while True:
+                bloco = await self._executa(next, gerador, None)
+                if bloco is None:
+                    break
+                if em_blocos:
+                    yield bloco
+                else:
+                    for linha in bloco[1] if formato == 'tupla' else bloco:
+                        yield linha
+        finally:
+            await self._executa(gerador.close)
+
+    # versões em streaming, mesmos parametros de DbHelper.db_query_col_iter, db_query_col_like_iter e
+    # db_query_col_paralelo, retornam um gerador assincrono. O formato é validado na chamada e os demais erros
+    # são levantados na primeira iteração.
+    # Ex: async for linha in async_helper.db_query_col_iter('pedido', []): ...
+    def db_query_col_iter(self, *args, em_blocos=False, formato='dict', **kwargs):
+        DbHelper._valida_formato_iter(formato, em_blocos)
+        return self._itera(partial(self.helper.db_query_col_iter, *args, em_blocos=True, formato=formato, **kwargs),
+                           em_blocos, formato)
+
+    def db_query_col_like_iter(self, *args, em_blocos=False, formato='dict', **kwargs):
+        DbHelper._valida_formato_iter(formato, em_blocos)
+        return self._itera(partial(self.helper.db_query_col_like_iter, *args, em_blocos=True, formato=formato,
+                                   **kwargs), em_blocos, formato)
+
+    def db_query_col_paralelo(self, *args, em_blocos=False, formato='dict', **kwargs):
+        DbHelper._valida_formato_iter(formato, em_blocos)
+        return self._itera(partial(self.helper.db_query_col_paralelo, *args, em_blocos=True, formato=formato,
+                                   **kwargs), em_blocos, formato)
@@ -0,0 +1,77 @@
+# Exportação de resultados do DbHelper para arquivos CSV ou JSON Lines em memoria constante: as linhas chegam em
+# blocos de um cursor sem buffer no servidor (ver DbHelper.db_query_col_iter) e cada bloco é escrito e descartado
+# antes do proximo ser lido, por uma escrita com buffer grande e opcionalmente compactada com gzip.
+#
+#
+
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+
+FORMATOS_EXPORTACAO = ('csv', 'jsonl')
+
+
+# abre o destino para escrita de texto utf-8. destino pode ser o caminho do arquivo ou um arquivo de texto ja
+# aberto (que não é fechado). compacta - True grava com gzip, None decide pela extensão .gz do caminho.
+@contextmanager
+def abre_destino(destino, compacta=None, tamanho_buffer=1 << 20):
+    if not isinstance(destino, (str, os.PathLike)):
+        yield destino
+        return
+    if compacta is None:
+        compacta = os.fspath(destino).endswith(".gz")
+    binario = gzip.open(destino, "wb") if compacta else open(destino, "wb", buffering=0)
+    with io.TextIOWrapper(io.BufferedWriter(binario, tamanho_buffer), encoding="utf-8", newline="") as arquivo:
+        yield arquivo
+
+
+# serialização dos valores que o json não conhece: bytes em base64, datas, Decimal e outros como str.
+def _valor_json(valor):
+    if isinstance(valor, (bytes, bytearray)):
+        return base64.b64encode(valor).decode()
+    return str(valor)
+
+
+# acompanha a quantidade de linhas escritas e chama progresso(resumo) a cada intervalo segundos.
+class Progresso:
+    def __init__(self, progresso=None, intervalo=5.0):
+        self._progresso = progresso
+        self._intervalo = intervalo
+        self.linhas = 0
+        self.inicio = self._ultimo_relato = time.perf_counter()
+
+    def soma(self, quantidade):
+        self.linhas += quantidade
+        if self._progresso is not None:
+            agora = time.perf_counter()
+            if agora - self._ultimo_relato >= self._intervalo:
+                self._ultimo_relato = agora
+                self._progresso(self.resumo())
+
+    # retorna {'linhas', 'segundos', 'linhas_por_segundo'} desde o inicio da exportação.
+    def resumo(self):
+        segundos = time.perf_counter() - self.inicio
+        return {'linhas': self.linhas, 'segundos': segundos,
+                'linhas_por_segundo': self.linhas / segundos if segundos > 0 else 0.0}
+
+
+# escreve os blocos (cabecalho, linhas) no formato 'csv' (cabeçalho na primeira linha, None como campo vazio, linhas
+# terminadas por \n como o fim_linha padrão de DbHelper.db_carga_em_massa) ou 'jsonl' (um objeto por linha). Um
+# resultado vazio deve chegar como um bloco sem linhas para que o csv tenha o cabeçalho.
+def escreve_blocos(arquivo, formato, blocos, progresso, separador=","):
+    escritor = None
+    for cabecalho, linhas in blocos:
+        if formato == 'csv':
+            if escritor is None:
+                escritor = csv.writer(arquivo, delimiter=separador, lineterminator="\n")
+                escritor.writerow(cabecalho)
+            escritor.writerows(linhas)
+        else:
+            arquivo.writelines(json.dumps(dict(zip(cabecalho, linha)), ensure_ascii=False, default=_valor_json)
+                               + "\n" for linha in linhas)
+        progresso.soma(len(linhas))
@@ -0,0 +1,86 @@
+# Formatos compactos para os resultados das querys do DbHelper. O formato padrão ('dict') cria um dicionario por
+# linha repetindo o nome de todas as colunas, os demais formatos partem das tuplas do cursor do pymysql:
+# 'tupla'   - (cabecalho, linhas) com um unico cabecalho (tupla com os nomes das colunas) e as linhas como tuplas.
+# 'linha'   - lista de objetos leves (namedtuple, sem __dict__) com acesso por atributo ou por indice.
+# 'colunar' - dicionario coluna -> lista com os valores da coluna.
+# 'numpy'   - dicionario coluna -> numpy.ndarray, disponivel apenas se o NumPy estiver instalado.
+#
+#
+
+from collections import namedtuple
+from functools import lru_cache
+
+FORMATOS = ('dict', 'tupla', 'linha', 'colunar', 'numpy')
+
+
+# levanta uma exceção se o formato não for suportado.
+def valida_formato(formato):
+    if formato not in FORMATOS:
+        raise Exception("erro! formato de resultado invalido: %s, use um de %s" % (formato, str(FORMATOS)))
+    if formato == 'numpy':
+        _importa_numpy()
+
+
+def _importa_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise Exception("erro! o formato 'numpy' precisa do pacote numpy instalado.")
+    return numpy
+
+
+# retorna a classe das linhas do formato 'linha' para o cabecalho, criada uma unica vez por cabecalho. Nomes de
+# colunas que não são identificadores validos são renomeados para _0, _1...
+@lru_cache(maxsize=256)
+def classe_linha(cabecalho):
+    return namedtuple('Linha', cabecalho, rename=True)
+
+
+# retorna os nomes das colunas a partir do cursor.description do pymysql.
+def cabecalho_do_cursor(cursor):
+    return tuple(coluna[0] for coluna in cursor.description or ())
+
+
+# converte as linhas (tuplas) lidas com um cursor de tuplas para o formato pedido.
+def converte_resultado(cabecalho, linhas, formato):
+    match formato:
+        case 'tupla':
+            return cabecalho, list(linhas)
+        case 'linha':
+            classe = classe_linha(cabecalho)
+            return list(map(classe._make, linhas))
+        case 'colunar':
+            colunas = list(zip(*linhas)) if linhas else [()] * len(cabecalho)
+            return {nome: list(valores) for nome, valores in zip(cabecalho, colunas)}
+        case 'numpy':
+            numpy = _importa_numpy()
+            colunas = list(zip(*linhas)) if linhas else [()] * len(cabecalho)
+            return {nome: numpy.array(valores) for nome, valores in zip(cabecalho, colunas)}
+        case _:
+            return [dict(zip(cabecalho, linha)) for linha in linhas]
+
+
+# retorna uma copia do resultado que possa ser entregue ao chamador sem alterar o original guardado em cache.
+def copia_resultado(resultado, formato):
+    match formato:
+        case 'dict':
+            return [dict(linha) for linha in resultado]
+        case 'tupla':
+            return resultado[0], list(resultado[1])
+        case 'linha':
+            return list(resultado)
+        case 'colunar':
+            return {nome: list(valores) for nome, valores in resultado.items()}
+        case 'numpy':
+            return {nome: valores.copy() for nome, valores in resultado.items()}
+    return resultado
+
+
+# retorna a quantidade de linhas de um resultado no formato.
+def quantidade_linhas(resultado, formato):
+    match formato:
+        case 'tupla':
+            return len(resultado[1])
+        case 'colunar' | 'numpy':
+            return len(next(iter(resultado.values()), ()))
+    return len(resultado)
@@ -0,0 +1,122 @@
+# Indice em memória dos metadados do esquema (tabelas e colunas), carregado com uma única query ao
+# INFORMATION_SCHEMA e organizado em conjuntos e dicionarios para que as validações de tabelas e colunas sejam O(1).
+#
+#
+
+import time
+from threading import Lock
+
+SQL_COLUNAS_ESQUEMA = ("SELECT TABLE_NAME AS tabela, COLUMN_NAME AS coluna, COLUMN_KEY AS chave, "
+                       "COLUMN_TYPE AS tipo, COLLATION_NAME AS colacao FROM INFORMATION_SCHEMA.COLUMNS "
+                       "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION;")
+
+SQL_INDICES_ESQUEMA = ("SELECT TABLE_NAME AS tabela, INDEX_NAME AS indice, COLUMN_NAME AS coluna, "
+                       "INDEX_TYPE AS tipo FROM INFORMATION_SCHEMA.STATISTICS "
+                       "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX;")
+
+
+class IndiceEsquema:
+    # ttl - segundos apos os quais o indice é considerado vencido e recarregado no proximo uso, None nunca vence.
+    def __init__(self, ttl=None, debug=False):
+        self.ttl = ttl
+        self.debug = debug
+        self._lock_carga = Lock()
+        # incrementado a cada recarga, permite que caches dependentes do esquema se invalidem
+        self.versao = 0
+        self.carregado_em = None
+        # conjunto com o nome de todas as tabelas do esquema
+        self.tabelas = frozenset()
+        # tabela -> lista de colunas na ordem de criação
+        self.colunas = dict()
+        # tabela -> lista das colunas da chave primaria
+        self.chaves_primarias = dict()
+        # tabela -> dicionario coluna -> tipo completo da coluna (ex: 'int(11) unsigned', 'varchar(45)')
+        self.tipos = dict()
+        # tabela -> dicionario coluna -> colação das colunas de texto (ex: 'utf8mb4_general_ci')
+        self.colacoes = dict()
+        # par (tabela -> conjunto com as colunas e as colunas qualificadas (tabela.coluna), tupla de tabelas -> uniao
+        # dos conjuntos de colunas validas das tabelas). O cache das uniões é trocado junto com os conjuntos em uma
+        # unica atribuição, assim uma união calculada a partir de uma versão nunca é guardada no cache de outra.
+        self._validas = (dict(), dict())
+        # conjunto de todas as colunas, simples e qualificadas, de todas as tabelas do esquema
+        self.nomes_colunas = frozenset()
+        # tabela -> dicionario nome do indice -> (tipo, lista das colunas na ordem do indice), carregado apenas no
+        # primeiro uso de cada versão (ver indices)
+        self._indices = dict()
+        self._versao_indices = None
+
+    # retorna True se o indice ainda não foi carregado ou se o ttl expirou.
+    def precisa_carregar(self):
+        return self.carregado_em is None or (self.ttl is not None and
+                                             time.monotonic() - self.carregado_em > self.ttl)
+
+    # carrega (ou recarrega) todas as tabelas e colunas do esquema do objeto com uma única query.
+    def carrega(self, objeto):
+        with self._lock_carga:
+            self._carrega(objeto)
+
+    # carrega o indice se necessario, so uma thread faz a carga quando varias encontram o indice vencido.
+    def garante_carregado(self, objeto):
+        if self.precisa_carregar():
+            with self._lock_carga:
+                if self.precisa_carregar():
+                    self._carrega(objeto)
+
+    # deve ser chamado com _lock_carga adquirido.
+    def _carrega(self, objeto):
+        c = objeto.le_e_incrementa_contador()
+        res, msg, qtd = objeto._db_fetch_all(SQL_COLUNAS_ESQUEMA, objeto._db_schema, c)
+        if res == -1:
+            raise Exception(msg)
+        colunas = dict()
+        chaves_primarias = dict()
+        tipos = dict()
+        colacoes = dict()
+        for linha in res:
+            colunas.setdefault(linha['tabela'], []).append(linha['coluna'])
+            tipos.setdefault(linha['tabela'], dict())[linha['coluna']] = linha['tipo']
+            if linha.get('colacao'):
+                colacoes.setdefault(linha['tabela'], dict())[linha['coluna']] = linha['colacao']
+            if linha['chave'] == 'PRI':
+                chaves_primarias.setdefault(linha['tabela'], []).append(linha['coluna'])
+        validas = {tab: frozenset(cols + [tab + "." + col for col in cols]) for tab, cols in colunas.items()}
+        # troca o conteudo de uma vez so, leitores concorrentes veem o indice antigo ou o novo
+        self._validas = (validas, dict())
+        self.nomes_colunas = frozenset().union(*validas.values())
+        self.colunas = colunas
+        self.chaves_primarias = chaves_primarias
+        self.tipos = tipos
+        self.colacoes = colacoes
+        self.tabelas = frozenset(colunas)
+        self.carregado_em = time.monotonic()
+        self.versao += 1
+        if self.debug:
+            print("indice_esquema - carregado com %d tabelas e %d colunas (versao %d)" % (
+                len(colunas), qtd, self.versao))
+
+    # retorna o conjunto de colunas validas (simples e qualificadas) para a tupla de tabelas.
+    def colunas_validas(self, tabelas):
+        validas_por_tabela, validas_combinadas = self._validas
+        validas = validas_combinadas.get(tabelas)
+        if validas is None:
+            validas = frozenset().union(*(validas_por_tabela.get(tab, ()) for tab in tabelas))
+            validas_combinadas[tabelas] = validas
+        return validas
+
+    # retorna os indices das tabelas (tabela -> {nome do indice: (tipo, [colunas])}, tipo 'BTREE', 'FULLTEXT'...),
+    # lidos do INFORMATION_SCHEMA.STATISTICS no primeiro uso e de novo a cada recarga do indice do esquema.
+    def indices(self, objeto):
+        if self._versao_indices != self.versao:
+            versao = self.versao
+            c = objeto.le_e_incrementa_contador()
+            res, msg, qtd = objeto._db_fetch_all(SQL_INDICES_ESQUEMA, objeto._db_schema, c)
+            if res == -1:
+                raise Exception(msg)
+            indices = dict()
+            for linha in res:
+                tipo, colunas = indices.setdefault(linha['tabela'], dict()).setdefault(
+                    linha['indice'], (linha['tipo'], []))
+                colunas.append(linha['coluna'])
+            self._indices = indices
+            self._versao_indices = versao
+        return self._indices
@@ -0,0 +1,198 @@
+# Instrumentação das querys do DbHelper: tempo de cada etapa dos comandos (montagem, conexão, execução e leitura)
+# identificados pelo contador do helper, histogramas de latencia por forma de declaração (texto do sql) e por
+# tabela, contadores de linhas, log das querys lentas e hooks chamados antes e depois de cada comando.
+# Desativada por padrão, nesse caso inicia() retorna None e o custo por comando é uma unica chamada.
+#
+#
+
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+# limites superiores (em segundos) das faixas dos histogramas de latencia, a ultima faixa não tem limite
+LIMITES_HISTOGRAMA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# medição de um unico comando, repassada aos hooks.
+class Medicao:
+    __slots__ = ('contador', 'operacao', 'sql', 'tabelas', 'argumentos', 'tempos', 'linhas', 'erro', 'do_cache',
+                 'inicio', 'total', 'concluida', '_ultimo')
+
+    def __init__(self, contador, operacao):
+        self.contador = contador
+        self.operacao = operacao
+        self.sql = None
+        self.tabelas = ()
+        self.argumentos = None
+        # etapa -> segundos
+        self.tempos = dict()
+        self.linhas = 0
+        self.erro = None
+        self.do_cache = False
+        self.inicio = self._ultimo = time.perf_counter()
+        self.total = 0.0
+        self.concluida = False
+
+    # soma à etapa o tempo decorrido desde a marca anterior.
+    def marca(self, etapa):
+        agora = time.perf_counter()
+        self.tempos[etapa] = self.tempos.get(etapa, 0.0) + agora - self._ultimo
+        self._ultimo = agora
+
+    # descarta o tempo decorrido desde a marca anterior, gasto fora do helper (ex: pelo consumidor de um gerador),
+    # que não entra em nenhuma etapa nem no total.
+    def ignora(self):
+        agora = time.perf_counter()
+        self.inicio += agora - self._ultimo
+        self._ultimo = agora
+
+    def como_dict(self):
+        return {'contador': self.contador, 'operacao': self.operacao, 'sql': self.sql, 'tabelas': self.tabelas,
+                'tempos': dict(self.tempos), 'total': self.total, 'linhas': self.linhas, 'erro': self.erro,
+                'do_cache': self.do_cache}
+
+
+# histograma de latencias com a quantidade de comandos, linhas, erros, soma e maximo dos tempos.
+class Histograma:
+    __slots__ = ('limites', 'faixas', 'quantidade', 'linhas', 'erros', 'soma', 'maximo')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.faixas = [0] * (len(limites) + 1)
+        self.quantidade = 0
+        self.linhas = 0
+        self.erros = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registra(self, medicao):
+        self.faixas[bisect_left(self.limites, medicao.total)] += 1
+        self.quantidade += 1
+        self.linhas += medicao.linhas
+        self.erros += medicao.erro is not None
+        self.soma += medicao.total
+        if medicao.total > self.maximo:
+            self.maximo = medicao.total
+
+    def como_dict(self):
+        return {'quantidade': self.quantidade, 'linhas': self.linhas, 'erros': self.erros, 'soma': self.soma,
+                'media': self.soma / self.quantidade if self.quantidade else 0.0, 'maximo': self.maximo,
+                'faixas': {("<=%s" % limite if i < len(self.limites) else ">%s" % self.limites[-1]): qtd
+                           for i, (limite, qtd) in enumerate(zip(self.limites + (None,), self.faixas))}}
+
+
+class Instrumentacao:
+    # ativo - liga ou desliga a coleta.
+    # limiar_lento - segundos a partir dos quais o comando vai para o log de querys lentas, None desativa o log.
+    # tamanho_log_lento - quantidade maxima de querys lentas guardadas (as mais antigas são descartadas).
+    # limites - limites das faixas dos histogramas.
+    def __init__(self, ativo=False, limiar_lento=1.0, tamanho_log_lento=100, limites=LIMITES_HISTOGRAMA,
+                 debug=False):
+        self.ativo = ativo
+        self.limiar_lento = limiar_lento
+        self.limites = tuple(limites)
+        self.debug = debug
+        self._lock = Lock()
+        self._lentas = deque(maxlen=tamanho_log_lento)
+        self._por_forma = dict()
+        self._por_tabela = dict()
+        self._hooks_antes = []
+        self._hooks_depois = []
+
+    # registra funções chamadas com a Medicao antes da execução (sql e argumentos ja definidos) e depois do
+    # termino de cada comando (tempos, linhas e erro definidos).
+    def adiciona_hook(self, antes=None, depois=None):
+        with self._lock:
+            if antes is not None:
+                self._hooks_antes = self._hooks_antes + [antes]
+            if depois is not None:
+                self._hooks_depois = self._hooks_depois + [depois]
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks_antes = [h for h in self._hooks_antes if h is not hook]
+            self._hooks_depois = [h for h in self._hooks_depois if h is not hook]
+
+    # um hook com erro não pode interromper o comando.
+    def _chama_hooks(self, hooks, medicao):
+        for hook in hooks:
+            try:
+                hook(medicao)
+            except Exception as e:
+                if self.debug:
+                    print("c = %d - instrumentacao - erro no hook %r:" % (medicao.contador, hook), str(e))
+
+    # inicia a medição do comando, retorna None se a instrumentação estiver desativada.
+    def inicia(self, contador, operacao):
+        if not self.ativo:
+            return None
+        return Medicao(contador, operacao)
+
+    # fecha a etapa de montagem e chama os hooks de antes.
+    def antes(self, medicao, sql, tabelas, argumentos=None):
+        medicao.marca('montagem')
+        medicao.sql = sql
+        medicao.tabelas = tabelas
+        medicao.argumentos = argumentos
+        self._chama_hooks(self._hooks_antes, medicao)
+
+    # conclui a medição a partir do retorno (res, msg, qtd) do comando, registra nos histogramas e no log de
+    # lentas e chama os hooks de depois. Para os geradores resultado é None e linhas / erro ja foram definidos.
+    # Uma medição so é concluída uma vez, as chamadas seguintes são ignoradas.
+    def depois(self, medicao, resultado=None):
+        if medicao.concluida:
+            return
+        medicao.concluida = True
+        medicao.total = time.perf_counter() - medicao.inicio
+        if resultado is not None:
+            res, msg, qtd = resultado[:3]
+            if isinstance(res, int) and res == -1:
+                medicao.erro = msg
+            else:
+                medicao.linhas = qtd
+        lenta = self.limiar_lento is not None and medicao.total >= self.limiar_lento
+        with self._lock:
+            histograma = self._por_forma.get(medicao.sql)
+            if histograma is None:
+                histograma = self._por_forma[medicao.sql] = Histograma(self.limites)
+            histograma.registra(medicao)
+            for tabela in medicao.tabelas:
+                histograma = self._por_tabela.get(tabela)
+                if histograma is None:
+                    histograma = self._por_tabela[tabela] = Histograma(self.limites)
+                histograma.registra(medicao)
+            if lenta:
+                self._lentas.append(dict(medicao.como_dict(), quando=time.time()))
+        if lenta and self.debug:
+            print("c = %d - query lenta (%.3fs) -" % (medicao.contador, medicao.total), medicao.sql)
+        self._chama_hooks(self._hooks_depois, medicao)
+
+    # conclui a medição com o erro e relança a exceção se a montagem do comando falhar depois de inicia(), assim
+    # as validações e as idas ao banco antes da execução também entram nos histogramas.
+    @contextmanager
+    def montagem(self, medicao):
+        try:
+            yield
+        except Exception as e:
+            if medicao is not None:
+                self.depois(medicao, (-1, str(e), 0))
+            raise
+
+    # retorna os histogramas por forma de declaração e por tabela e o log de querys lentas.
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'ativo': self.ativo,
+                'limiar_lento': self.limiar_lento,
+                'formas': {sql: h.como_dict() for sql, h in self._por_forma.items()},
+                'tabelas': {tabela: h.como_dict() for tabela, h in self._por_tabela.items()},
+                'lentas': list(self._lentas)
+            }
+
+    def limpa(self):
+        with self._lock:
+            self._por_forma.clear()
+            self._por_tabela.clear()
+            self._lentas.clear()
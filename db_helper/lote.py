@@ -0,0 +1,59 @@
+# Lote de comandos do DbHelper enviados ao servidor em uma unica ida e volta (ver DbHelper.lote). Os metodos têm os
+# mesmos nomes e parametros dos metodos do DbHelper e montam o sql pelos mesmos caminhos (validação, CacheSql), mas
+# apenas acumulam o comando e retornam a sua posição no lote. executa() envia todos os comandos juntos e retorna a
+# tupla (res, msg, qtd) de cada um, na ordem em que foram adicionados.
+#
+#
+
+from collections import namedtuple
+from db_helper.formatos import valida_formato
+
+# sql - texto do comando com os %s dos parametros.
+# argumentos - parametros do comando ou None.
+# tabelas - tabelas lidas ou escritas pelo comando.
+# escrita - True para insert, update e delete.
+# formato - formato do resultado das leituras (ver db_helper.formatos).
+ComandoLote = namedtuple('ComandoLote', ['sql', 'argumentos', 'tabelas', 'escrita', 'formato'])
+
+
+class LoteComandos:
+    # objeto - DbHelper que monta e executa os comandos.
+    def __init__(self, objeto):
+        self._objeto = objeto
+        self.comandos = []
+
+    def __len__(self):
+        return len(self.comandos)
+
+    def _adiciona(self, declaracao, argumentos, escrita, formato='dict'):
+        self.comandos.append(ComandoLote(declaracao.sql, argumentos, declaracao.tabelas, escrita, formato))
+        return len(self.comandos) - 1
+
+    def db_query_col(self, tabelas, colunas, var_teste_list=None, gui_valor_list=None, orderby=None, ascendent=True,
+                     colunas_test_list=None, valores_test_list=None, formato='dict'):
+        valida_formato(formato)
+        declaracao, argumentos = self._objeto._prepara_query_col(tabelas, colunas, var_teste_list, gui_valor_list,
+                                                                 orderby, ascendent, colunas_test_list,
+                                                                 valores_test_list)
+        return self._adiciona(declaracao, argumentos, False, formato)
+
+    def db_query_col_like(self, tabela, colunas, lista_vartestes=None, lista_valores=None, orderby=None,
+                          ascendent=True, formato='dict', modo='contem', limite=None):
+        valida_formato(formato)
+        declaracao, argumentos = self._objeto._prepara_query_col_like(tabela, colunas, lista_vartestes,
+                                                                      lista_valores, orderby, ascendent, modo, limite)
+        return self._adiciona(declaracao, argumentos, False, formato)
+
+    def db_insert(self, tabela, colunas, valores):
+        return self._adiciona(*self._objeto._prepara_insert(tabela, colunas, valores), True)
+
+    def db_update(self, tabela, colunas, valores, varteste, valor):
+        return self._adiciona(*self._objeto._prepara_update(tabela, colunas, valores, varteste, valor), True)
+
+    def db_delete(self, tabela, varteste, valor):
+        return self._adiciona(*self._objeto._prepara_delete(tabela, varteste, valor), True)
+
+    # envia os comandos acumulados e esvazia o lote, retorna a lista de tuplas (res, msg, qtd) na ordem dos comandos.
+    def executa(self):
+        comandos, self.comandos = self.comandos, []
+        return self._objeto._db_executa_lote(comandos)
@@ -0,0 +1,532 @@
+# Montagem (compilação) dos comandos sql gerados pelo DbHelper. Cada função valida tabelas e colunas e retorna
+# uma DeclaracaoCompilada que depende apenas da forma da chamada (tabelas, colunas, colunas testadas, orderby...),
+# de modo que possa ser guardada no CacheSql e reutilizada trocando apenas os valores passados ao cursor.execute.
+#
+#
+
+import base64
+import datetime
+import json
+import re
+from collections import namedtuple
+from decimal import Decimal
+from itertools import islice
+from db_helper.conversoes import (converte_em_lista, concatena_colunas_separados_por_virgula_str,
+                                  concatena_listas_em_pares_chave_valor_str)
+from db_helper.validacoes_tabelas import escapa_coluna, valida_tabela, valida_e_escapa_coluna
+
+# sql - texto pronto do comando com os %s dos parametros.
+# tabelas - lista das tabelas validadas referenciadas pelo comando.
+# indices_valores - indices, na lista de valores da chamada, dos valores que viram parametros %s (os demais foram
+#                   reconhecidos como colunas e ja estão no texto do sql).
+# colunas_chave - apelidos, nas linhas retornadas, das colunas usadas na paginação por chave (keyset).
+# sufixo - texto colocado depois das linhas de um insert em lote (ex: ON DUPLICATE KEY UPDATE ...).
+DeclaracaoCompilada = namedtuple('DeclaracaoCompilada',
+                                 ['sql', 'tabelas', 'indices_valores', 'colunas_chave', 'sufixo'],
+                                 defaults=((), ""))
+
+# modos de busca de db_query_col_like: 'contem' (LIKE '%valor%'), 'prefixo' (LIKE 'valor%', usa indices comuns),
+# 'booleano' e 'natural' (MATCH ... AGAINST em BOOLEAN MODE / NATURAL LANGUAGE MODE, exigem um indice FULLTEXT com
+# exatamente as colunas procuradas) e 'auto' (o melhor modo possivel nessa ordem: booleano, prefixo, contem).
+MODOS_BUSCA = ('contem', 'prefixo', 'booleano', 'natural', 'auto')
+
+# tabela temporaria com as chaves de db_delete_many / db_update_many, tabelas temporarias existem apenas na conexão
+# que as criou, então o mesmo nome pode ser usado por todas as conexões do pool.
+TABELA_CHAVES = "db_helper_chaves"
+SQL_REMOVE_TABELA_CHAVES = "DROP TEMPORARY TABLE IF EXISTS `%s`;" % TABELA_CHAVES
+# chaves repetidas são ignoradas pelo ON DUPLICATE KEY UPDATE e não por INSERT IGNORE, que também transformaria
+# erros de conversão (valor fora da faixa do tipo, texto longo demais) em valores truncados que apontariam para
+# outras linhas
+PREFIXO_INSERT_CHAVES = "INSERT INTO `%s` (`chave`) VALUES " % TABELA_CHAVES
+SUFIXO_INSERT_CHAVES = " ON DUPLICATE KEY UPDATE `chave` = `chave`"
+
+
+# retorna a forma de uma lista de valores comparados ou atribuidos (SET / WHERE) para a chave do CacheSql. Strings
+# que podem ser colunas de alguma tabela do esquema mudam o texto do sql e entram na chave, todos os outros valores
+# viram parametros %s e entram na chave apenas como None, assim valores diferentes reutilizam a mesma declaração.
+# Ex: Entrada: ['usuario.login', 'abc', 10]  Saida: ('usuario.login', None, None)
+def chave_valores(objeto, valores):
+    nomes = objeto.indice_esquema().nomes_colunas
+    prefixo_esquema = objeto._db_schema + "."
+    return tuple(valor if isinstance(valor, str) and valor.removeprefix(prefixo_esquema) in nomes else None
+                 for valor in converte_em_lista(valores))
+
+
+# retorna os valores que são parametros, na ordem em que aparecem no sql, de acordo com os indices da declaração.
+def seleciona_parametros(valores, indices_valores):
+    valores = converte_em_lista(valores)
+    return [valores[indice] for indice in indices_valores]
+
+
+# converte um parametro de forma (str, lista, tupla, None...) em um valor hashable para ser usado como chave do
+# CacheSql. Ex: Entrada: ['login', ['nome', 'n']]  Saida: ('login', ('nome', 'n'))
+def chave_forma(valor):
+    match valor:
+        case list() | tuple():
+            return tuple(map(chave_forma, valor))
+        case _:
+            return valor
+
+
+def compila_insert(objeto, tabela, colunas, quantidade_valores):
+    # garante que tabela eh valida
+    tabela = valida_tabela(objeto, tabela)
+    # garante que entradas sao listas
+    # se alguma lista for None converte em [] e se for lista mesmo permanece igual
+    colunas = converte_em_lista(colunas)
+    sql = (objeto.get_db_verbs('insert') % (
+        escapa_coluna(objeto, tabela), concatena_colunas_separados_por_virgula_str(objeto, colunas, [tabela], True))
+           + '(' + ', '.join(['%s'] * quantidade_valores) + ');')
+    return DeclaracaoCompilada(sql, [tabela], ())
+
+
+def compila_delete(objeto, tabela, varteste):
+    # garante que tabela eh valida
+    tabela = valida_tabela(objeto, tabela)
+    # varteste vai ser testado dentro de checa_coluna
+    sql = (objeto.get_db_verbs('delete') % (
+        escapa_coluna(objeto, tabela), valida_e_escapa_coluna(objeto, varteste, [tabela]))
+           + objeto.get_db_verbs('=v;'))
+    return DeclaracaoCompilada(sql, [tabela], ())
+
+
+def compila_update(objeto, tabela, colunas, valores, varteste):
+    # garante que tabela eh valida
+    tabela = valida_tabela(objeto, tabela)
+    # garante que entradas sao listas
+    # se alguma lista for None converte em [] e se for lista mesmo permanece igual
+    colunas = converte_em_lista(colunas)
+    valores = converte_em_lista(valores)
+    # valores que não são colunas viram parametros %s
+    atribuicoes, indices_valores = concatena_listas_em_pares_chave_valor_str(objeto, colunas, valores, [tabela])
+    # varteste vai ser testado dentro de checa_coluna
+    sql = (objeto.get_db_verbs('update') % (
+        escapa_coluna(objeto, tabela), atribuicoes,
+        valida_e_escapa_coluna(objeto, varteste, [tabela])) + objeto.get_db_verbs('=v;'))
+    return DeclaracaoCompilada(sql, [tabela], tuple(indices_valores))
+
+
+# divide o iteravel em listas de ate tamanho itens, sem materializa-lo por inteiro.
+def divide_em_blocos(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while True:
+        bloco = list(islice(iterador, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+
+# retorna o delete das linhas cuja coluna varteste tem um dos quantidade_chaves valores passados como parametros
+# (IN), ou se quantidade_chaves for None das linhas cuja coluna tem um dos valores da tabela de chaves.
+def compila_delete_em_lote(objeto, tabela, varteste, quantidade_chaves):
+    tabela = valida_tabela(objeto, tabela)
+    if quantidade_chaves is None:
+        sql = ("DELETE " + escapa_coluna(objeto, tabela) + " FROM " + escapa_coluna(objeto, tabela) +
+               _junta_tabela_chaves(objeto, tabela, varteste) + ";")
+    else:
+        sql = (objeto.get_db_verbs('delete') % (
+            escapa_coluna(objeto, tabela), valida_e_escapa_coluna(objeto, varteste, [tabela])) +
+               " IN (" + ", ".join(["%s"] * quantidade_chaves) + ");")
+    return DeclaracaoCompilada(sql, [tabela], ())
+
+
+# retorna o update das linhas cuja coluna varteste tem um dos quantidade_chaves valores passados como parametros
+# depois dos valores de SET, ou se quantidade_chaves for None das linhas da tabela de chaves. Ver compila_update.
+def compila_update_em_lote(objeto, tabela, colunas, valores, varteste, quantidade_chaves):
+    tabela = valida_tabela(objeto, tabela)
+    atribuicoes, indices_valores = concatena_listas_em_pares_chave_valor_str(
+        objeto, converte_em_lista(colunas), converte_em_lista(valores), [tabela])
+    if quantidade_chaves is None:
+        sql = ("UPDATE " + escapa_coluna(objeto, tabela) + _junta_tabela_chaves(objeto, tabela, varteste) +
+               " SET " + atribuicoes + ";")
+    else:
+        sql = (objeto.get_db_verbs('update') % (
+            escapa_coluna(objeto, tabela), atribuicoes, valida_e_escapa_coluna(objeto, varteste, [tabela])) +
+               " IN (" + ", ".join(["%s"] * quantidade_chaves) + ");")
+    return DeclaracaoCompilada(sql, [tabela], tuple(indices_valores))
+
+
+# retorna o JOIN da tabela com a tabela de chaves pela coluna varteste.
+def _junta_tabela_chaves(objeto, tabela, varteste):
+    coluna = valida_e_escapa_coluna(objeto, varteste.split(".")[-1], [tabela])
+    return (" JOIN `" + TABELA_CHAVES + "` ON " + escapa_coluna(objeto, tabela) + "." + coluna + " = `" +
+            TABELA_CHAVES + "`.`chave`")
+
+
+# retorna o CREATE TEMPORARY TABLE da tabela de chaves com o mesmo tipo e a mesma colação da coluna varteste da
+# tabela, com outra colação o JOIN falharia com "Illegal mix of collations".
+def compila_cria_tabela_chaves(objeto, tabela, varteste):
+    tabela = valida_tabela(objeto, tabela)
+    esquema = objeto.indice_esquema()
+    coluna = varteste.split(".")[-1]
+    tipo = esquema.tipos.get(tabela, {}).get(coluna)
+    if tipo is None:
+        raise Exception("erro! coluna invalida: %s" % varteste)
+    colacao = esquema.colacoes.get(tabela, {}).get(coluna)
+    sql = "CREATE TEMPORARY TABLE `%s` (`chave` %s%s NOT NULL PRIMARY KEY);" % (
+        TABELA_CHAVES, tipo, " COLLATE " + colacao if colacao else "")
+    return DeclaracaoCompilada(sql, [], ())
+
+
+# ver DbHelper.db_query_col para a descrição dos parametros.
+def compila_query_col(objeto, tabelas, colunas, var_teste_list, orderby, ascendent, colunas_test_list,
+                      valores_test_list):
+    # garante que todos os parametros que aceitam listas sao listas
+    # adicionalmente filtra com checa_tabela
+    tabelas = converte_em_lista(tabelas, lambda tab: valida_tabela(objeto, tab))
+    # colunas sera filtrado por checa_colunas
+    colunas = converte_em_lista(colunas)
+    # var_teste_list sera filtrado por checa_coluna
+    var_teste_list = converte_em_lista(var_teste_list)
+    # colunas_test_list sera filtrado por checa_coluna
+    colunas_test_list = converte_em_lista(colunas_test_list)
+    # valores_test_list sera filtrado por converte_item_str, valores que não são colunas viram parametros %s
+    valores_test_list = converte_em_lista(valores_test_list)
+    comparacoes, indices_valores = concatena_listas_em_pares_chave_valor_str(
+        objeto, colunas_test_list, valores_test_list, tabelas, objeto.get_db_verbs('and'))
+
+    # monta string sql sem uso de condicional (rende todas as substrings e descartas as nao aplicaveis)
+    sql = (objeto.get_db_verbs('select') % (
+        concatena_colunas_separados_por_virgula_str(objeto, colunas, tabelas, False),
+        objeto.get_db_verbs('join').join(list(map(lambda tab: escapa_coluna(objeto, tab), tabelas)))
+    ) + objeto.get_db_verbs('where') * (len(var_teste_list) > 0 or len(colunas_test_list) > 0) +
+           (objeto.get_db_verbs('and').join(converte_em_lista(var_teste_list, lambda col: valida_e_escapa_coluna(
+               objeto, col, tabelas) + " = %s"))) * (len(var_teste_list) > 0) +
+           objeto.get_db_verbs('and') * (len(colunas_test_list) > 0 and len(var_teste_list) > 0) +
+           comparacoes + objeto.get_db_verbs('orderby')
+           % valida_e_escapa_coluna(objeto, orderby, tabelas) * (orderby is not None) +
+           objeto.get_db_verbs('asc') * (orderby is not None and ascendent) +
+           objeto.get_db_verbs('desc') * (orderby is not None and not ascendent) + ";")
+    return DeclaracaoCompilada(sql, tabelas, tuple(indices_valores))
+
+
+# retorna o modo de busca efetivo de db_query_col_like para as colunas procuradas da tabela, resolvendo 'auto' de
+# acordo com os indices da tabela. Levanta Exception se o modo for invalido ou exigir um indice FULLTEXT ausente.
+# Ex: Entrada: 'auto' com um indice FULLTEXT (nome, login)  Saida: 'booleano'
+def resolve_modo_busca(objeto, tabela, lista_vartestes, modo):
+    if modo not in MODOS_BUSCA:
+        raise Exception("erro! modo de busca invalido: %s, use um de %s" % (modo, str(MODOS_BUSCA)))
+    if modo in ('contem', 'prefixo'):
+        return modo
+    # o nome qualificado com o esquema (ex: 'deliveryadm.usuario') é normalizado como nas demais validações
+    indices = objeto.indice_esquema().indices(objeto).get(valida_tabela(objeto, tabela), {}).values()
+    colunas = set(converte_em_lista(lista_vartestes, lambda col: col.split(".")[-1]))
+    if any(tipo == 'FULLTEXT' and set(cols) == colunas for tipo, cols in indices):
+        return 'booleano' if modo == 'auto' else modo
+    if modo != 'auto':
+        raise Exception("erro! a busca '%s' precisa de um indice FULLTEXT com as colunas %s da tabela %s." % (
+            modo, ", ".join(sorted(colunas)), tabela))
+    # cada coluna precisa ser a primeira de algum indice para que o LIKE 'valor%' possa usa-lo
+    if colunas and all(any(tipo != 'FULLTEXT' and cols[0] == col for tipo, cols in indices) for col in colunas):
+        return 'prefixo'
+    return 'contem'
+
+
+# retorna os parametros da busca de db_query_col_like no modo (ja resolvido): um termo por valor nos modos com LIKE,
+# um unico termo nos modos com MATCH. No modo booleano cada palavra é obrigatoria e procurada como prefixo.
+# Ex: Entrada: ['joão sil'], 'booleano'  Saida: ['+joão* +sil*']   Entrada: ['ana'], 'prefixo'  Saida: ['ana%']
+def termos_busca(lista_valores, modo):
+    match modo:
+        case 'contem':
+            return converte_em_lista(lista_valores, lambda valor: "%" + str(valor) + "%")
+        case 'prefixo':
+            return converte_em_lista(lista_valores, lambda valor: str(valor) + "%")
+        case 'booleano':
+            palavras = re.findall(r"\w+", " ".join(converte_em_lista(lista_valores, str)))
+            return [" ".join("+" + palavra + "*" for palavra in dict.fromkeys(palavras))]
+        case _:
+            return [" ".join(converte_em_lista(lista_valores, str))]
+
+
+# ver DbHelper.db_query_col_like para a descrição dos parametros. modo - modo de busca ja resolvido (ver
+# resolve_modo_busca). com_limite - se True o ultimo parametro do sql é o LIMIT.
+def compila_query_col_like(objeto, tabela, colunas, lista_vartestes, orderby, ascendent, modo='contem',
+                           com_limite=False):
+    # filtra tabela com checa_tabela
+    tabela = valida_tabela(objeto, tabela)
+    # faz listas todas os parametros de entrada que aceitam listas
+    colunas = converte_em_lista(colunas)
+    lista_vartestes = converte_em_lista(lista_vartestes, lambda col: valida_e_escapa_coluna(objeto, col, [tabela]))
+    if modo in ('booleano', 'natural'):
+        condicao = "MATCH (%s) AGAINST (%%s IN %s MODE)" % (
+            ", ".join(lista_vartestes), "BOOLEAN" if modo == 'booleano' else "NATURAL LANGUAGE")
+    else:
+        condicao = objeto.get_db_verbs('or').join(
+            list(map(lambda varteste: varteste + objeto.get_db_verbs('like'), lista_vartestes)))
+
+    # composição condicional de string
+    sql = (objeto.get_db_verbs('select') % (
+        concatena_colunas_separados_por_virgula_str(
+            objeto, colunas, [tabela], False), escapa_coluna(objeto, tabela)
+    ) + objeto.get_db_verbs('where') + condicao
+           + objeto.get_db_verbs('orderby') % valida_e_escapa_coluna(objeto, orderby, [tabela]) * (orderby is not None)
+           + objeto.get_db_verbs('asc') * (orderby is not None and ascendent is True) +
+           objeto.get_db_verbs('desc') * (orderby is not None and ascendent is False) + " LIMIT %s" * com_limite + ";")
+    return DeclaracaoCompilada(sql, [tabela], ())
+
+
+# retorna o inicio de um insert de varias linhas, sem os valores. Ex: 'INSERT INTO `usuario` (`login`, `hash`) VALUES '
+def compila_insert_lote(objeto, tabela, colunas):
+    # garante que tabela eh valida
+    tabela = valida_tabela(objeto, tabela)
+    colunas = converte_em_lista(colunas)
+    sql = objeto.get_db_verbs('insert') % (
+        escapa_coluna(objeto, tabela), concatena_colunas_separados_por_virgula_str(objeto, colunas, [tabela], True))
+    return DeclaracaoCompilada(sql, [tabela], ())
+
+
+# formato do arquivo csv de compila_carga_em_massa, os parametros são o separador, o fim de linha e as linhas ignoradas
+_FORMATO_CARGA_CSV = (" FIELDS TERMINATED BY %s OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' LINES TERMINATED BY %s"
+                      " IGNORE %s LINES")
+
+
+# retorna o LOAD DATA LOCAL INFILE da tabela, o primeiro parametro é o caminho do arquivo. Com csv=False o arquivo
+# esta no formato padrão do LOAD DATA (ver carga_em_massa), com csv=True os parametros seguintes são o separador
+# de campos, o fim de linha e a quantidade de linhas ignoradas no inicio (cabeçalho) e os campos podem estar entre
+# aspas duplas, com aspas internas dobradas e sem escapes com \ (ESCAPED BY ''), como no csv padrão: 'C:\new' é
+# carregado como esta e não com \n virando quebra de linha. Se colunas for vazia o arquivo tem todas as colunas da
+# tabela na ordem de criação.
+def compila_carga_em_massa(objeto, tabela, colunas, csv):
+    tabela = valida_tabela(objeto, tabela)
+    colunas = converte_em_lista(colunas)
+    sql = ("LOAD DATA LOCAL INFILE %s INTO TABLE " + escapa_coluna(objeto, tabela) + " CHARACTER SET utf8mb4" +
+           _FORMATO_CARGA_CSV * csv +
+           (" " + concatena_colunas_separados_por_virgula_str(objeto, colunas, [tabela], True)) * (len(colunas) > 0)
+           + ";")
+    return DeclaracaoCompilada(sql, [tabela], ())
+
+
+# retorna o insert de varias linhas de compila_insert_lote com o sufixo ON DUPLICATE KEY UPDATE, que atualiza as
+# colunas que não fazem parte de chave quando a linha ja existe. chave - coluna ou lista de colunas de uma chave
+# primaria ou unica da tabela, devem estar em colunas. Se todas as colunas forem da chave as linhas existentes
+# ficam inalteradas. VALUES() é usado em vez do alias de linha para funcionar também no MariaDB.
+def compila_upsert_lote(objeto, tabela, colunas, chave):
+    declaracao = compila_insert_lote(objeto, tabela, colunas)
+    tabela = declaracao.tabelas[0]
+    nomes = converte_em_lista(colunas, lambda col: col.split(".")[-1])
+    nomes_chave = converte_em_lista(chave, lambda col: col.split(".")[-1])
+    if len(nomes_chave) == 0:
+        raise Exception("erro! informe a chave do upsert.")
+    for nome in nomes_chave:
+        if nome not in nomes:
+            raise Exception("erro! coluna da chave %s não esta entre as colunas do upsert." % nome)
+    atualizadas = converte_em_lista([nome for nome in nomes if nome not in nomes_chave] or nomes_chave[:1],
+                                    lambda nome: valida_e_escapa_coluna(objeto, nome, [tabela]))
+    if len(nomes) > len(nomes_chave):
+        atribuicoes = [col + " = VALUES(" + col + ")" for col in atualizadas]
+    else:
+        atribuicoes = [col + " = " + col for col in atualizadas]
+    return declaracao._replace(sufixo=" ON DUPLICATE KEY UPDATE " + ", ".join(atribuicoes))
+
+
+# estima as linhas inseridas, atualizadas e inalteradas de um upsert a partir das linhas afetadas de cada lote. O
+# servidor conta 1 por linha inserida, 2 por linha atualizada e 0 por linha existente que não mudou, com
+# linhas = i + a + n e afetadas = i + 2a ha uma incognita a mais, então assume o menor numero de inalteradas
+# compativel com o lote. lotes - lista de (quantidade de linhas, linhas afetadas).
+def contagens_upsert(lotes):
+    inseridas = atualizadas = inalteradas = 0
+    for quantidade, afetadas in lotes:
+        atualizadas_lote = min(quantidade, max(0, afetadas - quantidade))
+        inalteradas_lote = max(0, quantidade - afetadas)
+        inseridas += quantidade - atualizadas_lote - inalteradas_lote
+        atualizadas += atualizadas_lote
+        inalteradas += inalteradas_lote
+    return {'inseridas': inseridas, 'atualizadas': atualizadas, 'inalteradas': inalteradas}
+
+
+# percorre linhas (qualquer iteravel, inclusive geradores, sem materializa-lo) e gera os comandos insert de varias
+# linhas, cada um com no maximo tamanho_lote linhas e limite_bytes bytes. Os valores são escapados pela propria
+# conexao do pymysql. sufixo é colocado depois das linhas (ver compila_upsert_lote). Retorna tuplas
+# (sql, quantidade de linhas do lote).
+def monta_lotes_insert(conexao, prefixo, quantidade_colunas, linhas, tamanho_lote, limite_bytes, sufixo=""):
+    tamanho_fixo = len(prefixo.encode()) + len(sufixo.encode()) + 1
+    lote = []
+    tamanho = tamanho_fixo
+    for linha in linhas:
+        # linhas de uma coluna podem ser passadas como valores simples
+        linha = tuple(linha) if isinstance(linha, (list, tuple)) else (linha,)
+        if len(linha) != quantidade_colunas:
+            raise Exception("erro! linha com %d valores para %d colunas: %s" % (len(linha), quantidade_colunas,
+                                                                                 str(linha)))
+        valores = conexao.literal(linha)
+        # + 2 pela virgula e espaco que separam as linhas
+        tamanho_linha = len(valores.encode()) + 2
+        if lote and (len(lote) >= tamanho_lote or tamanho + tamanho_linha > limite_bytes):
+            yield prefixo + ", ".join(lote) + sufixo + ";", len(lote)
+            lote = []
+            tamanho = tamanho_fixo
+        lote.append(valores)
+        tamanho += tamanho_linha
+    if lote:
+        yield prefixo + ", ".join(lote) + sufixo + ";", len(lote)
+
+
+# retorna as colunas que ordenam a paginação por chave: orderby (se houver) seguido das colunas da chave primaria da
+# tabela que ainda não estejam em orderby, servindo de desempate para que a ordem seja total.
+def colunas_keyset(objeto, tabela, orderby):
+    chave_primaria = objeto.indice_esquema().chaves_primarias.get(tabela, [])
+    if orderby is None:
+        if not chave_primaria:
+            raise Exception("erro! tabela %s sem chave primaria, informe orderby para paginar." % tabela)
+        return [tabela + "." + col for col in chave_primaria]
+    return [orderby] + [tabela + "." + col for col in chave_primaria if orderby not in (col, tabela + "." + col)]
+
+
+# monta o predicado de busca (seek) da paginação por chave para as colunas ja escapadas. Para as colunas (a, b) em
+# ordem ascendente retorna '(a > %s OR (a = %s AND b > %s))' e os parametros devem ser passados por
+# argumentos_keyset.
+def monta_condicao_keyset(colunas_escapadas, ascendent):
+    operador = " > %s" if ascendent else " < %s"
+    termos = []
+    for k in range(len(colunas_escapadas)):
+        termos.append("(" + " AND ".join([col + " = %s" for col in colunas_escapadas[:k]] +
+                                         [colunas_escapadas[k] + operador]) + ")")
+    return "(" + " OR ".join(termos) + ")"
+
+
+# retorna os parametros de monta_condicao_keyset para os valores da ultima linha da pagina anterior.
+def argumentos_keyset(valores_chave):
+    return [valor for k in range(len(valores_chave)) for valor in valores_chave[:k + 1]]
+
+
+# ver DbHelper.db_query_col_paginado para a descrição dos parametros. com_cursor indica se a chamada continua de uma
+# pagina anterior (inclui o predicado de busca). O ultimo parametro do sql é o LIMIT.
+def compila_query_col_paginado(objeto, tabelas, colunas, var_teste_list, orderby, ascendent, colunas_test_list,
+                               valores_test_list, com_cursor):
+    # garante que todos os parametros que aceitam listas sao listas
+    # adicionalmente filtra com checa_tabela
+    tabelas = converte_em_lista(tabelas, lambda tab: valida_tabela(objeto, tab))
+    colunas = converte_em_lista(colunas)
+    var_teste_list = converte_em_lista(var_teste_list)
+    colunas_test_list = converte_em_lista(colunas_test_list)
+    valores_test_list = converte_em_lista(valores_test_list)
+    # colunas de ordenação, a primeira tabela fornece a chave primaria de desempate
+    chave = colunas_keyset(objeto, tabelas[0], orderby)
+    chave_escapada = converte_em_lista(chave, lambda col: valida_e_escapa_coluna(objeto, col, tabelas))
+    # as colunas de ordenação são lidas sob apelidos proprios para montar o cursor da proxima pagina, os rotulos das
+    # colunas se repetem entre as tabelas de um join (ex: `pedido`.`nome` e `usuario`.`nome` viram ambos 'nome')
+    apelidos = ["_k%d" % k for k in range(len(chave))]
+
+    condicoes = converte_em_lista(var_teste_list, lambda col: valida_e_escapa_coluna(objeto, col, tabelas) + " = %s")
+    comparacoes, indices_valores = concatena_listas_em_pares_chave_valor_str(
+        objeto, colunas_test_list, valores_test_list, tabelas, objeto.get_db_verbs('and'))
+    condicoes += [comparacoes] * (len(colunas_test_list) > 0)
+    condicoes += [monta_condicao_keyset(chave_escapada, ascendent)] * com_cursor
+    direcao = " " + (objeto.get_db_verbs('asc') if ascendent else objeto.get_db_verbs('desc'))
+
+    sql = (objeto.get_db_verbs('select') % (
+        concatena_colunas_separados_por_virgula_str(objeto, colunas, tabelas, False) + "".join(
+            [", %s AS `%s`" % (col, apelido) for col, apelido in zip(chave_escapada, apelidos)]),
+        objeto.get_db_verbs('join').join(list(map(lambda tab: escapa_coluna(objeto, tab), tabelas)))
+    ) + objeto.get_db_verbs('where') * (len(condicoes) > 0) + objeto.get_db_verbs('and').join(condicoes) +
+           " ORDER BY " + ", ".join([col + direcao for col in chave_escapada]) + " LIMIT %s;")
+    return DeclaracaoCompilada(sql, tabelas, tuple(indices_valores), tuple(apelidos))
+
+
+# tipos do cursor de pagina que não existem em json, codificados como {"t": marca, "v": texto} e convertidos de
+# volta ao tipo original na decodificação (os valores vêm do pymysql: DECIMAL como Decimal, BINARY / BLOB como
+# bytes, TIME como timedelta). datetime vem antes de date, pois é uma subclasse de date.
+_TIPOS_CURSOR = (
+    ('bytes', bytes, lambda v: base64.b64encode(v).decode(), base64.b64decode),
+    ('decimal', Decimal, str, Decimal),
+    ('datetime', datetime.datetime, datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    ('date', datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    ('time', datetime.time, datetime.time.isoformat, datetime.time.fromisoformat),
+    ('timedelta', datetime.timedelta, lambda v: [v.days, v.seconds, v.microseconds],
+     lambda v: datetime.timedelta(*v))
+)
+
+
+def _codifica_valor_cursor(valor):
+    if valor is None or isinstance(valor, (str, int, float)):
+        return valor
+    for marca, tipo, codifica, _ in _TIPOS_CURSOR:
+        if isinstance(valor, tipo):
+            return {'t': marca, 'v': codifica(valor)}
+    raise Exception("erro! tipo %s não suportado em coluna de ordenação da paginação." % type(valor).__name__)
+
+
+def _decodifica_valor_cursor(valor):
+    if not isinstance(valor, dict):
+        return valor
+    for marca, _, _, decodifica in _TIPOS_CURSOR:
+        if valor.get('t') == marca:
+            return decodifica(valor['v'])
+    raise ValueError(valor)
+
+
+# codifica os valores das colunas de ordenação da ultima linha de uma pagina em um cursor opaco (string base64),
+# preservando o tipo de cada valor, ver _TIPOS_CURSOR.
+def codifica_cursor_pagina(valores_chave):
+    return base64.urlsafe_b64encode(json.dumps([_codifica_valor_cursor(v) for v in valores_chave]).encode()).decode()
+
+
+# decodifica um cursor gerado por codifica_cursor_pagina, retorna None se cursor_pagina for None.
+def decodifica_cursor_pagina(cursor_pagina, quantidade_colunas):
+    if cursor_pagina is None:
+        return None
+    try:
+        valores_chave = json.loads(base64.urlsafe_b64decode(cursor_pagina.encode()))
+        if not isinstance(valores_chave, list) or len(valores_chave) != quantidade_colunas:
+            raise ValueError(valores_chave)
+        return [_decodifica_valor_cursor(v) for v in valores_chave]
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        raise Exception("erro! cursor de pagina invalido: %s" % cursor_pagina)
+
+
+# retorna a coluna da chave primaria inteira da tabela usada para particionar as varreduras paralelas. A chave
+# primaria precisa ter uma unica coluna de algum tipo inteiro (tinyint a bigint, com ou sem unsigned).
+def coluna_particao(objeto, tabela):
+    chave_primaria = objeto.indice_esquema().chaves_primarias.get(tabela, [])
+    if len(chave_primaria) != 1:
+        raise Exception("erro! tabela %s sem chave primaria de uma coluna, não é possivel particionar." % tabela)
+    tipo = objeto.indice_esquema().tipos[tabela][chave_primaria[0]]
+    if not tipo.split("(")[0].split(" ")[0].endswith("int"):
+        raise Exception("erro! chave primaria %s.%s do tipo %s não é inteira, não é possivel particionar." % (
+            tabela, chave_primaria[0], tipo))
+    return chave_primaria[0]
+
+
+# retorna a query do menor e do maior valor da chave primaria inteira da tabela (colunas minimo e maximo), resolvida
+# pelo servidor apenas com as pontas do indice da chave.
+def compila_limites_particao(objeto, tabela):
+    tabela = valida_tabela(objeto, tabela)
+    chave = valida_e_escapa_coluna(objeto, tabela + "." + coluna_particao(objeto, tabela), [tabela])
+    sql = (objeto.get_db_verbs('select') % ("MIN(%s) AS minimo, MAX(%s) AS maximo" % (chave, chave),
+                                            escapa_coluna(objeto, tabela)) + ";")
+    return DeclaracaoCompilada(sql, [tabela], ())
+
+
+# ver DbHelper.db_query_col_paralelo para a descrição dos parametros. Os dois ultimos parametros do sql são o
+# inicio e o fim (inclusivos) da faixa da chave primaria lida pela partição. Com ordenado=True cada partição vem
+# ordenada pela chave.
+def compila_query_col_particao(objeto, tabela, colunas, var_teste_list, colunas_test_list, valores_test_list,
+                               ordenado):
+    tabela = valida_tabela(objeto, tabela)
+    colunas = converte_em_lista(colunas)
+    var_teste_list = converte_em_lista(var_teste_list)
+    colunas_test_list = converte_em_lista(colunas_test_list)
+    valores_test_list = converte_em_lista(valores_test_list)
+    chave = valida_e_escapa_coluna(objeto, tabela + "." + coluna_particao(objeto, tabela), [tabela])
+
+    condicoes = converte_em_lista(var_teste_list, lambda col: valida_e_escapa_coluna(objeto, col, [tabela]) + " = %s")
+    comparacoes, indices_valores = concatena_listas_em_pares_chave_valor_str(
+        objeto, colunas_test_list, valores_test_list, [tabela], objeto.get_db_verbs('and'))
+    condicoes += [comparacoes] * (len(colunas_test_list) > 0)
+    condicoes += [chave + " BETWEEN %s AND %s"]
+
+    sql = (objeto.get_db_verbs('select') % (
+        concatena_colunas_separados_por_virgula_str(objeto, colunas, [tabela], False), escapa_coluna(objeto, tabela)
+    ) + objeto.get_db_verbs('where') + objeto.get_db_verbs('and').join(condicoes) +
+           (objeto.get_db_verbs('orderby') % chave + objeto.get_db_verbs('asc')) * ordenado + ";")
+    return DeclaracaoCompilada(sql, [tabela], tuple(indices_valores))
+
+
+# divide a faixa minimo..maximo (inclusiva) em ate particoes faixas consecutivas de tamanhos iguais, retorna a lista
+# de tuplas (inicio, fim). Retorna uma lista vazia se a tabela estiver vazia (minimo None).
+# Ex: Entrada: 1, 10, 3  Saida: [(1, 4), (5, 8), (9, 10)]
+def divide_faixa(minimo, maximo, particoes):
+    if minimo is None or maximo is None:
+        return []
+    tamanho = -(-(maximo - minimo + 1) // max(1, particoes))
+    return [(inicio, min(inicio + tamanho - 1, maximo)) for inicio in range(minimo, maximo + 1, tamanho)]
@@ -0,0 +1,240 @@
+# Implementação de um pool de conexões limitado e seguro para uso entre threads. Cada thread empresta uma conexão
+# exclusiva, executa seus comandos e a devolve ao pool, permitindo várias querys simultâneas por processo.
+#
+#
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Condition
+
+
+# guarda a conexão junto com os instantes de criação e de último uso, utilizados para descartar conexões antigas
+# ou ociosas por muito tempo.
+class _ConexaoPool:
+    __slots__ = ('conexao', 'criada_em', 'usada_em')
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.criada_em = time.monotonic()
+        self.usada_em = self.criada_em
+
+
+class PoolConexoes:
+    # fabrica - função sem parâmetros que cria e retorna uma nova conexão aberta.
+    # tamanho_min - quantidade de conexões ociosas que nunca são descartadas por ociosidade.
+    # tamanho_max - quantidade máxima de conexões abertas (emprestadas + ociosas) ao mesmo tempo.
+    # timeout - segundos que empresta() aguarda por uma conexão livre antes de desistir.
+    # tempo_max_ocioso - segundos que uma conexão pode ficar ociosa antes de ser fechada.
+    # tempo_max_vida - segundos de vida de uma conexão antes de ser fechada e recriada.
+    # tempo_ping - conexões ociosas por mais que estes segundos recebem um ping(reconnect=True) ao serem
+    #              emprestadas, as demais são entregues sem nenhuma ida e volta extra ao servidor. None desativa.
+    def __init__(self, fabrica, tamanho_min=1, tamanho_max=10, timeout=30.0, tempo_max_ocioso=300.0,
+                 tempo_max_vida=3600.0, tempo_ping=30.0, debug=False):
+        if tamanho_max < 1 or tamanho_min < 0 or tamanho_min > tamanho_max:
+            raise Exception("erro! tamanhos do pool invalidos: min = %s max = %s" % (tamanho_min, tamanho_max))
+        self.debug = debug
+        self._fabrica = fabrica
+        self.tamanho_min = tamanho_min
+        self.tamanho_max = tamanho_max
+        self.timeout = timeout
+        self.tempo_max_ocioso = tempo_max_ocioso
+        self.tempo_max_vida = tempo_max_vida
+        self.tempo_ping = tempo_ping
+        self._condicao = Condition()
+        # conexões livres, a mais recentemente devolvida fica a direita
+        self._ociosas = deque()
+        # conexões emprestadas indexadas pelo id do objeto de conexão
+        self._emprestadas = dict()
+        # conexões sendo criadas fora do lock, ja contam para o limite tamanho_max
+        self._criando = 0
+        self._fechado = False
+        # estatisticas
+        self._total_emprestimos = 0
+        self._total_esperas = 0
+        self._tempo_espera_total = 0.0
+        self._tempo_espera_max = 0.0
+        self._total_criadas = 0
+        self._total_descartadas = 0
+        self._total_pings = 0
+
+    def _total_abertas(self):
+        return len(self._ociosas) + len(self._emprestadas) + self._criando
+
+    def _expirada(self, item, agora):
+        return self.tempo_max_vida is not None and agora - item.criada_em > self.tempo_max_vida
+
+    # fecha as conexões ja retiradas do pool ignorando erros, elas vão ser descartadas de qualquer forma. Deve ser
+    # chamado sem o lock, assim os demais emprestimos não aguardam a ida e volta do fechamento de cada conexão.
+    def _fecha_conexoes(self, itens):
+        for item in itens:
+            try:
+                item.conexao.close()
+            except Exception as e:
+                if self.debug:
+                    print("pool - erro ignorado fechando conexao:", str(e))
+
+    # retira das ociosas as conexões expiradas ou ociosas alem de tempo_max_ocioso, mantendo ao menos tamanho_min, e
+    # retorna a lista das retiradas, que devem ser fechadas com _fecha_conexoes depois de liberar o lock. Deve ser
+    # chamado com o lock adquirido.
+    def _remove_ociosas_vencidas(self, agora):
+        mantidas = deque()
+        vencidas = []
+        while self._ociosas:
+            item = self._ociosas.popleft()
+            ocioso_demais = (self.tempo_max_ocioso is not None and agora - item.usada_em > self.tempo_max_ocioso and
+                             len(self._ociosas) + len(mantidas) + len(self._emprestadas) >= self.tamanho_min)
+            if self._expirada(item, agora) or ocioso_demais:
+                if self.debug:
+                    print("pool - descartando conexao ociosa ou expirada...")
+                vencidas.append(item)
+            else:
+                mantidas.append(item)
+        self._ociosas = mantidas
+        self._total_descartadas += len(vencidas)
+        return vencidas
+
+    # abre conexões até que existam ao menos tamanho_min conexões no pool, verificando assim se o banco de dados
+    # está acessivel.
+    def preenche(self):
+        while True:
+            with self._condicao:
+                if self._fechado or self._total_abertas() >= self.tamanho_min:
+                    return
+                self._criando += 1
+            try:
+                item = _ConexaoPool(self._fabrica())
+            except BaseException:
+                with self._condicao:
+                    self._criando -= 1
+                raise
+            with self._condicao:
+                self._criando -= 1
+                self._total_criadas += 1
+                self._ociosas.append(item)
+                self._condicao.notify()
+
+    # empresta uma conexão exclusiva para a thread chamadora. Reaproveita a conexão ociosa mais recente, cria uma
+    # nova se o limite permitir ou aguarda até timeout segundos por uma devolução. Se o ping de uma conexão ociosa
+    # falhar ela é descartada e outra é obtida, dentro do mesmo prazo de timeout segundos contado desde a chamada.
+    def empresta(self):
+        inicio = time.monotonic()
+        esperou = False
+        while True:
+            verificar = False
+            vencidas = []
+            try:
+                with self._condicao:
+                    while True:
+                        if self._fechado:
+                            raise Exception("erro! pool de conexoes ja foi fechado.")
+                        agora = time.monotonic()
+                        vencidas += self._remove_ociosas_vencidas(agora)
+                        if self._ociosas:
+                            item = self._ociosas.pop()
+                            verificar = self.tempo_ping is not None and agora - item.usada_em > self.tempo_ping
+                            break
+                        if self._total_abertas() < self.tamanho_max:
+                            # reserva a vaga e cria a conexao fora do lock
+                            self._criando += 1
+                            item = None
+                            break
+                        restante = None if self.timeout is None else self.timeout - (agora - inicio)
+                        if restante is not None and restante <= 0:
+                            raise Exception("erro! timeout de %s s aguardando conexao livre no pool (max = %d)." % (
+                                self.timeout, self.tamanho_max))
+                        esperou = True
+                        self._condicao.wait(restante)
+            finally:
+                self._fecha_conexoes(vencidas)
+            criar = item is None
+            if criar:
+                try:
+                    item = _ConexaoPool(self._fabrica())
+                except BaseException:
+                    with self._condicao:
+                        self._criando -= 1
+                        self._condicao.notify()
+                    raise
+            espera = time.monotonic() - inicio
+            with self._condicao:
+                if criar:
+                    self._criando -= 1
+                    self._total_criadas += 1
+                self._emprestadas[id(item.conexao)] = item
+                if verificar:
+                    self._total_pings += 1
+            if verificar:
+                try:
+                    item.conexao.ping(reconnect=True)
+                except Exception as e:
+                    # servidor inacessivel por esta conexao, descarta e tenta obter outra
+                    if self.debug:
+                        print("pool - ping falhou, descartando conexao:", str(e))
+                    self.devolve(item.conexao, descartar=True)
+                    continue
+            with self._condicao:
+                self._total_emprestimos += 1
+                if esperou:
+                    self._total_esperas += 1
+                self._tempo_espera_total += espera
+                self._tempo_espera_max = max(self._tempo_espera_max, espera)
+            return item.conexao
+
+    # devolve a conexão ao pool. Conexões fechadas (ex: apos perda de conexão), expiradas ou devolvidas com
+    # descartar=True são fechadas em vez de reaproveitadas.
+    def devolve(self, conexao, descartar=False):
+        descartadas = []
+        with self._condicao:
+            item = self._emprestadas.pop(id(conexao), None)
+            if item is None:
+                raise Exception("erro! conexao devolvida nao pertence a este pool.")
+            agora = time.monotonic()
+            if descartar or self._fechado or not conexao.open or self._expirada(item, agora):
+                self._total_descartadas += 1
+                descartadas.append(item)
+            else:
+                item.usada_em = agora
+                self._ociosas.append(item)
+            self._condicao.notify()
+        self._fecha_conexoes(descartadas)
+
+    # empresta uma conexão durante o bloco with e garante a sua devolução ao final, mesmo em caso de erro.
+    @contextmanager
+    def conexao(self):
+        conexao = self.empresta()
+        try:
+            yield conexao
+        finally:
+            self.devolve(conexao)
+
+    # retorna um dicionario com o estado atual e os contadores acumulados do pool.
+    def estatisticas(self):
+        with self._condicao:
+            return {
+                'em_uso': len(self._emprestadas),
+                'ociosas': len(self._ociosas),
+                'abertas': self._total_abertas(),
+                'tamanho_min': self.tamanho_min,
+                'tamanho_max': self.tamanho_max,
+                'emprestimos': self._total_emprestimos,
+                'esperas': self._total_esperas,
+                'tempo_espera_total': self._tempo_espera_total,
+                'tempo_espera_medio': self._tempo_espera_total / self._total_emprestimos
+                if self._total_emprestimos else 0.0,
+                'tempo_espera_max': self._tempo_espera_max,
+                'criadas': self._total_criadas,
+                'descartadas': self._total_descartadas,
+                'pings': self._total_pings
+            }
+
+    # fecha todas as conexões ociosas e impede novos empréstimos. Conexões emprestadas são fechadas ao serem
+    # devolvidas.
+    def fecha(self):
+        with self._condicao:
+            self._fechado = True
+            ociosas = list(self._ociosas)
+            self._ociosas.clear()
+            self._total_descartadas += len(ociosas)
+            self._condicao.notify_all()
+        self._fecha_conexoes(ociosas)
@@ -0,0 +1,121 @@
+# Roteamento das leituras do DbHelper entre replicas de leitura. Cada replica tem o seu proprio PoolConexoes, as
+# escritas e as leituras feitas dentro de transações continuam indo para o primario. Replicas que falham ao
+# emprestar uma conexão ficam de quarentena por alguns segundos e as leituras vão para as demais (ou para o
+# primario). Opcionalmente as leituras de tabelas escritas ha pouco tempo também vão para o primario, para que
+# o processo leia as proprias escritas mesmo com atraso de replicação.
+#
+#
+
+import time
+from threading import Lock
+
+SELECOES_REPLICA = ('round_robin', 'menos_carregada')
+
+
+# converte a configuração de uma replica em um dicionario com hostname, porta, username, password e schema, os
+# campos ausentes vêm do primario. Aceita 'host', 'host:porta' ou um dicionario com as mesmas chaves do j-son.
+# Ex: Entrada: 'replica1:3307'  Saida: {'hostname': 'replica1', 'porta': 3307, 'username': ..., ...}
+def normaliza_replica(replica, padrao):
+    if isinstance(replica, str):
+        hostname, _, porta = replica.partition(":")
+        replica = {'hostname': hostname, 'porta': int(porta) if porta else None}
+    elif not isinstance(replica, dict) or not replica.get('hostname'):
+        raise Exception("erro! replica invalida: %s" % str(replica))
+    return {'hostname': replica['hostname'], 'porta': replica.get('porta'),
+            'username': replica.get('username', padrao['username']),
+            'password': replica.get('password', padrao['password']),
+            'schema': replica.get('schema', padrao['schema'])}
+
+
+class RoteadorReplicas:
+    # pools - lista de tuplas (nome da replica, PoolConexoes).
+    # selecao - 'round_robin' alterna as replicas a cada leitura, 'menos_carregada' escolhe a replica com menos
+    #           conexões emprestadas.
+    # janela_leitura_propria - segundos, depois de uma escrita em uma tabela, em que as leituras dessa tabela vão
+    #                          para o primario, 0 desativa.
+    # tempo_quarentena - segundos que uma replica com falha fica sem receber leituras.
+    def __init__(self, pools, selecao='round_robin', janela_leitura_propria=0.0, tempo_quarentena=30.0, debug=False):
+        if selecao not in SELECOES_REPLICA:
+            raise Exception("erro! selecao de replica invalida: %s, use um de %s" % (selecao, str(SELECOES_REPLICA)))
+        self.pools = list(pools)
+        self.selecao = selecao
+        self.janela_leitura_propria = janela_leitura_propria
+        self.tempo_quarentena = tempo_quarentena
+        self.debug = debug
+        self._lock = Lock()
+        self._proxima = 0
+        # pool -> instante (monotonic) ate quando a replica fica de quarentena
+        self._quarentena = dict()
+        # tabela -> instante (monotonic) da ultima escrita
+        self._escritas = dict()
+        self._leituras_primario = 0
+        self._leituras_replica = {nome: 0 for nome, pool in self.pools}
+        self._falhas = {nome: 0 for nome, pool in self.pools}
+
+    # registra a escrita das tabelas para a janela de leitura propria.
+    def registra_escrita(self, tabelas):
+        if self.janela_leitura_propria > 0:
+            agora = time.monotonic()
+            with self._lock:
+                for tabela in tabelas:
+                    self._escritas[tabela] = agora
+
+    # retorna True se alguma das tabelas foi escrita dentro da janela de leitura propria.
+    def _escrita_recente(self, tabelas, agora):
+        if self.janela_leitura_propria <= 0 or not tabelas:
+            return False
+        limite = agora - self.janela_leitura_propria
+        return any(self._escritas.get(tabela, limite) > limite for tabela in tabelas)
+
+    # retorna as replicas candidatas para uma leitura das tabelas, na ordem em que devem ser tentadas, ou uma lista
+    # vazia se a leitura deve ir para o primario.
+    def candidatas(self, tabelas=None):
+        agora = time.monotonic()
+        with self._lock:
+            if self._escrita_recente(tabelas, agora):
+                self._leituras_primario += 1
+                return []
+            disponiveis = [(nome, pool) for nome, pool in self.pools if self._quarentena.get(pool, 0) <= agora]
+            if not disponiveis:
+                self._leituras_primario += 1
+                return []
+            if self.selecao == 'round_robin':
+                inicio = self._proxima % len(disponiveis)
+                self._proxima += 1
+                return disponiveis[inicio:] + disponiveis[:inicio]
+        # fora do lock, estatisticas() adquire o lock de cada pool
+        return sorted(disponiveis, key=lambda item: item[1].estatisticas()['em_uso'])
+
+    # contabiliza uma leitura servida pela replica.
+    def usou(self, nome):
+        with self._lock:
+            self._leituras_replica[nome] += 1
+
+    # coloca a replica de quarentena apos uma falha ao emprestar uma conexão.
+    def falhou(self, nome, pool, erro):
+        with self._lock:
+            self._quarentena[pool] = time.monotonic() + self.tempo_quarentena
+            self._falhas[nome] += 1
+        if self.debug:
+            print("replicas - replica %s de quarentena por %.1fs:" % (nome, self.tempo_quarentena), str(erro))
+
+    # contabiliza uma leitura que foi para o primario apesar de haver replicas candidatas (todas falharam).
+    def usou_primario(self):
+        with self._lock:
+            self._leituras_primario += 1
+
+    def estatisticas(self):
+        agora = time.monotonic()
+        with self._lock:
+            replicas = {nome: {'leituras': self._leituras_replica[nome], 'falhas': self._falhas[nome],
+                               'em_quarentena': self._quarentena.get(pool, 0) > agora}
+                        for nome, pool in self.pools}
+            leituras_primario = self._leituras_primario
+        for nome, pool in self.pools:
+            replicas[nome]['pool'] = pool.estatisticas()
+        return {'selecao': self.selecao, 'janela_leitura_propria': self.janela_leitura_propria,
+                'leituras_primario': leituras_primario, 'replicas': replicas}
+
+    def fecha(self):
+        for nome, pool in self.pools:
+            pool.fecha()
@@ -0,0 +1,93 @@
+# Unidade de trabalho do DbHelper: mantem uma conexão do pool presa à thread durante o bloco with de
+# DbHelper.transacao(), para que todas as escritas sejam confirmadas por um unico COMMIT, e opcionalmente acumula os
+# inserts de uma mesma tabela para envia-los como inserts de varias linhas.
+#
+#
+
+from contextlib import contextmanager
+from db_helper.montagem_sql import monta_lotes_insert
+
+
+class Transacao:
+    # objeto - DbHelper dono da transação.
+    # conexao - conexão emprestada do pool, usada por todos os comandos da thread enquanto a transação durar.
+    # agrupa_inserts - se True db_insert não executa o insert na hora, as linhas são acumuladas e enviadas em lotes
+    #                  antes do proximo comando, savepoint ou commit.
+    # limite_bytes - tamanho maximo de cada insert em lote (max_allowed_packet menos a margem).
+    # tamanho_lote - quantidade maxima de linhas por insert em lote.
+    def __init__(self, objeto, conexao, agrupa_inserts=False, limite_bytes=None, tamanho_lote=1000):
+        self._objeto = objeto
+        self.conexao = conexao
+        self.agrupa_inserts = agrupa_inserts
+        self.limite_bytes = limite_bytes
+        self.tamanho_lote = tamanho_lote
+        self.profundidade = 0
+        # tabelas escritas durante a transação, invalidadas no cache de resultados apos o commit
+        self.tabelas_alteradas = set()
+        # lista de [prefixo do insert, quantidade de colunas, linhas], grupos consecutivos da mesma tabela e colunas
+        # compartilham o mesmo item para preservar a ordem dos comandos
+        self._inserts_adiados = []
+        # erro do envio dos inserts adiados, depois dele a transação não pode mais ser confirmada
+        self.erro = None
+
+    # mensagem dos comandos recusados depois que o envio dos inserts adiados falhou.
+    def msg_abortada(self):
+        return "transação abortada, o envio dos inserts adiados falhou: " + str(self.erro)
+
+    # acumula uma linha para o insert identificado por prefixo (ver compila_insert_lote).
+    def adia_insert(self, prefixo, quantidade_colunas, linha):
+        if self._inserts_adiados and self._inserts_adiados[-1][0] == prefixo:
+            self._inserts_adiados[-1][2].append(linha)
+        else:
+            self._inserts_adiados.append([prefixo, quantidade_colunas, [linha]])
+
+    # envia todos os inserts acumulados, em lotes de varias linhas. Chamado antes de qualquer outro comando da
+    # transação para que ele enxergue as linhas inseridas. Se o envio falhar o erro fica registrado e este e todos
+    # os proximos comandos, savepoints e o commit da transação levantam exceção, o bloco with termina em ROLLBACK.
+    def descarrega(self):
+        if self.erro is not None:
+            raise Exception("erro! " + self.msg_abortada())
+        if not self._inserts_adiados:
+            return
+        adiados, self._inserts_adiados = self._inserts_adiados, []
+        try:
+            with self.conexao.cursor() as cursor:
+                for prefixo, quantidade_colunas, linhas in adiados:
+                    for sql, quantidade in monta_lotes_insert(self.conexao, prefixo, quantidade_colunas, linhas,
+                                                              self.tamanho_lote, self.limite_bytes):
+                        if self._objeto.debug:
+                            print("transacao - enviando %d inserts adiados" % quantidade)
+                        cursor.execute(sql)
+        except Exception as e:
+            self.erro = e
+            raise Exception("erro! " + self.msg_abortada()) from e
+
+    # executa um comando de controle da transação (SAVEPOINT, RELEASE...) na conexão da transação.
+    def _executa(self, sql):
+        with self.conexao.cursor() as cursor:
+            if self._objeto.debug:
+                print("transacao -", sql)
+            cursor.execute(sql)
+
+    # bloco aninhado dentro da transação. Se o bloco terminar com uma exceção apenas os comandos dele são desfeitos
+    # (ROLLBACK TO SAVEPOINT) e a exceção continua subindo, caso contrario o savepoint é liberado.
+    @contextmanager
+    def savepoint(self):
+        self.descarrega()
+        self.profundidade += 1
+        nome = "sp_%d" % self.profundidade
+        self._executa("SAVEPOINT %s;" % nome)
+        try:
+            yield self
+            self.descarrega()
+        except BaseException:
+            # inserts adiados dentro do savepoint são descartados junto
+            self._inserts_adiados = []
+            self._executa("ROLLBACK TO SAVEPOINT %s;" % nome)
+            # os inserts que falharam eram todos deste savepoint (os anteriores foram enviados ao abri-lo)
+            self.erro = None
+            raise
+        else:
+            self._executa("RELEASE SAVEPOINT %s;" % nome)
+        finally:
+            self.profundidade -= 1
@@ -1,24 +1,17 @@
 from db_helper.conversoes import converte_em_lista
 
 
+# retorna o conjunto (frozenset) de colunas validas, simples e qualificadas (tabela.coluna), das tabelas
+# informadas. O conjunto é obtido do indice do esquema e fica em cache para a mesma combinação de tabelas.
 def lista_colunas_validas(self, tabelas):
-    # garante que tabelas é uma lista
-    tabelas = converte_em_lista(tabelas)
-    # garante que o retorno é uma lista sempre
-    return sum(list(map(self.db_le_titulo_colunas_da_tabela_com_cache, tabelas)), [])
+    # garante que tabelas é uma tupla (hashable) para servir de chave do cache
+    tabelas = tuple(converte_em_lista(tabelas))
+    return self.indice_esquema().colunas_validas(tabelas)
 
 
+# retorna o conjunto (frozenset) com os nomes das tabelas do esquema.
 def lista_tabelas_validas(self):
-    if self._tabelas_validas_cache is None:
-        c = self.le_e_incrementa_contador()
-        res, msg, qtd = self._db_fetch_all(
-            "SELECT table_name FROM information_schema.tables WHERE table_schema = %s;", self._db_schema, c)
-        if res == -1:
-            raise Exception(msg)
-        self._tabelas_validas_cache = list(map(lambda d: d['table_name'], res))
-        if self.debug:
-            print("lista_tabelas_validas - atualizando cache com: %s" % self._tabelas_validas_cache)
-    return self._tabelas_validas_cache
+    return self.indice_esquema().tabelas
 
 
 def valida_tabela(self, tabela):
@@ -40,6 +33,7 @@ def escapa_coluna(self, coluna):
 def valida_e_escapa_coluna(self, item, tabelas):
     if self.debug:
         print("checa_coluna iniciado com:", item, tabelas)
+    # conjunto de colunas validas, as checagens de pertinencia abaixo são O(1)
     colunas_validas = lista_colunas_validas(self, tabelas)
     match item:
         # se for None
@@ -55,44 +49,44 @@ def valida_e_escapa_coluna(self, item, tabelas):
                 # suporta caso que so tem a coluna sem pontos
                 case [col] if col in colunas_validas:
                     if self.debug:
-                        print('checa_coluna - retorna', self.escapa_coluna(col))
-                    return self.escapa_coluna(col)
+                        print('checa_coluna - retorna', escapa_coluna(self, col))
+                    return escapa_coluna(self, col)
                 # suporta caso que veio uma string tipo tabela.coluna
                 case [tab, col] if tab + "." + col in colunas_validas:
                     if self.debug:
-                        print('checa_coluna - retorna', self.escapa_coluna(tab) + "." + self.escapa_coluna(col))
-                    return self.escapa_coluna(tab) + "." + self.escapa_coluna(col)
+                        print('checa_coluna - retorna', escapa_coluna(self, tab) + "." + escapa_coluna(self, col))
+                    return escapa_coluna(self, tab) + "." + escapa_coluna(self, col)
                 # suporta caso que veio uma string tipo deliveryadm.tabela.coluna
                 case [self._db_schema, tab, col] if tab + "." + col in colunas_validas:
                     if self.debug:
-                        print('checa_coluna - retorna', self.escapa_coluna(tab) + "." + self.escapa_coluna(col))
-                    return self.escapa_coluna(tab) + "." + self.escapa_coluna(col)
+                        print('checa_coluna - retorna', escapa_coluna(self, tab) + "." + escapa_coluna(self, col))
+                    return escapa_coluna(self, tab) + "." + escapa_coluna(self, col)
             # coluna invalida
             if self.debug:
-                print('checa_coluna - retorna ' + self.escapa_coluna("COLUNA INVALIDA"))
-            return self.escapa_coluna("COLUNA INVALIDA")
+                print('checa_coluna - retorna ' + escapa_coluna(self, "COLUNA INVALIDA"))
+            return escapa_coluna(self, "COLUNA INVALIDA")
         # se for lista ou uma tupla que possua uma coluna seguida por um alias
         case [str(coluna), str(alias)] | (str(coluna), str(alias)):
             match coluna.split('.'):
                 case [col] if col in colunas_validas:
                     if self.debug:
-                        print("checa_coluna - retorna", self.escapa_coluna(col) + " AS " + alias)
-                    return self.escapa_coluna(col) + " AS " + alias
+                        print("checa_coluna - retorna", escapa_coluna(self, col) + " AS " + alias)
+                    return escapa_coluna(self, col) + " AS " + alias
                 case [tab, col] if tab + "." + col in colunas_validas:
                     if self.debug:
-                        print("checa_coluna - retorna", self.escapa_coluna(tab) + "." + self.escapa_coluna(col) +
+                        print("checa_coluna - retorna", escapa_coluna(self, tab) + "." + escapa_coluna(self, col) +
                               " AS " + alias)
-                    return self.escapa_coluna(tab) + "." + self.escapa_coluna(col) + " AS " + alias
+                    return escapa_coluna(self, tab) + "." + escapa_coluna(self, col) + " AS " + alias
                 case [self._db_schema, tab, col] if tab + "." + col in colunas_validas:
                     if self.debug:
                         print("checa_coluna - retorna",
-                              self.escapa_coluna(tab) + "." + self.escapa_coluna(col) + " AS " + alias)
-                    return self.escapa_coluna(tab) + "." + self.escapa_coluna(col) + " AS " + alias
+                              escapa_coluna(self, tab) + "." + escapa_coluna(self, col) + " AS " + alias)
+                    return escapa_coluna(self, tab) + "." + escapa_coluna(self, col) + " AS " + alias
             # coluna invalida
             if self.debug:
-                print("checa_coluna - retorna", self.escapa_coluna("COLUNA INVALIDA") + " AS " + alias)
-            return self.escapa_coluna("COLUNA INVALIDA") + " AS " + alias
+                print("checa_coluna - retorna", escapa_coluna(self, "COLUNA INVALIDA") + " AS " + alias)
+            return escapa_coluna(self, "COLUNA INVALIDA") + " AS " + alias
         case _:
             if self.debug:
-                print("checa_coluna caiu no caso catch-all! retornando " + self.escapa_coluna("COLUNA INVALIDA"))
-            return self.escapa_coluna("COLUNA INVALIDA")
+                print("checa_coluna caiu no caso catch-all! retornando " + escapa_coluna(self, "COLUNA INVALIDA"))
+            return escapa_coluna(self, "COLUNA INVALIDA")
@@ -0,0 +1,71 @@
+# Varredura paralela das partições de uma tabela (ver DbHelper.db_query_col_paralelo). Cada partição é lida por uma
+# thread propria com a sua conexão do pool, os blocos lidos passam por filas limitadas até o consumidor, de modo que
+# a memoria fica limitada a alguns blocos por partição. O pymysql libera o GIL enquanto espera o servidor, então as
+# idas e voltas e o trabalho do servidor das partições se sobrepõem.
+#
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from queue import Full, Queue
+from threading import Event
+
+# marca o fim (ou o erro) de uma partição na fila
+_FIM = object()
+
+
+# executa cada produtor (função sem parametros que retorna um iteravel de blocos) em uma thread e gera os blocos de
+# todos eles. Com ordenado=False os blocos são gerados na ordem em que ficam prontos, com ordenado=True todos os
+# blocos do primeiro produtor, depois os do segundo e assim por diante, enquanto os demais produtores continuam
+# lendo adiantado até encher suas filas. O erro de um produtor é levantado no consumidor. Se o consumidor parar
+# antes do fim (fechando o gerador) os produtores são interrompidos e os seus iteraveis fechados.
+# blocos_por_fila - quantidade de blocos lidos adiantado por produtor.
+def mescla_particoes(produtores, ordenado=False, blocos_por_fila=2):
+    if not produtores:
+        return
+    cancelado = Event()
+    if ordenado:
+        filas = [Queue(blocos_por_fila) for _ in produtores]
+    else:
+        # a mesma fila para todos os produtores
+        filas = [Queue(blocos_por_fila * len(produtores))] * len(produtores)
+
+    # aguarda espaço na fila verificando periodicamente se o consumidor desistiu, retorna False nesse caso.
+    def coloca(fila, item):
+        while not cancelado.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def executa(produtor, fila):
+        try:
+            blocos = produtor()
+            try:
+                for bloco in blocos:
+                    if not coloca(fila, (bloco, None)):
+                        return
+            finally:
+                if hasattr(blocos, 'close'):
+                    blocos.close()
+        except Exception as e:
+            coloca(fila, (_FIM, e))
+        else:
+            coloca(fila, (_FIM, None))
+
+    with ThreadPoolExecutor(max_workers=len(produtores), thread_name_prefix="db_helper_particao") as executor:
+        try:
+            for produtor, fila in zip(produtores, filas):
+                executor.submit(executa, produtor, fila)
+            # no modo ordenado passa para a fila da proxima partição a cada fim, no outro modo as filas são a mesma
+            for fila in filas:
+                while True:
+                    bloco, erro = fila.get()
+                    if bloco is _FIM:
+                        break
+                    yield bloco
+                if erro is not None:
+                    raise erro
+        finally:
+            cancelado.set()
@@ -1,9 +1,13 @@
+import re
 from setuptools import setup
-from db_helper import db_helper
+
+# le a versão do codigo fonte sem importar o pacote, que importaria as dependencias antes da instalação
+with open('db_helper/db_helper.py', encoding='utf-8') as arquivo:
+    versao = re.search(r'^VERSAO = "([^"]+)"', arquivo.read(), re.M).group(1)
 
 setup(
     name='dbhelper',
-    version=db_helper.VERSAO,
+    version=versao,
     packages=['db_helper'],
     install_requires=['criadorjson', 'pymysql'],
     author='João Guilherme de Oliveira Júnior',
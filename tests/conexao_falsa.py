@@ -0,0 +1,190 @@
+# Conexão falsa em memoria com a mesma interface do pymysql usada pelo DbHelper, compartilhada pelos testes e
+# pelos benchmarks. Responde às consultas do indice do esquema a partir de um esquema sintetico, aos selects com
+# linhas fixas (filtradas pela faixa das partições de db_query_col_paralelo), registra os comandos em um log e
+# permite injetar falhas em comandos especificos.
+#
+#
+
+import time
+from threading import Lock
+
+import pymysql.cursors
+from pymysql.converters import escape_item, encoders
+
+from db_helper.db_helper import DbHelper
+
+
+# esquema sintetico: quantidade_tabelas tabelas t0, t1... cada uma com id (chave primaria) e colunas c1, c2...
+def esquema_sintetico(quantidade_tabelas, colunas_por_tabela):
+    return {"t%d" % t: ["id"] + ["c%d" % c for c in range(1, colunas_por_tabela)]
+            for t in range(quantidade_tabelas)}
+
+
+# cursor falso com a mesma interface usada pelo DbHelper (execute, fetchall, fetchmany, nextset, description...).
+# Cada execute espera latencia segundos, simulando a ida e volta ao servidor sem segurar o GIL. Varios comandos
+# separados por quebra de linha (lotes) são respondidos um a um com nextset().
+class CursorFalso:
+    def __init__(self, conexao, classe):
+        self._conexao = conexao
+        self._como_dict = classe is None or issubclass(classe, pymysql.cursors.DictCursorMixin)
+        self._linhas = []
+        self._pendentes = []
+        self.description = None
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def mogrify(self, sql, argumentos=None):
+        if argumentos is None:
+            return sql
+        if isinstance(argumentos, (list, tuple)):
+            return sql % tuple(self._conexao.literal(a) for a in argumentos)
+        return sql % self._conexao.literal(argumentos)
+
+    def execute(self, sql, argumentos=None):
+        conexao = self._conexao
+        if conexao.latencia:
+            time.sleep(conexao.latencia)
+        sql, *self._pendentes = sql.split("\n")
+        return self._responde(sql, argumentos)
+
+    def nextset(self):
+        if not self._pendentes:
+            return None
+        sql = self._pendentes.pop(0)
+        self._responde(sql, None)
+        return True
+
+    def _responde(self, sql, argumentos):
+        conexao = self._conexao
+        conexao.registra(sql)
+        conexao.falha(sql)
+        self.description = None
+        if "INFORMATION_SCHEMA.COLUMNS" in sql:
+            linhas = [{'tabela': tab, 'coluna': col, 'chave': 'PRI' if col == 'id' else '',
+                       'tipo': 'int(11)' if col == 'id' else 'varchar(45)',
+                       'colacao': None if col == 'id' else 'utf8mb4_general_ci'}
+                      for tab, cols in conexao.esquema.items() for col in cols]
+        elif "INFORMATION_SCHEMA.STATISTICS" in sql:
+            linhas = [{'tabela': tab, 'indice': 'PRIMARY', 'coluna': 'id', 'tipo': 'BTREE'}
+                      for tab in conexao.esquema]
+        elif "max_allowed_packet" in sql:
+            linhas = [{'max_allowed_packet': 16 * 1024 * 1024}]
+        elif "MIN(" in sql:
+            ids = [linha['id'] for linha in conexao.linhas_select]
+            linhas = [{'minimo': min(ids, default=None), 'maximo': max(ids, default=None)}]
+        elif " BETWEEN " in sql:
+            inicio, fim = argumentos[-2:]
+            linhas = [linha for linha in conexao.linhas_select if inicio <= linha['id'] <= fim]
+        elif sql.startswith("SELECT"):
+            linhas = conexao.linhas_select
+        else:
+            with conexao.lock:
+                ConexaoFalsa.ultimo_id += 1
+                self.lastrowid = ConexaoFalsa.ultimo_id
+            self._linhas = []
+            self.rowcount = 1
+            return 1
+        if linhas:
+            self.description = tuple((nome, None, None, None, None, None, None) for nome in linhas[0])
+        self._linhas = linhas if self._como_dict else [tuple(linha.values()) for linha in linhas]
+        self.rowcount = len(linhas)
+        return self.rowcount
+
+    def fetchall(self):
+        linhas, self._linhas = self._linhas, []
+        return linhas
+
+    def fetchmany(self, quantidade):
+        linhas, self._linhas = self._linhas[:quantidade], self._linhas[quantidade:]
+        return linhas
+
+    def fetchone(self):
+        return self._linhas.pop(0) if self._linhas else None
+
+
+# conexão falsa, compartilha o esquema, as linhas retornadas pelos selects e o contador de ids entre as instancias.
+# log - lista onde são registrados os comandos executados e os BEGIN, COMMIT, ROLLBACK, PING e CLOSE.
+# falhas - lista de tuplas (trecho, exceção), o primeiro comando que contiver o trecho (ou o ping, com o trecho
+#          'PING') levanta a exceção, que é retirada da lista.
+class ConexaoFalsa:
+    open = True
+    encoders = encoders
+    lock = Lock()
+    ultimo_id = 0
+
+    def __init__(self, esquema, latencia=0.0, linhas_select=None, log=None, falhas=None):
+        self.esquema = esquema
+        self.latencia = latencia
+        self.linhas_select = linhas_select or []
+        self.log = log
+        self.falhas = falhas
+
+    def registra(self, comando):
+        if self.log is not None:
+            self.log.append(comando)
+
+    def falha(self, comando):
+        if not self.falhas:
+            return
+        with self.lock:
+            for item in self.falhas:
+                if item[0] in comando:
+                    self.falhas.remove(item)
+                    raise item[1]
+
+    def cursor(self, classe=None):
+        return CursorFalso(self, classe)
+
+    def literal(self, valor):
+        return escape_item(valor, 'utf8mb4', self.encoders)
+
+    def escape(self, valor, mapeamento=None):
+        return escape_item(valor, 'utf8mb4', self.encoders)
+
+    def begin(self):
+        self.registra("BEGIN")
+
+    def commit(self):
+        self.registra("COMMIT")
+
+    def rollback(self):
+        self.registra("ROLLBACK")
+
+    def ping(self, reconnect=True):
+        self.registra("PING")
+        self.falha("PING")
+
+    def close(self):
+        self.registra("CLOSE")
+        self.open = False
+
+
+# cria uma nova instancia do helper descartando a anterior (o DbHelper é singleton). fabrica cria as conexões do
+# pool e dos lotes, se None o helper conecta ao servidor real. Levanta uma exceção se o helper não conectar.
+def novo_helper(fabrica=None, **kwargs):
+    classe = DbHelper if fabrica is None else type("DbHelperFalso", (DbHelper,), {"_cria_conexao": fabrica,
+                                                                                 "_cria_conexao_lote": fabrica})
+    classe._Singleton__instance = None
+    try:
+        helper = classe(**kwargs)
+    finally:
+        classe._Singleton__instance = None
+    if not helper._conectado():
+        raise Exception("erro! o helper não conectou em %s com o usuario %r." % (kwargs.get('hostname'),
+                                                                                 kwargs.get('username')))
+    return helper
+
+
+# fecha as conexões do pool do helper.
+def fecha_helper(helper):
+    if helper._db_pool is not None:
+        helper._db_pool.fecha()
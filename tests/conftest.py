@@ -0,0 +1,29 @@
+import pytest
+
+from tests.conexao_falsa import ConexaoFalsa, fecha_helper, novo_helper
+
+ESQUEMA = {'usuario': ['id', 'nome', 'login'], 'pedido': ['id', 'usuario_id', 'valor']}
+LINHAS = [{'id': i, 'nome': 'nome %d' % i, 'login': 'u%d' % i} for i in range(1, 21)]
+
+
+# comandos executados pelas conexões falsas do helper, ver ConexaoFalsa.
+@pytest.fixture
+def log():
+    return []
+
+
+# falhas injetadas nas conexões falsas do helper, ver ConexaoFalsa.
+@pytest.fixture
+def falhas():
+    return []
+
+
+# DbHelper conectado a conexões falsas sobre ESQUEMA, com o indice do esquema ja carregado e o log vazio.
+@pytest.fixture
+def helper(log, falhas):
+    helper = novo_helper(lambda self: ConexaoFalsa(ESQUEMA, linhas_select=LINHAS, log=log, falhas=falhas),
+                         hostname='teste', username='teste', password='teste', schema='teste', pool_max=4)
+    helper.indice_esquema()
+    log.clear()
+    yield helper
+    fecha_helper(helper)
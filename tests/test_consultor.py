@@ -0,0 +1,88 @@
+from db_helper.consultor import colunas_do_sql, sugestoes_indices
+
+COLUNAS = {'pedido': ['id', 'usuario_id', 'valor', 'data', 'descricao'], 'usuario': ['id', 'nome', 'login']}
+PLANO = [{'table': 'pedido', 'type': 'ALL', 'Extra': 'Using where'}]
+PLANO_FILESORT = [{'table': 'pedido', 'type': 'ref', 'Extra': 'Using where; Using filesort'}]
+
+
+def indices(**extras):
+    return {'pedido': dict({'PRIMARY': ('BTREE', ['id'])}, **extras),
+            'usuario': {'PRIMARY': ('BTREE', ['id']), 'ix_login': ('BTREE', ['login'])}}
+
+
+def sugestoes(sql, argumentos=None, plano=PLANO, tabelas=('pedido',), **extras):
+    filtradas, ordenadas = colunas_do_sql(sql, argumentos)
+    return sugestoes_indices(COLUNAS, indices(**extras), list(tabelas), filtradas, ordenadas, plano)
+
+
+def test_igualdade_sem_indice():
+    resultado = sugestoes("SELECT * FROM `pedido` WHERE `usuario_id` = %s;")
+    assert [s['ddl'] for s in resultado] == ["CREATE INDEX `ix_pedido_usuario_id` ON `pedido` (`usuario_id`);"]
+
+
+def test_igualdade_e_faixa_na_mesma_sugestao():
+    resultado = sugestoes("SELECT * FROM `pedido` WHERE `usuario_id` = %s AND `valor` >= %s;")
+    assert [s['ddl'] for s in resultado] == [
+        "CREATE INDEX `ix_pedido_usuario_id_valor` ON `pedido` (`usuario_id`, `valor`);"]
+
+
+def test_igualdade_ja_coberta():
+    assert sugestoes("SELECT * FROM `pedido` WHERE `usuario_id` = %s AND `valor` >= %s;",
+                     ix_usuario=('BTREE', ['usuario_id'])) == []
+
+
+def test_faixa_com_between():
+    resultado = sugestoes("SELECT * FROM `pedido` WHERE `data` BETWEEN %s AND %s;")
+    assert [s['ddl'] for s in resultado] == ["CREATE INDEX `ix_pedido_data` ON `pedido` (`data`);"]
+
+
+def test_like_com_curinga_no_inicio_sugere_fulltext():
+    resultado = sugestoes("SELECT * FROM `pedido` WHERE `descricao` LIKE %s;", ['%pizza%'])
+    assert [s['ddl'] for s in resultado] == [
+        "CREATE FULLTEXT INDEX `ix_pedido_descricao` ON `pedido` (`descricao`);"]
+    assert "FULLTEXT" in resultado[0]['motivo']
+
+
+def test_like_por_prefixo_usa_indice_b_tree():
+    sql = "SELECT * FROM `pedido` WHERE `descricao` LIKE %s;"
+    assert [s['ddl'] for s in sugestoes(sql, ['pizza%'])] == [
+        "CREATE INDEX `ix_pedido_descricao` ON `pedido` (`descricao`);"]
+    assert sugestoes(sql, ['pizza%'], ix_descricao=('BTREE', ['descricao'])) == []
+
+
+def test_like_com_fulltext_existente():
+    assert sugestoes("SELECT * FROM `pedido` WHERE `descricao` LIKE %s;", ['%pizza%'],
+                     ft_descricao=('FULLTEXT', ['descricao'])) == []
+
+
+def test_match_sem_fulltext_com_as_mesmas_colunas():
+    sql = "SELECT * FROM `usuario` WHERE MATCH (`usuario`.`nome`, `usuario`.`login`) AGAINST (%s IN BOOLEAN MODE);"
+    resultado = sugestoes(sql, ['+ana*'], tabelas=('usuario',))
+    assert [s['ddl'] for s in resultado] == [
+        "CREATE FULLTEXT INDEX `ix_usuario_nome_login` ON `usuario` (`nome`, `login`);"]
+
+
+def test_ordenacao_em_arquivo():
+    resultado = sugestoes("SELECT * FROM `pedido` WHERE `usuario_id` = %s ORDER BY `pedido`.`data` DESC;",
+                          plano=PLANO_FILESORT, ix_usuario=('BTREE', ['usuario_id']))
+    assert [s['ddl'] for s in resultado] == [
+        "CREATE INDEX `ix_pedido_usuario_id_data` ON `pedido` (`usuario_id`, `data`);"]
+    assert "filesort" in resultado[0]['motivo']
+
+
+def test_ordenacao_ja_coberta_pelo_indice():
+    assert sugestoes("SELECT * FROM `pedido` WHERE `usuario_id` = %s ORDER BY `pedido`.`data` DESC;",
+                     plano=PLANO_FILESORT, ix_usuario_data=('BTREE', ['usuario_id', 'data'])) == []
+
+
+def test_ordenacao_pela_chave_primaria_implicita():
+    # no InnoDB o indice secundario termina com a chave primaria, que ja ordena as linhas de mesmo usuario_id
+    assert sugestoes("SELECT * FROM `pedido` WHERE `usuario_id` = %s ORDER BY `pedido`.`id` ASC;",
+                     plano=PLANO_FILESORT, ix_usuario=('BTREE', ['usuario_id'])) == []
+
+
+def test_colunas_de_join_atribuidas_a_cada_tabela():
+    sql = ("SELECT * FROM `pedido` JOIN `usuario` ON `pedido`.`usuario_id` = `usuario`.`id` "
+           "WHERE `usuario`.`login` = %s AND `valor` > %s;")
+    resultado = sugestoes(sql, tabelas=('pedido', 'usuario'))
+    assert [s['ddl'] for s in resultado] == ["CREATE INDEX `ix_pedido_valor` ON `pedido` (`valor`);"]
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pytest
+
+from db_helper.db_helper_async import AsyncDbHelper, LoteAssincrono
+from tests.conftest import LINHAS
+
+
+# executa corotina(async_helper) em um event loop novo e fecha o AsyncDbHelper no final.
+def executa(helper, corotina):
+    async def principal():
+        async with AsyncDbHelper(helper) as async_helper:
+            return await corotina(async_helper)
+    return asyncio.run(principal())
+
+
+# substitui o metodo do helper por um que registra em threads o nome da thread de cada chamada.
+def espiona(monkeypatch, helper, metodo, threads):
+    original = getattr(helper, metodo)
+
+    def espiao(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(helper, metodo, espiao)
+
+
+async def coleta(gerador):
+    return [linha async for linha in gerador]
+
+
+def test_db_query_col(helper):
+    res, msg, qtd = executa(helper, lambda a: a.db_query_col('usuario', [], 'id', 1))
+    assert msg == "Ok!" and qtd == len(LINHAS)
+
+
+def test_iter_montado_no_executor(helper, monkeypatch):
+    threads = []
+    espiona(monkeypatch, helper, '_prepara_query_col', threads)
+    linhas = executa(helper, lambda a: coleta(a.db_query_col_iter('usuario', [], tamanho_bloco=7)))
+    assert [linha['id'] for linha in linhas] == [linha['id'] for linha in LINHAS]
+    assert threads and all(nome.startswith("db_helper_async") for nome in threads)
+
+
+def test_like_iter_em_blocos_tupla(helper, monkeypatch):
+    threads = []
+    espiona(monkeypatch, helper, '_prepara_query_col_like', threads)
+    blocos = executa(helper, lambda a: coleta(a.db_query_col_like_iter('usuario', [], 'nome', 'nome', tamanho_bloco=8,
+                                                                       em_blocos=True, formato='tupla')))
+    assert [len(linhas) for cabecalho, linhas in blocos] == [8, 8, 4]
+    assert threads and all(nome.startswith("db_helper_async") for nome in threads)
+
+
+def test_paralelo_le_limites_no_executor(helper, monkeypatch):
+    threads = []
+    espiona(monkeypatch, helper, '_db_fetch_all', threads)
+    linhas = executa(helper, lambda a: coleta(a.db_query_col_paralelo('usuario', [], particoes=3, ordenado=True,
+                                                                      tamanho_bloco=4)))
+    assert [linha['id'] for linha in linhas] == [linha['id'] for linha in LINHAS]
+    assert threads and all(nome.startswith("db_helper_async") for nome in threads)
+
+
+def test_formato_invalido_levantado_na_chamada(helper):
+    async def corotina(async_helper):
+        with pytest.raises(Exception, match="formato"):
+            async_helper.db_query_col_iter('usuario', [], formato='invalido')
+    executa(helper, corotina)
+
+
+def test_lote_montado_no_executor(helper, monkeypatch):
+    threads = []
+    espiona(monkeypatch, helper, '_prepara_query_col', threads)
+
+    async def corotina(async_helper):
+        lote = async_helper.lote()
+        assert isinstance(lote, LoteAssincrono)
+        assert lote.db_query_col('usuario', [], 'id', 1) == 0
+        assert lote.db_update('usuario', 'nome', 'ana', 'id', 1) == 1
+        with pytest.raises(Exception, match="formato"):
+            lote.db_query_col('usuario', [], formato='invalido')
+        assert threads == []
+        return await async_helper.executa_lote(lote)
+    resultados = executa(helper, corotina)
+    assert [msg for res, msg, qtd in resultados] == ["Ok!", "Ok!"]
+    assert resultados[0][2] == len(LINHAS)
+    assert threads and all(nome.startswith("db_helper_async") for nome in threads)
+
+
+def test_executa_lote_aceita_lote_do_helper(helper):
+    lote = helper.lote()
+    lote.db_query_col('usuario', [], 'id', 1)
+    resultados = executa(helper, lambda a: a.executa_lote(lote))
+    assert resultados[0][1] == "Ok!"
+
+
+def test_transacao_em_uma_unica_thread(helper, log):
+    def unidade(h):
+        h.db_update('usuario', 'nome', 'ana', 'id', 1)
+        return threading.current_thread().name
+    nome = executa(helper, lambda a: a.executa_transacao(unidade))
+    assert nome.startswith("db_helper_async")
+    assert [comando.split(" ")[0] for comando in log] == ["BEGIN", "UPDATE", "COMMIT"]
@@ -0,0 +1,106 @@
+import time
+from threading import Thread
+
+import pytest
+
+from db_helper.pool import PoolConexoes
+from tests.conexao_falsa import ConexaoFalsa
+
+
+# retorna True se outra thread consegue adquirir o lock do pool, isto é, se ninguem o segura.
+def lock_livre(pool):
+    livre = []
+
+    def tenta():
+        if pool._condicao.acquire(blocking=False):
+            pool._condicao.release()
+            livre.append(True)
+    thread = Thread(target=tenta)
+    thread.start()
+    thread.join()
+    return bool(livre)
+
+
+# conexão falsa que registra no log se o lock do pool estava livre ao ser fechada.
+class ConexaoFechamento(ConexaoFalsa):
+    pool = None
+
+    def close(self):
+        super().close()
+        self.registra(lock_livre(self.pool))
+
+
+def cria_pool(log, falhas=None, **kwargs):
+    pool = PoolConexoes(lambda: ConexaoFechamento({}, log=log, falhas=falhas), **kwargs)
+    ConexaoFechamento.pool = pool
+    return pool
+
+
+def test_conexao_expirada_fechada_fora_do_lock():
+    log = []
+    pool = cria_pool(log, tamanho_min=0, tamanho_max=2, tempo_max_vida=0.01, tempo_ping=None)
+    conexao = pool.empresta()
+    pool.devolve(conexao)
+    time.sleep(0.02)
+    nova = pool.empresta()
+    assert nova is not conexao
+    assert log == ["CLOSE", True]
+    assert pool.estatisticas()['descartadas'] == 1
+    pool.devolve(nova)
+
+
+def test_devolve_e_fecha_fecham_fora_do_lock():
+    log = []
+    pool = cria_pool(log, tamanho_min=0, tamanho_max=2, tempo_ping=None)
+    primeira, segunda = pool.empresta(), pool.empresta()
+    pool.devolve(primeira, descartar=True)
+    pool.devolve(segunda)
+    pool.fecha()
+    assert log == ["CLOSE", True, "CLOSE", True]
+    with pytest.raises(Exception, match="fechado"):
+        pool.empresta()
+
+
+def test_ping_falho_descarta_e_entrega_outra_conexao():
+    log = []
+    falhas = [("PING", Exception("servidor inacessivel"))]
+    pool = cria_pool(log, falhas, tamanho_min=2, tamanho_max=2, tempo_ping=0)
+    pool.preenche()
+    time.sleep(0.001)
+    conexao = pool.empresta()
+    assert conexao.open
+    assert log == ["PING", "CLOSE", True, "PING"]
+    estatisticas = pool.estatisticas()
+    assert (estatisticas['emprestimos'], estatisticas['pings'], estatisticas['descartadas']) == (1, 2, 1)
+    pool.devolve(conexao)
+
+
+def test_ping_falho_cria_nova_conexao_sem_recursao():
+    log = []
+    falhas = [("PING", Exception("servidor inacessivel"))]
+    pool = cria_pool(log, falhas, tamanho_min=1, tamanho_max=1, tempo_ping=0)
+    pool.preenche()
+    time.sleep(0.001)
+    conexao = pool.empresta()
+    assert conexao.open
+    assert pool.estatisticas()['criadas'] == 2
+    pool.devolve(conexao)
+
+
+def test_timeout_conta_desde_a_chamada():
+    pool = cria_pool([], tamanho_min=0, tamanho_max=1, timeout=0.1, tempo_ping=None)
+    conexao = pool.empresta()
+    inicio = time.monotonic()
+    with pytest.raises(Exception, match="timeout"):
+        pool.empresta()
+    assert 0.1 <= time.monotonic() - inicio < 1.0
+    pool.devolve(conexao)
+
+
+def test_espera_devolucao_de_outra_thread():
+    pool = cria_pool([], tamanho_min=0, tamanho_max=1, timeout=5.0, tempo_ping=None)
+    conexao = pool.empresta()
+    Thread(target=lambda: (time.sleep(0.05), pool.devolve(conexao))).start()
+    assert pool.empresta() is conexao
+    assert pool.estatisticas()['esperas'] == 1
+    pool.devolve(conexao)
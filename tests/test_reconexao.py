@@ -0,0 +1,56 @@
+import pymysql
+
+from tests.conftest import LINHAS
+
+
+def conexao_perdida():
+    return pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query")
+
+
+def selects(log):
+    return [comando for comando in log if comando.startswith("SELECT")]
+
+
+def test_leitura_repetida_apos_perda_da_conexao(helper, log, falhas):
+    falhas.append(("SELECT", conexao_perdida()))
+    res, msg, qtd = helper.db_query_col('usuario', [])
+    assert msg == "Ok!" and qtd == len(LINHAS)
+    assert len(selects(log)) == 2
+
+
+def test_iter_repetido_antes_do_primeiro_bloco(helper, log, falhas):
+    falhas.append(("SELECT", conexao_perdida()))
+    linhas = list(helper.db_query_col_iter('usuario', [], tamanho_bloco=7))
+    assert [linha['id'] for linha in linhas] == [linha['id'] for linha in LINHAS]
+    assert len(selects(log)) == 2
+
+
+def test_iter_nao_repete_dentro_de_transacao(helper, log, falhas):
+    falhas.append(("SELECT", conexao_perdida()))
+    with helper.transacao():
+        try:
+            list(helper.db_query_col_iter('usuario', []))
+        except Exception as e:
+            assert "Lost connection" in str(e)
+        else:
+            raise AssertionError("a perda da conexão da transação não pode ser repetida")
+    assert len(selects(log)) == 1
+
+
+def test_lote_de_leituras_repetido(helper, log, falhas):
+    falhas.append(("SELECT", conexao_perdida()))
+    lote = helper.lote()
+    lote.db_query_col('usuario', [], 'id', 1)
+    lote.db_query_col('pedido', [])
+    resultados = lote.executa()
+    assert [msg for res, msg, qtd in resultados] == ["Ok!", "Ok!"]
+
+
+def test_lote_com_escrita_nao_repetido(helper, log, falhas):
+    falhas.append(("SELECT", conexao_perdida()))
+    lote = helper.lote()
+    lote.db_query_col('usuario', [], 'id', 1)
+    lote.db_update('usuario', 'nome', 'ana', 'id', 1)
+    resultados = lote.executa()
+    assert all(res == -1 for res, msg, qtd in resultados)
+    assert not any(comando.startswith("UPDATE") for comando in log[1:])
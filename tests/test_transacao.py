@@ -0,0 +1,65 @@
+import pytest
+
+
+def comandos(log):
+    return [comando.split(" ")[0] for comando in log]
+
+
+def test_commit_no_final_do_bloco(helper, log):
+    with helper.transacao():
+        assert helper.db_update('usuario', 'nome', 'ana', 'id', 1)[1] == "Ok!"
+        assert helper.db_delete('pedido', 'id', 2)[1] == "Ok!"
+    assert comandos(log) == ["BEGIN", "UPDATE", "DELETE", "COMMIT"]
+
+
+def test_excecao_faz_rollback(helper, log):
+    with pytest.raises(ValueError):
+        with helper.transacao():
+            helper.db_update('usuario', 'nome', 'ana', 'id', 1)
+            raise ValueError("desfaz")
+    assert comandos(log) == ["BEGIN", "UPDATE", "ROLLBACK"]
+
+
+def test_transacao_aninhada_vira_savepoint(helper, log):
+    with helper.transacao():
+        with pytest.raises(ValueError):
+            with helper.transacao():
+                helper.db_update('usuario', 'nome', 'ana', 'id', 1)
+                raise ValueError("desfaz so o savepoint")
+        with helper.transacao():
+            helper.db_delete('pedido', 'id', 2)
+    assert comandos(log) == ["BEGIN", "SAVEPOINT", "UPDATE", "ROLLBACK", "SAVEPOINT", "DELETE", "RELEASE", "COMMIT"]
+    assert log[3] == "ROLLBACK TO SAVEPOINT sp_1;"
+
+
+def test_inserts_agrupados_em_um_comando(helper, log):
+    with helper.transacao(agrupa_inserts=True):
+        for i in range(3):
+            assert helper.db_insert('usuario', ['nome', 'login'], ['nome %d' % i, 'u%d' % i]) == (None, "Ok!", 1)
+        assert not any(comando.startswith("INSERT") for comando in log)
+    inserts = [comando for comando in log if comando.startswith("INSERT")]
+    assert len(inserts) == 1 and inserts[0].count("), (") == 2
+    assert log[-1] == "COMMIT"
+
+
+def test_falha_dos_inserts_adiados_aborta_a_transacao(helper, log, falhas):
+    falhas.append(("INSERT", Exception("duplicate key")))
+    with pytest.raises(Exception, match="transação abortada"):
+        with helper.transacao(agrupa_inserts=True):
+            helper.db_insert('usuario', ['nome', 'login'], ['ana', 'ana'])
+            res, msg, qtd = helper.db_query_col('usuario', [], 'id', 1)
+            assert res == -1 and "transação abortada" in msg
+            # o erro não é verificado pelo chamador, mesmo assim não pode haver commit
+    assert "COMMIT" not in log
+    assert log[-1] == "ROLLBACK"
+
+
+def test_savepoint_desfaz_inserts_adiados_com_falha(helper, log, falhas):
+    with helper.transacao(agrupa_inserts=True):
+        with pytest.raises(Exception, match="transação abortada"):
+            with helper.transacao():
+                falhas.append(("INSERT", Exception("duplicate key")))
+                helper.db_insert('usuario', ['nome', 'login'], ['ana', 'ana'])
+        helper.db_update('usuario', 'nome', 'bia', 'id', 1)
+    assert "ROLLBACK TO SAVEPOINT sp_1;" in log
+    assert log[-1] == "COMMIT"